@@ -24,6 +24,7 @@ from PiSugar2 import PiSugar2
 from ePaper import ePaper
 from ui import UI, TextBox, ImageBox, Color, TTFont
 from vBeacon import vBeacon
+from RssiFilter import KalmanFilter
 from Buzzer import Buzzer
 
 
@@ -44,7 +45,8 @@ class App(UI):
       major=2,
       minor=7777,
       txPower=-59,
-      expiration=30
+      expiration=30,
+      rssiFilter=KalmanFilter()
     )
     self.vbeacon.startScanning()
     self.vbeacon.startAdvertising()
@@ -201,7 +203,7 @@ class App(UI):
       nearby = self.vbeacon.getNearbyBeacons()
       self.sqTextBox.text = ""
       for beacon in nearby:
-        self.sqTextBox.text += str(beacon['major']) + "-" + str(beacon['minor']) + "\n" 
+        self.sqTextBox.text += str(beacon.major) + "-" + str(beacon.minor) + "\n" 
       self.showInSquare("text")
       self.showStatus("Nearby")
     self.render()
@@ -290,7 +292,7 @@ class App(UI):
   #  Set beacon on   
   #-----------------------------------------------------------
   def privacyOn(self):
-    self.vbeacon.stopAdvertising()
+    self.vbeacon.pauseAdvertising()
     self.showStatus("Privacy ON")
     self.render()
 
@@ -299,7 +301,7 @@ class App(UI):
   #  Set beacon off  
   #-----------------------------------------------------------
   def privacyOff(self):
-    self.vbeacon.startAdvertising()
+    self.vbeacon.resumeAdvertising()
     self.showStatus("Privacy OFF")
     self.render()
 
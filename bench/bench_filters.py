@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  bench_filters.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Device filter dispatch cost at 1 to 1000 IBeaconFilters: the
+#  FilterIndex lookup of the scanner against calling matches() on
+#  every filter in order, for an iBeacon that matches the last filter
+#  and for one that matches none.
+#
+#    python3 bench/bench_filters.py [count]
+#
+#========================================================================
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from beacontools import IBeaconFilter, FilterIndex
+from beacontools.parser import parse_ibeacon_packet
+
+
+UUID = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+ADDRESS = "01:02:03:04:05:06"
+
+
+#========================================================================
+#
+#  iBeacon packet with the given major and minor
+#
+#========================================================================
+def iBeacon(major, minor):
+  return parse_ibeacon_packet(bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) +
+                              bytes.fromhex(UUID.replace("-", "")) +
+                              bytes([major >> 8, major & 0xff, minor >> 8, minor & 0xff, 0xc5]))
+
+
+#========================================================================
+#
+#  The loop the scanner ran before FilterIndex
+#
+#========================================================================
+def linearMatch(filters, properties, packet):
+  for filtr in filters:
+    if filtr.applies_to(packet) and filtr.matches(properties):
+      return filtr
+  return None
+
+
+#========================================================================
+#
+#  Microseconds per call of match
+#
+#========================================================================
+def timePerCall(match, count):
+  start = time.perf_counter()
+  for i in range(count):
+    match()
+  return 1e6 * (time.perf_counter() - start) / count
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  count = int(args[0]) if len(args) > 0 else 2000
+
+  print("filters  index hit  index miss  linear hit  linear miss")
+  for n in (1, 10, 100, 1000):
+    filters = [IBeaconFilter(uuid=UUID, major=2, minor=minor) for minor in range(n)]
+    index = FilterIndex(filters)
+    hit = iBeacon(2, n - 1)
+    miss = iBeacon(3, 0)
+    assert index.match(ADDRESS, hit.properties, hit) is filters[-1]
+    assert index.match(ADDRESS, miss.properties, miss) is None
+
+    times = [timePerCall(lambda: index.match(ADDRESS, hit.properties, hit), count),
+             timePerCall(lambda: index.match(ADDRESS, miss.properties, miss), count),
+             timePerCall(lambda: linearMatch(filters, hit.properties, hit), count),
+             timePerCall(lambda: linearMatch(filters, miss.properties, miss), count)]
+    print(f"{n:7d}  " + "  ".join(f"{t:8.2f}us" for t in times))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
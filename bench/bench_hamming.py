@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  bench_hamming.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Decode throughput of the 55 bit overflow area codewords, each with
+#  one flipped bit: the bit list API (decodeBits), the int API
+#  (decodeInt), the NumPy batch API (decodeMany) and the full overflow
+#  area decode (bit reversal, Hamming decode and marker check).
+#
+#    python3 bench/bench_hamming.py [count]
+#
+#========================================================================
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from HammingEcc import HammingEcc
+from OverflowArea import encodeOverflowArea, decodeOverflowArea
+
+
+#========================================================================
+#
+#  Codewords per second of decode over items
+#
+#========================================================================
+def rate(decode, items):
+  start = time.perf_counter()
+  for item in items:
+    decode(item)
+  return len(items) / (time.perf_counter() - start)
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  count = int(args[0]) if len(args) > 0 else 20000
+  ecc = HammingEcc()
+  rand = random.Random(1)
+
+  codewords = []
+  for i in range(count):
+    codeword, codeLength = ecc.encodeInt(rand.getrandbits(48), 48)
+    codewords.append(codeword ^ (1 << rand.randrange(codeLength - 1)))
+  bitLists = [ecc.intToBits(codeword, codeLength) for codeword in codewords]
+  areas = [encodeOverflowArea(rand.randrange(0x10000), rand.randrange(0x10000), -59)
+           for i in range(count)]
+
+  print(f"decodeBits          {rate(ecc.decodeBits, bitLists):10.0f}/s")
+  print(f"decodeInt           {rate(lambda c: ecc.decodeInt(c, codeLength), codewords):10.0f}/s")
+  print(f"decodeOverflowArea  {rate(decodeOverflowArea, areas):10.0f}/s")
+
+  try:
+    import numpy as np
+  except ImportError:
+    return
+  words = np.array([list(c.to_bytes(7, 'little')) for c in codewords], dtype=np.uint8)
+  start = time.perf_counter()
+  ecc.decodeMany(words, codeLength)
+  print(f"decodeMany          {count / (time.perf_counter() - start):10.0f}/s")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  bench_nearby.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Cost of the nearby beacon table of vBeacon at 10 to 5000 beacons:
+#
+#    update   - one sighting with a delayed publish (the default)
+#    publish0 - one sighting with publishDelay=0 (snapshot per sighting)
+#    publish  - building and publishing one snapshot
+#    expire   - removing one expired beacon
+#
+#    python3 bench/bench_nearby.py [sightings]
+#
+#========================================================================
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from NearbyBeacons import NearbyBeacons
+
+
+#========================================================================
+#  Clock that only moves when told to, keeps the timers out of the way
+#========================================================================
+class Clock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+#========================================================================
+#
+#  Microseconds per sighting of count sightings spread over n beacons
+#
+#========================================================================
+def timeUpdates(n, count, publishDelay):
+  clock = Clock()
+  nearby = NearbyBeacons(expiration=10, publishDelay=publishDelay, clock=clock)
+  for i in range(n):
+    nearby.update(2, i, -59, -60)
+
+  start = time.perf_counter()
+  for i in range(count):
+    nearby.update(2, i % n, -59, -60)
+  elapsed = time.perf_counter() - start
+  nearby.close()
+  return 1e6 * elapsed / count
+
+
+#========================================================================
+#
+#  Microseconds of one publish and of expiring one beacon at n beacons
+#
+#========================================================================
+def timeExpiry(n):
+  clock = Clock()
+  nearby = NearbyBeacons(expiration=10, publishDelay=0, clock=clock)
+  for i in range(n):
+    nearby.update(2, i, -59, -60)
+
+  # pylint: disable=protected-access
+  with nearby.lock:
+    start = time.perf_counter()
+    nearby._publish(clock.now)
+    publish = time.perf_counter() - start
+
+  clock.now = clock.now + 11
+  start = time.perf_counter()
+  nearby.expire()
+  expire = time.perf_counter() - start
+  assert len(nearby) == 0 and nearby.snapshot.beacons == ()
+  nearby.close()
+  return 1e6 * publish, 1e6 * expire / n
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  count = int(args[0]) if len(args) > 0 else 20000
+
+  print("beacons  update  publish0  publish  expire/beacon")
+  for n in (10, 100, 1000, 5000):
+    update = timeUpdates(n, count, 0.1)
+    publish0 = timeUpdates(n, count // 10, 0)
+    publish, expire = timeExpiry(n)
+    print(f"{n:7d}  {update:4.2f}us  {publish0:6.1f}us  {publish:5.0f}us  {expire:11.2f}us")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  bench_parser.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  iBeacon decode cost of the fixed offset fast path
+#  (parse_ibeacon_packet) against the construct based LTV parser, and
+#  of parse_packet for a non iBeacon frame that still takes the slow
+#  path.
+#
+#    python3 bench/bench_parser.py [count]
+#
+#========================================================================
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from beacontools.parser import parse_ibeacon_packet, parse_ltv_packet, parse_packet
+
+
+IBEACON = bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) + \
+          bytes.fromhex("2f234454cf6d4a0fadf2f4911ba9ffa6") + bytes([0x00, 0x02, 0x22, 0xb8, 0xc5])
+EDDYSTONE_UID = bytes.fromhex("0201060303aafe1716aafe00e300112233445566778899aabbccddeeff0000")
+
+
+#========================================================================
+#
+#  Microseconds per call of parse on packet
+#
+#========================================================================
+def timePerCall(parse, packet, count):
+  start = time.perf_counter()
+  for i in range(count):
+    parse(packet)
+  return 1e6 * (time.perf_counter() - start) / count
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  count = int(args[0]) if len(args) > 0 else 20000
+
+  assert parse_ibeacon_packet(IBEACON).properties == parse_ltv_packet(IBEACON).properties
+
+  fast = timePerCall(parse_ibeacon_packet, IBEACON, count)
+  slow = timePerCall(parse_ltv_packet, IBEACON, count)
+  print(f"iBeacon   fast path    {fast:8.2f}us")
+  print(f"iBeacon   construct    {slow:8.2f}us  ({slow / fast:.0f}x)")
+  print(f"iBeacon   parse_packet {timePerCall(parse_packet, IBEACON, count):8.2f}us")
+  print(f"Eddystone parse_packet {timePerCall(parse_packet, EDDYSTONE_UID, count):8.2f}us")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  bench_reports.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Sightings per second delivered by BeaconScanner when the controller
+#  batches 1 to 6 reports into one LE advertising report event.  The
+#  "single" column is what a one-report-per-event parser delivers: it
+#  drops everything but the first report of every event.
+#
+#    python3 bench/bench_reports.py [adverts]
+#
+#========================================================================
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from beacontools import BeaconScanner
+from CrowdSimulator import CrowdSimulator
+
+
+UUID = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+
+
+#========================================================================
+#
+#  Run one simulated crowd through a scanner
+#  Returns (sightings, events, seconds)
+#
+#========================================================================
+def run(reportsPerEvent, adverts):
+  sightings = [0]
+
+  def callback(scanner, beaconType, btAddr, rssi, packet, properties):
+    sightings[0] = sightings[0] + 1
+
+  sim = CrowdSimulator(UUID, iBeacons=500, overflowBeacons=0, reportsPerEvent=reportsPerEvent,
+                       maxAdverts=adverts, seed=1)
+  scanner = BeaconScanner(callback, backend=sim)
+  scanner.start()
+  while sim.endTime is None:
+    time.sleep(0.01)
+  scanner.stop()
+  return sightings[0], sim.eventsGenerated, sim.endTime - sim.startTime
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  adverts = int(args[0]) if len(args) > 0 else 50000
+
+  print("reports/event  sightings  single  sightings/s")
+  for reportsPerEvent in range(1, 7):
+    sightings, events, elapsed = run(reportsPerEvent, adverts)
+    print(f"{reportsPerEvent:13d}  {sightings:9d}  {events:6d}  {sightings / elapsed:11.0f}")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
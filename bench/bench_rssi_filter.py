@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  bench_rssi_filter.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  The RSSI filters of RssiFilter on generated traces:
+#
+#    flaps  - crossings of the 2 meter distance threshold
+#    update - streaming update() per sample
+#    batch  - filterMany over all traces
+#
+#  Every trace is a beacon walking between 0.5 and 4 meters with
+#  Gaussian noise and occasional deep fades.
+#
+#    python3 bench/bench_rssi_filter.py [beacons] [samples]
+#
+#========================================================================
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from RssiFilter import EmaFilter, KalmanFilter, MedianFilter, distance
+
+
+TX_POWER = -59
+PATH_LOSS = 2.0
+THRESHOLD = 2.0
+
+
+#========================================================================
+#
+#  beacons x samples matrix of generated RSSI traces
+#
+#========================================================================
+def makeTraces(beacons, samples):
+  rand = random.Random(1)
+  traces = np.empty((beacons, samples))
+  for row in range(beacons):
+    meters = rand.uniform(0.5, 4.0)
+    for column in range(samples):
+      meters = min(4.0, max(0.5, meters + rand.gauss(0, 0.05)))
+      rssi = TX_POWER - 10 * PATH_LOSS * np.log10(meters) + rand.gauss(0, 4)
+      if rand.random() < 0.05:
+        rssi = rssi - rand.uniform(10, 20)
+      traces[row, column] = round(rssi)
+  return traces
+
+
+#========================================================================
+#
+#  Number of threshold crossings of the filtered traces
+#
+#========================================================================
+def flaps(values):
+  near = distance(values, TX_POWER, PATH_LOSS) < THRESHOLD
+  return int(np.count_nonzero(near[:, 1:] != near[:, :-1]))
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  beacons = int(args[0]) if len(args) > 0 else 1000
+  samples = int(args[1]) if len(args) > 1 else 200
+  traces = makeTraces(beacons, samples)
+
+  print(f"{beacons} beacons x {samples} samples")
+  print(f"raw          flaps={flaps(traces)}")
+
+  for prototype in (EmaFilter(), KalmanFilter(), MedianFilter()):
+    filters = [prototype.new() for row in range(beacons)]
+    filtered = np.empty_like(traces)
+    start = time.perf_counter()
+    for column in range(samples):
+      for row in range(beacons):
+        filtered[row, column] = filters[row].update(traces[row, column])
+    streaming = (time.perf_counter() - start) / (beacons * samples)
+
+    start = time.perf_counter()
+    batch = prototype.filterMany(traces)
+    batched = time.perf_counter() - start
+    assert np.allclose(batch, filtered[:, -1])
+
+    print(f"{type(prototype).__name__:<12} flaps={flaps(filtered)} "
+          f"update={1e6 * streaming:.2f}us batch={1e3 * batched:.1f}ms")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
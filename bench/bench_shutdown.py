@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  bench_shutdown.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  BeaconScanner start/stop cycles against a socket that never
+#  receives an advert, the case where the receive thread used to block
+#  in recv() until the next advert came in.  The HCI socket is one end
+#  of a socketpair, so no radio is needed.
+#
+#    python3 bench/bench_shutdown.py [cycles]
+#
+#========================================================================
+import os
+import sys
+import time
+import socket
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
+from beacontools import BeaconScanner
+
+
+#========================================================================
+#  Backend whose HCI socket stays silent
+#========================================================================
+class SilentBackend:
+  def __init__(self):
+    self.commands = []
+    self.peers = []
+
+  def open_dev(self, btDeviceId):
+    sock, peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    self.peers.append(peer)
+    return sock
+
+  def send_cmd(self, socket, groupField, commandField, data):
+    self.commands.append((groupField, commandField, bytes(data)))
+
+  def send_req(self, socket, groupField, commandField, event, rlen, params, timeout):
+    raise NotImplementedError("send_req is not supported by the silent backend")
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  cycles = int(args[0]) if len(args) > 0 else 200
+  backend = SilentBackend()
+
+  def callback(scanner, beaconType, btAddr, rssi, packet, properties):
+    pass
+
+  stops = []
+  start = time.perf_counter()
+  for i in range(cycles):
+    scanner = BeaconScanner(callback, backend=backend)
+    scanner.start()
+    # Let the receive thread block on the idle socket
+    time.sleep(0.001)
+    stop = time.perf_counter()
+    scanner.stop()
+    stops.append(time.perf_counter() - stop)
+  elapsed = time.perf_counter() - start
+
+  for peer in backend.peers:
+    peer.close()
+  stops.sort()
+  print(f"cycles={cycles} cycle={1e3 * elapsed / cycles:.2f}ms "
+        f"stop median={1e3 * stops[len(stops) // 2]:.3f}ms max={1e3 * stops[-1]:.3f}ms")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
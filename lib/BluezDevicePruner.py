@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  BluezDevicePruner.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  During a long discovery session bluetoothd keeps an org.bluez.Device1
+#  object for every random address it has seen.  The pruner periodically
+#  removes the devices of an adapter that are neither paired, trusted nor
+#  connected and were not seen within a window, through
+#  Adapter1.RemoveDevice.  At most maxRemovals devices are removed per
+#  run, the oldest first, so bluetoothd is never flooded with calls.
+#
+#  bluetoothd does not tell when a device was last seen, lastSeen(path)
+#  can supply it (e.g. from the scanner's DeviceTable).  Devices lastSeen
+#  does not know are timed from the first run that found them.
+#
+#========================================================================
+import sys
+import time
+
+import dbus
+from gi.repository import GLib
+
+
+DEVICE_INTERFACE = "org.bluez.Device1"
+
+
+class BluezDevicePruner:
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #  objectManager - org.freedesktop.DBus.ObjectManager of org.bluez
+  #  adapter       - org.bluez.Adapter1 interface of the adapter to prune
+  #  window        - seconds a device may go unseen before it is removed
+  #  interval      - seconds between two runs
+  #  maxRemovals   - max RemoveDevice calls per run
+  #  lastSeen      - optional function returning the time.monotonic()
+  #                  a device path was last seen, or None
+  #  onRemoved     - optional function called with every removed path
+  #
+  #========================================================================
+  def __init__(self, objectManager, adapter, window=120, interval=60,
+               maxRemovals=32, lastSeen=None, onRemoved=None):
+    self.objectManager = objectManager
+    self.adapter = adapter
+    self.adapterPath = str(adapter.object_path)
+    self.window = window
+    self.interval = interval
+    self.maxRemovals = maxRemovals
+    self.lastSeen = lastSeen
+    self.onRemoved = onRemoved
+
+    # Device path -> time the pruner first found it
+    self.firstSeen = {}
+    self.timer = None
+
+    # Metrics
+    self.runs = 0
+    self.removed = 0
+    self.failures = 0
+    self.deferred = 0
+    self.devices = 0
+    self.lastRunDuration = 0.0
+
+
+  #========================================================================
+  #
+  #  Run every interval seconds on the GLib main loop
+  #
+  #========================================================================
+  def start(self):
+    if self.timer is None:
+      self.timer = GLib.timeout_add_seconds(self.interval, self._timeout)
+
+
+  #========================================================================
+  #
+  #  Stop the periodic runs
+  #
+  #========================================================================
+  def stop(self):
+    if self.timer is not None:
+      GLib.source_remove(self.timer)
+      self.timer = None
+
+
+  #========================================================================
+  #
+  #  Remove stale devices once
+  #  Returns the number of devices removed
+  #
+  #========================================================================
+  def prune(self, now=None):
+    started = time.monotonic()
+    if now is None:
+      now = started
+    self.runs = self.runs + 1
+
+    objects = self.objectManager.GetManagedObjects()
+    prefix = self.adapterPath + "/"
+
+    stale = []
+    present = set()
+    for path, interfaces in objects.items():
+      device = interfaces.get(DEVICE_INTERFACE)
+      if device is None or not path.startswith(prefix):
+        continue
+      present.add(path)
+
+      if device.get("Paired", False) or device.get("Trusted", False) or \
+         device.get("Connected", False):
+        continue
+
+      seen = self.lastSeen(path) if self.lastSeen is not None else None
+      if seen is None:
+        seen = self.firstSeen.setdefault(path, now)
+      if now - seen > self.window:
+        stale.append((seen, path))
+
+    # Forget devices bluetoothd dropped by itself
+    for path in list(self.firstSeen):
+      if path not in present:
+        del self.firstSeen[path]
+    self.devices = len(present)
+
+    stale.sort()
+    if len(stale) > self.maxRemovals:
+      self.deferred = self.deferred + len(stale) - self.maxRemovals
+      stale = stale[0:self.maxRemovals]
+
+    removed = 0
+    for seen, path in stale:
+      try:
+        self.adapter.RemoveDevice(dbus.ObjectPath(path))
+      except dbus.exceptions.DBusException as error:
+        self.failures = self.failures + 1
+        print(f"RemoveDevice {path} failed: {error}")
+        continue
+      removed = removed + 1
+      self.firstSeen.pop(path, None)
+      if self.onRemoved is not None:
+        self.onRemoved(path)
+
+    self.removed = self.removed + removed
+    self.lastRunDuration = time.monotonic() - started
+    return removed
+
+
+  #========================================================================
+  #
+  #  Metrics
+  #
+  #========================================================================
+  def stats(self):
+    return {
+      "runs":            self.runs,
+      "devices":         self.devices,
+      "removed":         self.removed,
+      "failures":        self.failures,
+      "deferred":        self.deferred,
+      "lastRunDuration": self.lastRunDuration
+    }
+
+
+  #========================================================================
+  #
+  #  GLib timeout callback, keeps the timer running
+  #
+  #========================================================================
+  def _timeout(self):
+    try:
+      self.prune()
+    except dbus.exceptions.DBusException as error:
+      self.failures = self.failures + 1
+      print(f"Pruning BlueZ devices failed: {error}")
+    return True
+
+
+
+#========================================================================
+#
+#  main: prune the devices of the first adapter every 10 seconds
+#
+#========================================================================
+def main(args):
+  import bluezutils
+
+  window = int(args[0]) if len(args) > 0 else 120
+  bus = dbus.SystemBus()
+  objectManager = dbus.Interface(bus.get_object("org.bluez", "/"),
+                                 "org.freedesktop.DBus.ObjectManager")
+  pruner = BluezDevicePruner(objectManager, bluezutils.find_adapter(),
+                             window=window, interval=10,
+                             onRemoved=lambda path: print(f"Removed {path}"))
+  pruner.start()
+  try:
+    GLib.MainLoop().run()
+  except KeyboardInterrupt:
+    pass
+  pruner.stop()
+  print(pruner.stats())
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  BluezSession.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  One system bus connection and one GLib main loop thread shared by the
+#  D-Bus based components (iBeaconAdvertiser, OverflowAreaBeaconScanner).
+#  Components pass session= to use it, call acquire() when they start
+#  and release() when they stop; the main loop thread runs while at
+#  least one component holds the session.
+#
+#========================================================================
+import sys
+import threading
+
+import dbus
+import dbus.mainloop.glib
+from gi.repository import GLib
+
+
+BLUEZ_SERVICE_NAME = "org.bluez"
+DBUS_OM_IFACE = "org.freedesktop.DBus.ObjectManager"
+ADAPTER_IFACE = "org.bluez.Adapter1"
+
+
+class BluezSession:
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #========================================================================
+  def __init__(self):
+    # The default main loop must be set before the bus is connected
+    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    self.bus = dbus.SystemBus()
+    self.objectManager = dbus.Interface(self.bus.get_object(BLUEZ_SERVICE_NAME, "/"),
+                                        DBUS_OM_IFACE)
+    self.objects = None
+
+    self.mainloop = GLib.MainLoop()
+    self.thread = None
+    self.users = 0
+    self.lock = threading.Lock()
+
+
+  #========================================================================
+  #
+  #  Managed objects of bluetoothd, enumerated once and cached
+  #
+  #========================================================================
+  def getManagedObjects(self, refresh=False):
+    if self.objects is None or refresh:
+      self.objects = self.objectManager.GetManagedObjects()
+    return self.objects
+
+
+  #========================================================================
+  #
+  #  Path of the first object implementing interface (the adapter)
+  #  Returns None if there is none
+  #
+  #========================================================================
+  def findAdapterPath(self, interface=ADAPTER_IFACE):
+    for path, interfaces in self.getManagedObjects().items():
+      if interface in interfaces:
+        return path
+    return None
+
+
+  #========================================================================
+  #
+  #  interface of the adapter as dbus.Interface
+  #
+  #========================================================================
+  def adapterInterface(self, interface=ADAPTER_IFACE):
+    path = self.findAdapterPath(interface)
+    if path is None:
+      raise Exception("Bluetooth adapter not found")
+    return dbus.Interface(self.bus.get_object(BLUEZ_SERVICE_NAME, path), interface)
+
+
+  #========================================================================
+  #
+  #  Register a component, starts the main loop thread if needed
+  #
+  #========================================================================
+  def acquire(self):
+    self.lock.acquire()
+    self.users = self.users + 1
+    if self.thread is None:
+      self.thread = threading.Thread(target=self.mainloop.run, name="BluezSession",
+                                     daemon=True)
+      self.thread.start()
+    self.lock.release()
+
+
+  #========================================================================
+  #
+  #  Unregister a component, stops the main loop with the last one
+  #
+  #========================================================================
+  def release(self):
+    self.lock.acquire()
+    thread = None
+    if self.users > 0:
+      self.users = self.users - 1
+      if self.users == 0 and self.thread is not None:
+        thread = self.thread
+        self.thread = None
+        self.mainloop.quit()
+    self.lock.release()
+
+    if thread is not None and thread is not threading.current_thread():
+      thread.join()
+
+
+  #========================================================================
+  #
+  #  Run function(*args) on the main loop thread
+  #
+  #========================================================================
+  def callSoon(self, function, *args):
+    def call():
+      function(*args)
+      return False
+    GLib.idle_add(call)
+
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  session = BluezSession()
+  print(f"adapter={session.findAdapterPath()} objects={len(session.getManagedObjects())}")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,331 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  CrowdSimulator.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Generates raw HCI LE advertising report events for a crowd of virtual
+#  iBeacons and overflowArea beacons.  A CrowdSimulator instance is a
+#  beacontools backend (open_dev/send_cmd/send_req) and the socket it
+#  opens, so it can be handed to BeaconScanner or iBeaconScanner:
+#
+#    sim = CrowdSimulator(uuid, iBeacons=500, overflowBeacons=500)
+#    scanner = iBeaconScanner(uuid, callback, backend=sim)
+#
+#========================================================================
+import sys
+import time
+import heapq
+import random
+
+sys.path.append('lib')
+from OverflowArea import encodeOverflowArea, OVERFLOW_AREA_TYPE
+
+
+HCI_EVENT_PKT = 0x04
+LE_META_EVENT = 0x3E
+EVT_LE_ADVERTISING_REPORT = 0x02
+ADV_IND = 0x00
+ADV_NONCONN_IND = 0x03
+RANDOM_ADDRESS = 0x01
+
+# Max parameter length of an HCI event
+MAX_EVENT_LEN = 255
+
+
+#========================================================================
+#  A single simulated beacon
+#========================================================================
+class VirtualBeacon:
+  __slots__ = ("address", "eventType", "major", "minor", "txPower",
+               "rssi", "departAt", "data")
+
+  def __init__(self, address, eventType, major, minor, txPower, rssi, departAt, data):
+    self.address = address
+    self.eventType = eventType
+    self.major = major
+    self.minor = minor
+    self.txPower = txPower
+    self.rssi = rssi
+    self.departAt = departAt
+    self.data = data
+
+
+class CrowdSimulator:
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #  uuid            - proximity UUID of the virtual iBeacons
+  #  iBeacons        - number of virtual iBeacons in range
+  #  overflowBeacons - number of virtual overflowArea (backgrounded iOS) beacons
+  #  interval        - advertising interval in seconds
+  #  rssi, rssiStep  - initial RSSI and max step of the RSSI random walk
+  #  meanDwell       - mean seconds a beacon stays in range before it is
+  #                    replaced by a new arrival, None disables churn
+  #  reportsPerEvent - max reports batched into one HCI event
+  #  realtime        - pace events at the simulated advertising rate
+  #                    instead of generating them as fast as possible
+  #  maxAdverts      - end of stream (recv returns b'') after this many
+  #
+  #========================================================================
+  def __init__(self, uuid, iBeacons=100, overflowBeacons=100, interval=0.1,
+               txPower=-59, rssi=-65, rssiStep=2, meanDwell=None,
+               reportsPerEvent=4, realtime=False, maxAdverts=None, seed=None):
+    if iBeacons + overflowBeacons <= 0:
+      raise ValueError("CrowdSimulator needs at least one beacon")
+
+    self.uuid = list(bytes.fromhex(uuid.replace("-", "")))
+    self.interval = interval
+    self.txPower = txPower
+    self.rssi = rssi
+    self.rssiStep = rssiStep
+    self.meanDwell = meanDwell
+    self.reportsPerEvent = reportsPerEvent
+    self.realtime = realtime
+    self.maxAdverts = maxAdverts
+    self.random = random.Random(seed)
+
+    self.commands = []
+    self.advertsGenerated = 0
+    self.eventsGenerated = 0
+    self.arrivals = 0
+    self.departures = 0
+    self.startTime = None
+    self.endTime = None
+
+    self.now = 0.0
+    self.nextMinor = 0
+    self.queue = []
+    self.sequence = 0
+    for i in range(iBeacons):
+      self._schedule(self._newBeacon(overflow=False), self.random.uniform(0, interval))
+    for i in range(overflowBeacons):
+      self._schedule(self._newBeacon(overflow=True), self.random.uniform(0, interval))
+
+
+  #========================================================================
+  #
+  #  beacontools backend interface
+  #
+  #========================================================================
+  def open_dev(self, btDeviceId):
+    return self
+
+  def send_cmd(self, socket, groupField, commandField, data):
+    self.commands.append((groupField, commandField, bytes(data)))
+
+  def send_req(self, socket, groupField, commandField, event, rlen, params, timeout):
+    raise NotImplementedError("send_req is not supported by the simulator")
+
+
+  #========================================================================
+  #
+  #  Socket interface: return the next LE advertising report event
+  #
+  #========================================================================
+  def recv(self, bufsize):
+    if self.startTime is None:
+      self.startTime = time.monotonic()
+
+    if self.maxAdverts is not None and self.advertsGenerated >= self.maxAdverts:
+      if self.endTime is None:
+        self.endTime = time.monotonic()
+      return b""
+
+    reports = []
+    length = 2
+    while len(reports) < self.reportsPerEvent:
+      if self.maxAdverts is not None and \
+         self.advertsGenerated + len(reports) >= self.maxAdverts:
+        break
+      due, seq, beacon = self.queue[0]
+      report = self._report(beacon)
+      if length + len(report) > MAX_EVENT_LEN:
+        break
+      heapq.heappop(self.queue)
+      self.now = due
+
+      if self.meanDwell is not None and due >= beacon.departAt:
+        # Beacon walked away, a new one shows up in its place
+        self.departures = self.departures + 1
+        beacon = self._newBeacon(overflow=beacon.eventType == ADV_IND)
+        report = self._report(beacon)
+
+      reports.append(report)
+      length = length + len(report)
+      self._walkRssi(beacon)
+      # BLE adds a random 0-10ms advDelay to every advertising event
+      self._schedule(beacon, due + self.interval + self.random.uniform(0, 0.01))
+
+    if self.realtime:
+      delay = self.startTime + self.now - time.monotonic()
+      if delay > 0:
+        time.sleep(delay)
+
+    self.advertsGenerated = self.advertsGenerated + len(reports)
+    self.eventsGenerated = self.eventsGenerated + 1
+    event = bytes([HCI_EVENT_PKT, LE_META_EVENT, length,
+                   EVT_LE_ADVERTISING_REPORT, len(reports)]) + b"".join(reports)
+    return event[:bufsize]
+
+  def close(self):
+    if self.endTime is None:
+      self.endTime = time.monotonic()
+
+
+  #========================================================================
+  #
+  #  Adverts per second generated so far
+  #
+  #========================================================================
+  def advertsPerSecond(self):
+    if self.startTime is None:
+      return 0.0
+    elapsed = (self.endTime or time.monotonic()) - self.startTime
+    if elapsed <= 0:
+      return 0.0
+    return self.advertsGenerated / elapsed
+
+
+  #========================================================================
+  #
+  #  Create a beacon with a fresh random address and identifier
+  #
+  #========================================================================
+  def _newBeacon(self, overflow):
+    self.arrivals = self.arrivals + 1
+    major = 1 + self.random.randrange(0xffff)
+    minor = self.nextMinor
+    self.nextMinor = (self.nextMinor + 1) & 0xffff
+    address = bytes(self.random.randrange(256) for i in range(6))
+    rssi = self.rssi + self.random.randint(-10, 10)
+
+    if self.meanDwell is not None:
+      departAt = self.now + self.random.expovariate(1.0 / self.meanDwell)
+    else:
+      departAt = None
+
+    if overflow:
+      eventType = ADV_IND
+      data = self._overflowData(major, minor, self.txPower)
+    else:
+      eventType = ADV_NONCONN_IND
+      data = self._iBeaconData(major, minor, self.txPower)
+
+    return VirtualBeacon(address, eventType, major, minor, self.txPower,
+                         rssi, departAt, data)
+
+  def _schedule(self, beacon, due):
+    self.sequence = self.sequence + 1
+    heapq.heappush(self.queue, (due, self.sequence, beacon))
+
+  def _walkRssi(self, beacon):
+    rssi = beacon.rssi + self.random.randint(-self.rssiStep, self.rssiStep)
+    beacon.rssi = min(-20, max(-100, rssi))
+
+
+  #========================================================================
+  #
+  #  Build one report of an LE advertising report event
+  #
+  #========================================================================
+  def _report(self, beacon):
+    return bytes([beacon.eventType, RANDOM_ADDRESS]) + beacon.address + \
+           bytes([len(beacon.data)]) + beacon.data + bytes([beacon.rssi & 0xff])
+
+
+  #========================================================================
+  #
+  #  Advertising data of an iBeacon
+  #
+  #========================================================================
+  def _iBeaconData(self, major, minor, txPower):
+    return bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15] + self.uuid +
+                 [major >> 8, major & 0xff, minor >> 8, minor & 0xff, txPower & 0xff])
+
+
+  #========================================================================
+  #
+  #  Advertising data of an overflowArea beacon
+  #
+  #========================================================================
+  def _overflowData(self, major, minor, txPower):
+    return bytes([0x02, 0x01, 0x1a, 0x14, 0xff, 0x4c, 0x00, OVERFLOW_AREA_TYPE]) + \
+           encodeOverflowArea(major, minor, txPower)
+
+
+
+#========================================================================
+#
+#  main: load test the scanning path of vBeacon
+#
+#  iBeacons and overflowArea beacons are decoded from the simulated HCI
+#  socket (iBeaconScanner with overflowArea=True) and fed into the
+#  nearby table of vBeacon, while a reader polls its snapshot.
+#
+#========================================================================
+def main(args):
+  from threading import Thread
+  from iBeaconScanner import iBeaconScanner
+  from NearbyBeacons import NearbyBeacons
+
+  uuid = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+  beacons = int(args[0]) if len(args) > 0 else 500
+  nearby = NearbyBeacons(expiration=10)
+  updates = [0, 0.0, 0.0]
+  reads = [0, 0.0, 0]
+
+  def nearbyCallback(major, minor, txPower, rssi):
+    start = time.perf_counter()
+    nearby.update(major, minor, txPower, rssi)
+    elapsed = time.perf_counter() - start
+    updates[0] = updates[0] + 1
+    updates[1] = updates[1] + elapsed
+    updates[2] = max(updates[2], elapsed)
+
+  def reader():
+    while sim.endTime is None:
+      start = time.perf_counter()
+      size = len(nearby.snapshot.beacons)
+      reads[0] = reads[0] + 1
+      reads[1] = reads[1] + time.perf_counter() - start
+      reads[2] = max(reads[2], size)
+      time.sleep(0.001)
+
+  sim = CrowdSimulator(uuid, iBeacons=beacons, overflowBeacons=beacons,
+                       meanDwell=60.0, maxAdverts=200000, seed=1)
+  scanner = iBeaconScanner(uuid, nearbyCallback, backend=sim, overflowArea=True)
+  readerThread = Thread(target=reader, daemon=True)
+  scanner.start()
+  readerThread.start()
+  while sim.endTime is None:
+    time.sleep(0.1)
+  scanner.stop()
+  readerThread.join()
+  nearby.expire()
+
+  print(f"adverts={sim.advertsGenerated} events={sim.eventsGenerated} "
+        f"sightings={updates[0]} adverts/sec={sim.advertsPerSecond():.0f}")
+  print(f"nearby={len(nearby.snapshot.beacons)} max read={reads[2]} "
+        f"arrivals={sim.arrivals} departures={sim.departures}")
+  print(f"update mean={1e6 * updates[1] / max(1, updates[0]):.2f}us "
+        f"max={1e6 * updates[2]:.0f}us")
+  print(f"getNearbyBeacons mean={1e6 * reads[1] / max(1, reads[0]):.3f}us reads={reads[0]}")
+  nearby.close()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
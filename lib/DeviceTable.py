@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  DeviceTable.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Bounded table of the BlueZ devices seen by the D-Bus scanners, keyed
+#  by object path.  Only the fields the scanners use are kept (Address,
+#  RSSI and the Apple manufacturer data) in a slotted DeviceRecord.
+#  Devices not seen for ttl seconds are evicted, and the least recently
+#  seen ones are evicted when the table holds more than maxSize devices.
+#  Times are time.monotonic() seconds.
+#
+#========================================================================
+import sys
+import time
+from collections import OrderedDict
+
+
+# Bluetooth SIG company identifier of Apple
+APPLE_COMPANY_ID = 0x004c
+
+
+#========================================================================
+#  What we keep of one org.bluez.Device1 object
+#========================================================================
+class DeviceRecord:
+  __slots__ = ("address", "rssi", "manufacturerData", "complete",
+               "lastSeen", "decoded", "verdict")
+
+  def __init__(self, now):
+    self.address = None
+    self.rssi = None
+    # Apple manufacturer data as bytes, None if the device has none
+    self.manufacturerData = None
+    # Set once ManufacturerData was merged or all properties were, before
+    # that a None manufacturerData only means it was not signalled yet
+    self.complete = False
+    self.lastSeen = now
+    # Set once manufacturerData was decoded, verdict is the result
+    self.decoded = False
+    self.verdict = None
+
+  def update(self, properties, now, complete=False):
+    self.lastSeen = now
+    if complete:
+      self.complete = True
+    if 'Address' in properties:
+      self.address = str(properties['Address'])
+    if 'RSSI' in properties:
+      self.rssi = int(properties['RSSI'])
+    if 'ManufacturerData' in properties:
+      data = properties['ManufacturerData'].get(APPLE_COMPANY_ID)
+      self.manufacturerData = bytes(data) if data is not None else None
+      self.complete = True
+      self.decoded = False
+      self.verdict = None
+
+  def __repr__(self):
+    return (f"DeviceRecord(address={self.address}, rssi={self.rssi}, "
+            f"verdict={self.verdict})")
+
+
+class DeviceTable:
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #  ttl     - seconds a device is kept after it was last seen, None
+  #            keeps devices until the table is full
+  #  maxSize - max number of devices, None for no limit
+  #
+  #========================================================================
+  def __init__(self, ttl=300.0, maxSize=1024):
+    self.ttl = ttl
+    self.maxSize = maxSize
+    self.evictions = 0
+
+    # Ordered by last update, so stale devices are found at the front
+    self.records = OrderedDict()
+
+
+  #========================================================================
+  #
+  #  Merge D-Bus properties into the record of path
+  #  complete - properties holds all Device1 properties (GetAll,
+  #             GetManagedObjects), not only the changed ones
+  #  Returns the record
+  #
+  #========================================================================
+  def update(self, path, properties, now=None, complete=False):
+    if now is None:
+      now = time.monotonic()
+
+    record = self.records.get(path)
+    if record is None:
+      record = DeviceRecord(now)
+      self.records[path] = record
+    else:
+      self.records.move_to_end(path)
+    record.update(properties, now, complete)
+
+    self.expire(now)
+    return record
+
+
+  #========================================================================
+  #
+  #  Record of path, None if unknown or evicted
+  #
+  #========================================================================
+  def get(self, path):
+    return self.records.get(path)
+
+
+  #========================================================================
+  #
+  #  Forget a device
+  #
+  #========================================================================
+  def remove(self, path):
+    self.records.pop(path, None)
+
+
+  #========================================================================
+  #
+  #  Evict devices older than ttl and the oldest ones above maxSize
+  #
+  #========================================================================
+  def expire(self, now=None):
+    if now is None:
+      now = time.monotonic()
+
+    records = self.records
+    while records:
+      path = next(iter(records))
+      full = self.maxSize is not None and len(records) > self.maxSize
+      stale = self.ttl is not None and now - records[path].lastSeen > self.ttl
+      if not (full or stale):
+        break
+      del records[path]
+      self.evictions = self.evictions + 1
+
+
+  def __len__(self):
+    return len(self.records)
+
+  def __contains__(self, path):
+    return path in self.records
+
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  table = DeviceTable(ttl=1.0, maxSize=100)
+  for i in range(1000):
+    path = f"/org/bluez/hci0/dev_{i:012X}"
+    table.update(path, {'Address': f"{i:012X}", 'RSSI': -70,
+                        'ManufacturerData': {APPLE_COMPANY_ID: [0x01] + [0] * 16}},
+                 now=i * 0.01)
+  print(f"devices={len(table)} evictions={table.evictions}")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -1,212 +1,189 @@
 #!/usr/bin/python3
-
-import sys 
+#-----------------------------------------------------------------
+#
+#  Hamming (SECDED style) encoder/decoder used by the overflow
+#  area beacons.
+#
+#  Codewords are handled as ints packed LSB first (bit j of the
+#  int is bit j of the bit array).  The table driven int code lives
+#  in beacontools.hamming, which the HCI parser uses as well.
+#  Importing it loads the beacontools package, so its dependencies
+#  (construct, ahocorapy) must be installed.
+#  The list based methods are kept for compatibility and return
+#  exactly what the former bit-list implementation returned.
+#
+#-----------------------------------------------------------------
+
+import sys
+import time
+import random
+
+sys.path.append('lib')
+from beacontools.hamming import BIT_REVERSED, data_positions, encode_int, decode_int
+
+
+#-----------------------------------------------------------------
+#  Per-byte tables
+#-----------------------------------------------------------------
+
+# Bits of every byte value, LSB first and MSB first
+_BYTE_TO_BITS = [tuple((v >> bit) & 1 for bit in range(8)) for v in range(256)]
+_BYTE_TO_BITS_BE = [tuple((v >> (7 - bit)) & 1 for bit in range(8)) for v in range(256)]
+_BITS_TO_BYTE = {bits: v for v, bits in enumerate(_BYTE_TO_BITS)}
+_BITS_TO_BYTE_BE = {bits: v for v, bits in enumerate(_BYTE_TO_BITS_BE)}
 
 
 class HammingEcc:
 
-  #-----------------------------------------------------------------  
+  #-----------------------------------------------------------------
   #  Constructor
-  #-----------------------------------------------------------------  
+  #-----------------------------------------------------------------
   def __init__(self):
     pass
 
-  #-----------------------------------------------------------------  
+  #-----------------------------------------------------------------
   #  Convert a bit array to a byte array
   #  bits[0] and bytes[0] are LSB
   #  Returns byte array
-  #-----------------------------------------------------------------  
+  #-----------------------------------------------------------------
   def bitsToBytes(self, bits, bigEndian=False):
+    lookup = _BITS_TO_BYTE_BE if bigEndian else _BITS_TO_BYTE
     bytes = []
-    byteCount = (len(bits) + 7) // 8
-
-    for byteNum in range(byteCount):
-      byteValue = 0
-      for bit in range(8):
-        bitNum = byteNum * 8 + bit
-        if bits[bitNum] == 1:
-          if bigEndian:
-            byteValue = byteValue | (1 << (7-bit))
-          else:
-            byteValue = byteValue | (1 << bit)
+    for byteNum in range((len(bits) + 7) // 8):
+      chunk = tuple(bits[byteNum*8:byteNum*8+8])
+      byteValue = lookup.get(chunk)
+      if byteValue is None:
+        # Not a full chunk of 0/1 values
+        byteValue = 0
+        for bit in range(8):
+          if bits[byteNum * 8 + bit] == 1:
+            if bigEndian:
+              byteValue = byteValue | (1 << (7-bit))
+            else:
+              byteValue = byteValue | (1 << bit)
       bytes.append(byteValue)
 
     return bytes
 
-  #-----------------------------------------------------------------  
+  #-----------------------------------------------------------------
   #  Convert a byte array to a bit array
   #  bits[0] and bytes[0] are LSB
   #  Returns bit array
-  #-----------------------------------------------------------------  
+  #-----------------------------------------------------------------
   def bytesToBits(self, bytes, bigEndian=False):
+    lookup = _BYTE_TO_BITS_BE if bigEndian else _BYTE_TO_BITS
     bits = []
     for byte in bytes:
-      for bit in range(8):
-        if bigEndian:
-          if (byte & (1<<(7-bit))) > 0:
-            bitVal = 1 
-          else:
-            bitVal = 0
-        else:
-          if (byte & (1<<bit)) > 0:
-            bitVal = 1 
-          else:
-            bitVal = 0
-
-        bits.append(bitVal)
-
-    return bits 
-
-  #-----------------------------------------------------------------  
+      bits.extend(lookup[byte & 0xff])
+    return bits
+
+  #-----------------------------------------------------------------
+  #  Pack a bit array into an int, bits[0] is the LSB
+  #-----------------------------------------------------------------
+  def bitsToInt(self, bits):
+    padded = list(bits) + [0] * (-len(bits) % 8)
+    return int.from_bytes(bytearray(self.bitsToBytes(padded)), 'little')
+
+  #-----------------------------------------------------------------
+  #  Unpack the lowest length bits of an int into a bit array
+  #-----------------------------------------------------------------
+  def intToBits(self, value, length):
+    data = value.to_bytes((length + 7) // 8, 'little')
+    return self.bytesToBits(data)[0:length]
+
+  #-----------------------------------------------------------------
+  #  Encode the lowest dataLength bits of value
+  #  Returns (codeword, codeword length), the codeword includes the
+  #  extra parity bit as its highest bit
+  #-----------------------------------------------------------------
+  def encodeInt(self, value, dataLength):
+    return encode_int(value, dataLength)
+
+  #-----------------------------------------------------------------
+  #  Decode a codeword of codeLength bits (including the extra
+  #  parity bit), correcting a single bit error
+  #  Returns (data, data length) or None if the parity check fails
+  #-----------------------------------------------------------------
+  def decodeInt(self, codeword, codeLength):
+    return decode_int(codeword, codeLength)
+
+  #-----------------------------------------------------------------
   #  Encode bits
-  #-----------------------------------------------------------------  
+  #-----------------------------------------------------------------
   def encodeBits(self, inputBits):
-    outputBits = []
-    partyBitCount = 0
-    pos = 0
-    position = 0
-    while len(inputBits) > ((1 << pos) - (pos + 1)):
-      partyBitCount = partyBitCount + 1
-      pos = pos + 1
-  
-    parityPos = 0
-    nonPartyPos = 0
-    i = 0
-    while i < (partyBitCount + len(inputBits)):
-      if i == ((1<<parityPos)-1):
-        outputBits.append(0)
-        parityPos = parityPos + 1
-      else:
-        outputBits.append(inputBits[nonPartyPos])
-        nonPartyPos = nonPartyPos + 1
-      i = i + 1
- 
-    i = 0
-    while i < partyBitCount:
-      position = 1 << i
-      s = 0
-      count = 0
-      s = position - 1
-      while s < (partyBitCount + len(inputBits)):
-        j = s
-        while j < (s + position):
-          if len(outputBits) > j and outputBits[j] == 1:
-            count = count + 1
-          j = j + 1
-        s = s + 2*position
-
-      if (count % 2) == 0: 
-        outputBits[position-1] = 0
-      else:
-        outputBits[position-1] = 1
-      i = i + 1
-
-    extraParity = 0
-    for bit in outputBits:
-      extraParity = extraParity | bit
-    outputBits.append(extraParity)
-
-    return outputBits
-
-
-  #-----------------------------------------------------------------  
+    codeword, length = self.encodeInt(self.bitsToInt(inputBits), len(inputBits))
+    return self.intToBits(codeword, length)
+
+
+  #-----------------------------------------------------------------
   #  Decode bits
-  #-----------------------------------------------------------------  
+  #  Returns [] if the parity check fails
+  #-----------------------------------------------------------------
   def decodeBits(self, inputBits):
-    outputBits = []
-    ss = 0
-    error = 0
-    parityBitsRemoved = 0
-    workBits = inputBits
-    extraParity = workBits[len(workBits)-1]
-
-    workBits = workBits[0:len(workBits)-1]
-
-    length = len(workBits) 
-    parityCount = 0
-
-    pos = 0
-    while (len(inputBits) - parityCount) > ((1<<pos) - (pos+1)):
-      parityCount = parityCount + 1
-      pos = pos + 1
-
-    # Check whether there are any errors
-    i = 0
-    while i < parityCount:
-      count = 0
-      position = 1 << i
-      ss = position-1
-      while ss < length:
-        sss = ss
-
-        while sss < (ss + position):
-          if sss < len(workBits) and workBits[sss] == 1:
-            count = count + 1
-          sss = sss + 1
-    
-        ss = ss + 2*position
-
-      if (count % 2) != 0:
-        error = error + position
-      i = i + 1
-    
-    if error != 0:
-      if workBits[error-1] == 1:
-        workBits[error-1] = 0
-      else:
-        workBits[error-1] = 1
-
-      i = 0
-      while i < length:
-        if i == ((1 << parityBitsRemoved)-1):
-          parityBitsRemoved = parityBitsRemoved + 1
-        else:
-          if len(workBits) > i:
-            outputBits.append(workBits[i])
-          else:
-            outputBits.append(0)
-        i = i + 1
-
-    else:
-      i = 0
-      while i < length:
-        if i == ((1 << parityBitsRemoved)-1):
-          parityBitsRemoved = parityBitsRemoved + 1
-        else:
-          outputBits.append(workBits[i])
-        i = i + 1
-
-    parity = 0
-    for bit in outputBits:
-      parity = parity | bit
-    
-    if parity != extraParity:
+    if len(inputBits) == 0:
+      raise IndexError("Nothing to decode")
+    decoded = self.decodeInt(self.bitsToInt(inputBits), len(inputBits))
+    if decoded is None:
       return []
- 
-    return outputBits
-
-
-
-#-----------------------------------------------------------------  
-#  Main 
-#-----------------------------------------------------------------  
+    data, dataLength = decoded
+    return self.intToBits(data, dataLength)
+
+
+  #-----------------------------------------------------------------
+  #  Decode many codewords at once with NumPy
+  #
+  #  words      - uint8 array of shape (N, bytes per codeword), each
+  #               row a codeword packed LSB first like encodeInt
+  #  codeLength - codeword length in bits (including extra parity)
+  #
+  #  Returns (data, ok): uint8 array of shape (N, data bytes) with
+  #  the data bits packed LSB first, and a bool array telling which
+  #  rows passed the parity check.  Rows with an uncorrectable
+  #  syndrome are reported as not ok instead of raising.
+  #-----------------------------------------------------------------
+  def decodeMany(self, words, codeLength):
+    import numpy as np
+
+    workLength = codeLength - 1
+    positions = data_positions(workLength)
+
+    words = np.asarray(words, dtype=np.uint8)
+    bits = np.unpackbits(words, axis=1, bitorder='little')[:, 0:codeLength]
+    extraParity = bits[:, workLength].astype(bool)
+    work = bits[:, 0:workLength].copy()
+
+    weights = np.arange(1, workLength + 1, dtype=np.int64)
+    syndrome = np.bitwise_xor.reduce(work * weights, axis=1)
+    uncorrectable = syndrome > workLength
+    rows = np.nonzero((syndrome > 0) & ~uncorrectable)[0]
+    work[rows, syndrome[rows] - 1] ^= 1
+
+    dataBits = work[:, positions]
+    ok = (dataBits.any(axis=1) == extraParity) & ~uncorrectable
+    return np.packbits(dataBits, axis=1, bitorder='little'), ok
+
+
+
+#-----------------------------------------------------------------
+#  Main
+#-----------------------------------------------------------------
 def main(args):
   ecc = HammingEcc()
-  bits = [1, 0, 0, 0, 0, 0, 0, 0, 
-          0, 0, 0, 0, 0, 0, 0, 0, 
-          0, 0, 0, 0, 0, 0, 0, 0, 
-          0, 0, 0, 0, 0, 0, 0, 0, 
-          0, 0, 0, 0, 0, 0, 0, 0, 
-          0, 0, 0, 0, 0, 0, 0, 0, 
-          0, 0, 0, 0, 0, 0, 0, 0, 
-          0, 0, 0, 0, 0, 0, 0, 0, 
-          1, 0, 0, 0, 1, 0, 1, 0, 
-          0, 1, 0, 1, 0, 0, 0, 1, 
-          0, 0, 0, 0, 0, 1, 0, 0, 
-          0, 0, 0, 0, 0, 1, 1, 0, 
-          1, 0, 1, 0, 0, 0, 0, 0, 
-          1, 1, 0, 0, 1, 1, 1, 0, 
-          0, 0, 0, 0, 0, 0, 0, 0, 
+  bits = [1, 0, 0, 0, 0, 0, 0, 0,
+          0, 0, 0, 0, 0, 0, 0, 0,
+          0, 0, 0, 0, 0, 0, 0, 0,
+          0, 0, 0, 0, 0, 0, 0, 0,
+          0, 0, 0, 0, 0, 0, 0, 0,
+          0, 0, 0, 0, 0, 0, 0, 0,
+          0, 0, 0, 0, 0, 0, 0, 0,
+          0, 0, 0, 0, 0, 0, 0, 0,
+          1, 0, 0, 0, 1, 0, 1, 0,
+          0, 1, 0, 1, 0, 0, 0, 1,
+          0, 0, 0, 0, 0, 1, 0, 0,
+          0, 0, 0, 0, 0, 1, 1, 0,
+          1, 0, 1, 0, 0, 0, 0, 0,
+          1, 1, 0, 0, 1, 1, 1, 0,
+          0, 0, 0, 0, 0, 0, 0, 0,
           0, 0, 0, 0, 0, 0, 0, 0  ]
 
   bytes = ecc.bitsToBytes(bits)
@@ -220,8 +197,31 @@ def main(args):
   print(f"recovered bytes = {recovered_bits}")
   print(f"encoded bits = {encoded_bits}")
   print(f"decoded bits = {decoded_bits}")
-  print(f"decoded bytes = {decoded_bytes}") 
+  print(f"decoded bytes = {decoded_bytes}")
+
+  # Decode speed on the 55 bit overflow area codewords
+  rng = random.Random(1)
+  count = 20000
+  codewords = []
+  for i in range(count):
+    codeword, codeLength = ecc.encodeInt(rng.getrandbits(48), 48)
+    codewords.append(codeword ^ (1 << rng.randrange(54)))
+
+  start = time.perf_counter()
+  for codeword in codewords:
+    ecc.decodeInt(codeword, codeLength)
+  elapsed = time.perf_counter() - start
+  print(f"decodeInt: {count / elapsed:.0f} codewords/sec")
+
+  try:
+    import numpy as np
+  except ImportError:
+    return
+  words = np.array([list(c.to_bytes(7, 'little')) for c in codewords], dtype=np.uint8)
+  start = time.perf_counter()
+  ecc.decodeMany(words, codeLength)
+  elapsed = time.perf_counter() - start
+  print(f"decodeMany: {count / elapsed:.0f} codewords/sec")
 
 if __name__ == '__main__':
   main(sys.argv[1:])
-
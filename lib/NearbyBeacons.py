@@ -0,0 +1,304 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  NearbyBeacons.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Table of the beacons seen within the last expiration seconds, as
+#  kept by vBeacon.
+#
+#  Writers (the scanner callbacks) update the table under a lock and
+#  publish an immutable NearbySnapshot into the snapshot attribute.
+#  Readers only read that attribute, they never lock or write.  With
+#  publishDelay the snapshot is published at most that many seconds
+#  after a change instead of on every sighting, so a sighting stays
+#  O(1) however many beacons are nearby.  A timer publishes pending
+#  changes and expires beacons when no sightings come in.
+#
+#========================================================================
+import sys
+import time
+import datetime
+from collections import OrderedDict, namedtuple
+from threading import Lock, Timer
+
+sys.path.append('lib')
+from RssiHistory import RssiHistory
+from RssiFilter import distance, historyMatrix
+
+
+#========================================================================
+#  Nearby beacon, seen is the clock time of the last sighting,
+#  filteredRssi the output of the RSSI filter (rssi without one) and
+#  distance the estimated distance in meters
+#========================================================================
+NearbyBeacon = namedtuple("NearbyBeacon", ["major", "minor", "txPower", "rssi", "date", "seen",
+                                           "filteredRssi", "distance"])
+
+#========================================================================
+#  Immutable view of the nearby beacons, published for the readers
+#  expiresAt is when its oldest beacon expires
+#========================================================================
+NearbySnapshot = namedtuple("NearbySnapshot", ["version", "expiresAt", "beacons"])
+
+
+class NearbyBeacons:
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #  expiration   - seconds a beacon stays in the table after its last
+  #                 sighting
+  #  publishDelay - max seconds between a change and its snapshot,
+  #                 0 publishes on every change (O(n) per sighting)
+  #  rssiHistory  - number of (time, RSSI) samples kept per beacon
+  #                 (~9 bytes each), None keeps none
+  #  rssiFilter   - RssiFilter filter, each beacon gets its new()
+  #  pathLoss     - path loss exponent of the distance estimate
+  #  clock        - time source, time.monotonic by default
+  #
+  #========================================================================
+  def __init__(self, expiration=10, publishDelay=0.1, rssiHistory=64, rssiFilter=None,
+               pathLoss=2.0, clock=time.monotonic):
+    self.expiration = expiration
+    self.publishDelay = publishDelay
+    self.rssiHistory = rssiHistory
+    self.rssiFilter = rssiFilter
+    self.pathLoss = pathLoss
+    self.clock = clock
+
+    # (major << 16) | minor -> NearbyBeacon, in the order the beacons
+    # were last seen.  Every change bumps version
+    self.beacons = OrderedDict()
+    self.version = 0
+    self.snapshot = NearbySnapshot(0, float("inf"), ())
+    # (major << 16) | minor -> RssiHistory / RSSI filter of the beacons
+    self.histories = {}
+    self.filters = {}
+
+    self.timer = None
+    self.timerDue = None
+    self.timerSequence = 0
+    self.lock = Lock()
+
+
+  #========================================================================
+  #
+  #  Add a sighting, returns the NearbyBeacon record
+  #
+  #========================================================================
+  def update(self, major, minor, txPower, rssi):
+    id = (major << 16) | minor
+    date = datetime.datetime.utcnow()
+
+    self.lock.acquire()
+    now = self.clock()
+    filteredRssi = rssi
+    if self.rssiFilter is not None:
+      rssiFilter = self.filters.get(id)
+      if rssiFilter is None:
+        rssiFilter = self.filters[id] = self.rssiFilter.new()
+      filteredRssi = rssiFilter.update(rssi)
+    beacon = NearbyBeacon(major, minor, txPower, rssi, date, now, filteredRssi,
+                          distance(filteredRssi, txPower, self.pathLoss))
+
+    # Re-inserted beacons move to the end, so the oldest one is first
+    self.beacons.pop(id, None)
+    self.beacons[id] = beacon
+    self.version = self.version + 1
+    if self.rssiHistory is not None:
+      history = self.histories.get(id)
+      if history is None:
+        history = self.histories[id] = RssiHistory(self.rssiHistory)
+      history.add(now, rssi)
+    self._expire(now)
+
+    if self.publishDelay:
+      self._schedule(now + self.publishDelay)
+    else:
+      self._publish(now)
+    self.lock.release()
+
+    return beacon
+
+
+  #========================================================================
+  #
+  #  Expire beacons and publish pending changes right away
+  #
+  #========================================================================
+  def expire(self):
+    self.lock.acquire()
+    now = self.clock()
+    self._expire(now)
+    if self.snapshot.version != self.version:
+      self._publish(now)
+    self.lock.release()
+
+
+  #========================================================================
+  #
+  #  Copy of the RSSI history of a beacon, None if the beacon is not
+  #  nearby or no history is kept
+  #
+  #========================================================================
+  def getRssiHistory(self, major, minor):
+    self.lock.acquire()
+    history = self.histories.get((major << 16) | minor)
+    if history is not None:
+      history = history.copy()
+    self.lock.release()
+    return history
+
+
+  #========================================================================
+  #
+  #  Run rssiFilter (the table's one if None) over the RSSI histories
+  #  of all nearby beacons at once with NumPy
+  #  Returns {(major, minor): (filteredRssi, distance)}
+  #
+  #========================================================================
+  def recompute(self, rssiFilter=None):
+    import numpy as np
+
+    if rssiFilter is None:
+      rssiFilter = self.rssiFilter
+    if rssiFilter is None or self.rssiHistory is None:
+      raise ValueError("recompute needs an RSSI filter and rssiHistory")
+
+    self.lock.acquire()
+    beacons = list(self.beacons.values())
+    histories = [self.histories[(beacon.major << 16) | beacon.minor].copy()
+                 for beacon in beacons]
+    self.lock.release()
+
+    filtered = rssiFilter.filterMany(historyMatrix(histories))
+    txPowers = np.array([beacon.txPower for beacon in beacons], dtype=np.float64)
+    distances = distance(filtered, txPowers, self.pathLoss)
+
+    return {(beacon.major, beacon.minor): (float(filtered[i]), float(distances[i]))
+            for i, beacon in enumerate(beacons)}
+
+
+  #========================================================================
+  #
+  #  Stop the timer
+  #
+  #========================================================================
+  def close(self):
+    self.lock.acquire()
+    if self.timer is not None:
+      self.timer.cancel()
+      self.timer = None
+    self.timerSequence = self.timerSequence + 1
+    self.lock.release()
+
+  def __len__(self):
+    return len(self.beacons)
+
+
+  #========================================================================
+  #
+  #  Remove the beacons not seen for expiration seconds, oldest first
+  #  Each beacon is removed once, so this is amortized O(1) per sighting
+  #  Must be called with self.lock held
+  #
+  #========================================================================
+  def _expire(self, now):
+    limit = now - self.expiration
+    beacons = self.beacons
+    while beacons:
+      id = next(iter(beacons))
+      if beacons[id].seen >= limit:
+        break
+      del(beacons[id])
+      self.histories.pop(id, None)
+      self.filters.pop(id, None)
+      self.version = self.version + 1
+
+
+  #========================================================================
+  #
+  #  Publish a new snapshot and wait for the expiry of its oldest beacon
+  #  Must be called with self.lock held
+  #
+  #========================================================================
+  def _publish(self, now):
+    beacons = tuple(self.beacons.values())
+    expiresAt = beacons[0].seen + self.expiration if beacons else float("inf")
+    self.snapshot = NearbySnapshot(self.version, expiresAt, beacons)
+    if beacons:
+      self._schedule(expiresAt)
+
+
+  #========================================================================
+  #
+  #  Make sure the timer fires by due
+  #  Must be called with self.lock held
+  #
+  #========================================================================
+  def _schedule(self, due):
+    if self.timer is not None:
+      if self.timerDue <= due:
+        return
+      self.timer.cancel()
+
+    self.timerSequence = self.timerSequence + 1
+    self.timerDue = due
+    self.timer = Timer(max(0.0, due - self.clock()), self._onTimer, [self.timerSequence])
+    self.timer.daemon = True
+    self.timer.start()
+
+  def _onTimer(self, sequence):
+    self.lock.acquire()
+    if sequence == self.timerSequence:
+      self.timer = None
+      now = self.clock()
+      self._expire(now)
+      if self.snapshot.version != self.version:
+        self._publish(now)
+      elif self.beacons:
+        self._schedule(next(iter(self.beacons.values())).seen + self.expiration)
+    self.lock.release()
+
+
+
+#========================================================================
+#
+#  main: time sightings and snapshot reads
+#
+#========================================================================
+def main(args):
+  count = int(args[0]) if len(args) > 0 else 100000
+  nearby = NearbyBeacons(expiration=10)
+
+  start = time.perf_counter()
+  for i in range(count):
+    nearby.update(2, i % 1000, -59, -60 - i % 20)
+  update = (time.perf_counter() - start) / count
+
+  time.sleep(2 * nearby.publishDelay)
+  start = time.perf_counter()
+  for i in range(count):
+    nearby.snapshot.beacons
+  read = (time.perf_counter() - start) / count
+
+  print(f"beacons={len(nearby.snapshot.beacons)} update={1e6 * update:.2f}us "
+        f"read={1e6 * read:.3f}us")
+  nearby.close()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
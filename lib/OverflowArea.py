@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  OverflowArea.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Encoding and decoding of the beacon data iOS apps put in the
+#  overflow area of backgrounded adverts: Apple manufacturer data
+#  (company id 0x004c) of type 0x01 followed by 16 bytes.  The bytes
+#  from offset 8 hold a Hamming encoded 0xaa marker byte, major, minor
+#  and txPower.  The codec lives in beacontools (the HCI parser uses
+#  it), this module keeps the names the D-Bus scanner and
+#  OverflowAreaAdvertiser use.  Importing it loads the beacontools
+#  package, so its dependencies (construct, ahocorapy) must be
+#  installed.
+#
+#========================================================================
+import sys
+
+sys.path.append('lib')
+from beacontools.const import OVERFLOW_AREA_LENGTH, OVERFLOW_AREA_MARKER, \
+                              OVERFLOW_AREA_DATA_OFFSET, OVERFLOW_AREA_PAYLOAD_LENGTH
+from beacontools.packet_types.overflow_area import extract_overflow_area_bytes, \
+                                                   decode_overflow_area, encode_overflow_area
+
+
+# Apple manufacturer data type of overflow area adverts
+OVERFLOW_AREA_TYPE = 0x01
+# First decoded byte of our beacons
+MATCHING_BYTE = OVERFLOW_AREA_MARKER
+# Offset of the Hamming encoded beacon data in the overflow area
+BYTE_POSITION = OVERFLOW_AREA_DATA_OFFSET
+# Bytes following the marker byte: major, minor and txPower
+PAYLOAD_LENGTH = OVERFLOW_AREA_PAYLOAD_LENGTH
+
+
+#========================================================================
+#
+#  Extract beacon bytes from the overflow area (without the type byte)
+#  Returns the countToExtract bytes following the marker byte, [] if
+#  the area does not hold our beacon data or is corrupted
+#
+#========================================================================
+def extractBeaconBytes(byteBuffer, countToExtract=5):
+  return list(extract_overflow_area_bytes(byteBuffer, countToExtract))
+
+
+#========================================================================
+#
+#  Decode the overflow area (without the type byte)
+#  Returns (major, minor, txPower) or None if it is not our beacon
+#
+#========================================================================
+def decodeOverflowArea(data):
+  return decode_overflow_area(data)
+
+
+#========================================================================
+#
+#  Encode major, minor and txPower, the inverse of decodeOverflowArea
+#  Returns the 16 byte overflow area (without the type byte)
+#
+#========================================================================
+def encodeOverflowArea(major, minor, txPower):
+  return encode_overflow_area(major, minor, txPower)
+
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  for arg in args:
+    data = bytes.fromhex(arg)
+    if len(data) > OVERFLOW_AREA_LENGTH:
+      # Including the type byte
+      data = data[1:]
+    print(f"{arg}: {decodeOverflowArea(data)}")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
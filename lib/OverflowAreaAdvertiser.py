@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  OverflowAreaAdvertiser.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Advertises major, minor and txPower in the overflow area format of
+#  backgrounded iOS apps, so that iPhones running the app in the
+#  background detect the Pi.  Registered through LEAdvertisingManager1
+#  next to the iBeacon advert, same start/stop/pause/resume/update API
+#  as iBeaconAdvertiser.  The manufacturer data is encoded once per
+#  identity, not per advert.
+#
+#========================================================================
+import sys
+import time
+
+sys.path.append('lib')
+from iBeaconAdvertiser import iBeaconAdvertiser
+from OverflowArea import encodeOverflowArea, decodeOverflowArea, OVERFLOW_AREA_TYPE
+
+
+class OverflowAreaAdvertiser(iBeaconAdvertiser):
+
+  AD_INDEX = 1
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #  session - shared BluezSession, start() then returns right away
+  #
+  #========================================================================
+  def __init__(self, major, minor, txPower, session=None):
+    super().__init__(None, major, minor, txPower, session)
+
+
+  #========================================================================
+  #
+  #  Manufacturer data of the advert: type byte and overflow area
+  #
+  #========================================================================
+  def _data(self):
+    return self.payload
+
+  def _encode(self):
+    return [OVERFLOW_AREA_TYPE] + list(encodeOverflowArea(self.major, self.minor, self.tx_power))
+
+
+  #========================================================================
+  #
+  #  Change major, minor and/or tx power in place
+  #
+  #========================================================================
+  def update(self, major=None, minor=None, tx_power=None):
+    if major is not None:
+      self.major = major
+    if minor is not None:
+      self.minor = minor
+    if tx_power is not None:
+      self.tx_power = tx_power
+    self.payload = self._encode()
+
+    if self.is_advert:
+      self.advertiser.set_manufacturer_data(self.company_id, self._data())
+
+
+
+#========================================================================
+#
+#  main: advertise for 10 seconds, rotating the minor every second
+#
+#========================================================================
+def main(args):
+  from BluezSession import BluezSession
+
+  advertiser = OverflowAreaAdvertiser(2, 8888, -59, session=BluezSession())
+  print(f"payload={bytes(advertiser.payload).hex()} "
+        f"decoded={decodeOverflowArea(bytes(advertiser.payload[1:]))}")
+  advertiser.start()
+
+  for minor in range(8889, 8899):
+    time.sleep(1.0)
+    advertiser.update(minor=minor)
+
+  advertiser.stop()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
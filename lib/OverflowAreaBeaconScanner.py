@@ -17,13 +17,21 @@
 from __future__ import absolute_import, print_function, unicode_literals
 from optparse import OptionParser, make_option
 import sys, getopt
+import functools
+import threading
 import dbus
 import dbus.mainloop.glib
 
 from gi.repository import GLib
 sys.path.append('lib')
 import bluezutils
-from HammingEcc import HammingEcc
+import OverflowArea
+from DeviceTable import DeviceTable
+from BluezDevicePruner import BluezDevicePruner
+
+
+# Device1 properties find_beacon depends on, other changes are ignored
+RELEVANT_PROPERTIES = frozenset(("Address", "RSSI", "ManufacturerData"))
 
 
 class OverflowAreaBeaconScanner:
@@ -32,44 +40,79 @@ class OverflowAreaBeaconScanner:
   #
   #  Constructor
   #
+  #  callback  - called with major, minor, txPower, rssi
+  #  cacheSize - number of decoded payloads remembered, BlueZ
+  #              signals every RSSI update with the same payload
+  #  deviceTtl  - seconds a device is remembered after it was last seen
+  #  maxDevices - max number of devices remembered
+  #  pruneWindow - if set, devices unseen for pruneWindow seconds are
+  #               removed from bluetoothd while scanning
+  #  coalesceWindow - seconds signals of a device are merged before they
+  #               are evaluated, None evaluates every signal right away
+  #  session    - shared BluezSession, start() then returns right away
+  #               and the session's main loop thread delivers signals
+  #
   #=========================================================
-  def __init__(self, callback):
+  def __init__(self, callback, cacheSize=1024, deviceTtl=300.0, maxDevices=1024,
+               pruneWindow=None, coalesceWindow=0.05, session=None):
+    self.session = session
 
-    # Get mainloop 
-    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+    if session is not None:
+      self.bus = session.bus
+      self.adapter = session.adapterInterface()
+    else:
+      # Get mainloop 
+      dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
 
-    # Connect to the system bus
-    self.bus = dbus.SystemBus()
+      # Connect to the system bus
+      self.bus = dbus.SystemBus()
 
-    # Find available adapter (usually just one)
-    self.adapter = bluezutils.find_adapter()
+      # Find available adapter (usually just one)
+      self.adapter = bluezutils.find_adapter()
 
 
-    # Setup interface added callback 
+    # Setup interface added callback, only bluetoothd's object manager
     self.bus.add_signal_receiver(
         self.interfaces_added,
         dbus_interface = "org.freedesktop.DBus.ObjectManager",
-        signal_name = "InterfacesAdded")
+        signal_name = "InterfacesAdded",
+        bus_name = "org.bluez",
+        path = "/",
+        byte_arrays = True)
 
-    # Setup properties_changed callback 
+    # Setup properties_changed callback, only Device1 of bluetoothd
     self.bus.add_signal_receiver(
         self.properties_changed,
         dbus_interface = "org.freedesktop.DBus.Properties",
         signal_name = "PropertiesChanged",
+        bus_name = "org.bluez",
         arg0 = "org.bluez.Device1",
-        path_keyword = "path")
+        path_keyword = "path",
+        byte_arrays = True)
 
     # Initialize devices
-    self.devices = {}
+    self.devices = DeviceTable(ttl=deviceTtl, maxSize=maxDevices)
 
     # Get ad manager
-    om = dbus.Interface(self.bus.get_object("org.bluez", "/"),
-         "org.freedesktop.DBus.ObjectManager")
+    if session is not None:
+      om = session.objectManager
+      objects = session.getManagedObjects()
+    else:
+      om = dbus.Interface(self.bus.get_object("org.bluez", "/"),
+           "org.freedesktop.DBus.ObjectManager")
+      objects = om.GetManagedObjects()
 
-    objects = om.GetManagedObjects()
     for path, interfaces in objects.items():
       if "org.bluez.Device1" in interfaces:
-        self.devices[path] = interfaces["org.bluez.Device1"]
+        self.devices.update(path, interfaces["org.bluez.Device1"], complete=True)
+
+    # Optional pruning of stale Device1 objects in bluetoothd
+    if pruneWindow is not None:
+      self.pruner = BluezDevicePruner(om, self.adapter, window=pruneWindow,
+                                      lastSeen=self._lastSeen,
+                                      onRemoved=self.devices.remove)
+    else:
+      self.pruner = None
 
     # Initialize an empty scan filter 
     self.scan_filter = dict()
@@ -80,6 +123,26 @@ class OverflowAreaBeaconScanner:
     # Save user callback
     self.callback = callback
 
+    # Decoded payloads, including the ones that are not ours
+    self.decodeBeacon = functools.lru_cache(maxsize=cacheSize)(self._decodeBeacon)
+
+    # Signals merged per device path until the coalescing timer fires,
+    # stop() may run on another thread than the main loop
+    self.coalesceWindow = coalesceWindow
+    self.pending = {}
+    self.flushTimer = None
+    self.lock = threading.Lock()
+
+    # Signals received, ignored, merged into a pending one, evaluations
+    # performed, RSSI only updates passed on without decoding and
+    # properties fetched for records missing the manufacturer data
+    self.signals = 0
+    self.ignored = 0
+    self.coalesced = 0
+    self.evaluations = 0
+    self.rssiUpdates = 0
+    self.propertyFetches = 0
+
   #=========================================================
   #
   #  Set filter 
@@ -119,6 +182,11 @@ class OverflowAreaBeaconScanner:
       self.adapter.SetDiscoveryFilter(self.scan_filter)
       self.adapter.StartDiscovery()
       self.is_scanning = True
+      if self.pruner is not None:
+        self.pruner.start()
+      if self.session is not None:
+        self.session.acquire()
+        return
       self.mainloop = GLib.MainLoop()
       self.mainloop.run()
  
@@ -131,8 +199,31 @@ class OverflowAreaBeaconScanner:
   def stop(self):
     if self.is_scanning:
       self.adapter.StopDiscovery()
-      self.mainloop.quit()
+      if self.pruner is not None:
+        self.pruner.stop()
+      self.lock.acquire()
+      if self.flushTimer is not None:
+        GLib.source_remove(self.flushTimer)
+        self.flushTimer = None
+      self.pending = {}
+      self.lock.release()
       self.is_scanning = False
+      if self.session is not None:
+        self.session.release()
+      else:
+        self.mainloop.quit()
+
+
+  #========================================================================
+  #
+  #  Time a device was last seen, None if it is not in the device table
+  #
+  #========================================================================
+  def _lastSeen(self, path):
+    record = self.devices.get(path)
+    if record is None:
+      return None
+    return record.lastSeen
 
 
   #========================================================================
@@ -141,23 +232,17 @@ class OverflowAreaBeaconScanner:
   #
   #========================================================================
   def interfaces_added(self, path, interfaces):
-    properties = interfaces["org.bluez.Device1"]
+    self.signals = self.signals + 1
+    properties = interfaces.get("org.bluez.Device1")
 
     if not properties:
+      self.ignored = self.ignored + 1
       return
 
-    if path in self.devices:
-      dev = self.devices[path]
-      self.devices[path].update(properties)
-    else:
-      self.devices[path] = properties
-
-    if "Address" in self.devices[path]:
-      address = properties["Address"]
-    else:
-      address = "<unknown>"
-
-    self.find_beacon(address, self.devices[path])
+    # A new device comes with all its properties, so a missing
+    # ManufacturerData means it has none
+    self.devices.update(path, properties, complete=True)
+    self._queue(path, properties)
 
 
   #========================================================================
@@ -166,93 +251,173 @@ class OverflowAreaBeaconScanner:
   #
   #========================================================================
   def properties_changed(self, interface, changed, invalidated, path):
-    if interface != "org.bluez.Device1":
+    self.signals = self.signals + 1
+    if interface != "org.bluez.Device1" or RELEVANT_PROPERTIES.isdisjoint(changed):
+      self.ignored = self.ignored + 1
       return
 
-    if path in self.devices:
-      dev = self.devices[path]
-      self.devices[path].update(changed)
-    else:
-      self.devices[path] = changed
+    self._queue(path, changed)
+
 
-    if "Address" in self.devices[path]:
-      address = self.devices[path]["Address"]
+  #========================================================================
+  #
+  #  Evaluate the properties of a device now or when the coalescing
+  #  window ends, merged with the ones signalled in the meantime
+  #
+  #========================================================================
+  def _queue(self, path, properties):
+    if self.coalesceWindow is None:
+      self._evaluate(path, properties)
+      return
+
+    self.lock.acquire()
+    pending = self.pending.get(path)
+    if pending is None:
+      self.pending[path] = dict(properties)
     else:
-      address = "<unknown>"
+      pending.update(properties)
+      self.coalesced = self.coalesced + 1
+
+    if self.flushTimer is None:
+      self.flushTimer = GLib.timeout_add(int(self.coalesceWindow * 1000), self._flush)
+    self.lock.release()
 
-    self.find_beacon(address, self.devices[path])
 
   #========================================================================
   #
-  #  Find overflowArea beacons
+  #  Coalescing timer callback, evaluates all pending devices
+  #  Nothing is left to evaluate if stop() cancelled the timer while
+  #  it was already being dispatched
   #
   #========================================================================
-  def find_beacon(self, address, props):
-    byte_array = []
-    packet_array = []
-    if 'ManufacturerData' in props.keys():
-      if 0x004c in props['ManufacturerData']:
-        for b in props['ManufacturerData'][0x004c]:
-          hex_str = '{:02x}'.format(int(b))
-          packet_array.append(hex_str[0])
-          packet_array.append(hex_str[1])
-          byte_array.append(int(b))
-
-      packet = ''.join(packet_array)
-
-      if packet[0:2] == '01':
-        # Remove the first byte which is '01' indicating overflow packet
-        bt_addr = props['Address']
-        rssi = int(props['RSSI'])
-        self.beaconCallback("OverflowArea", bt_addr, rssi, 
-                            byte_array[1:len(byte_array)], props)
+  def _flush(self):
+    self.lock.acquire()
+    self.flushTimer = None
+    pending = self.pending
+    self.pending = {}
+    self.lock.release()
+    for path, properties in pending.items():
+      self._evaluate(path, properties)
+    return False
+
 
   #========================================================================
-  #  Extract beacon bytes 
+  #
+  #  Merge changed properties into the device table and look for a beacon
+  #
   #========================================================================
-  def extractBeaconBytes(self, byteBuffer, countToExtract=5):
+  def _evaluate(self, path, changed):
+    self.evaluations = self.evaluations + 1
+    record = self.devices.update(path, changed)
+
+    # Payload unchanged and already decoded, only pass on the new RSSI
+    if record.decoded:
+      beacon = record.verdict
+      if beacon is not None and 'RSSI' in changed:
+        self.rssiUpdates = self.rssiUpdates + 1
+        major, minor, txPower = beacon
+        self.callback(major, minor, txPower, record.rssi)
+      return
 
-    # Pi per-byte bit ordering is reversed from iOS 
-    bitBuffer = HammingEcc().bytesToBits(byteBuffer, bigEndian=True)
-    byteBuffer = HammingEcc().bitsToBytes(bitBuffer, bigEndian=False)
+    # Record evicted (or never loaded) and rebuilt from a signal without
+    # ManufacturerData, BlueZ only signals it again when it changes
+    if not record.complete:
+      properties = self._deviceProperties(path)
+      if properties is None:
+        return
+      self.propertyFetches = self.propertyFetches + 1
+      # The signalled values are at least as recent as the fetched ones
+      properties = dict(properties)
+      properties.update(changed)
+      record = self.devices.update(path, properties, complete=True)
 
-    matchingByte = 0xaa 
-    payload = []
+    self.find_beacon(record)
 
-    # buffer.removeFirst(bytePosition)
-    bytePosition = 8
-    buffer = byteBuffer[bytePosition:len(byteBuffer)]
 
-    bitBuffer = HammingEcc().bytesToBits(buffer, bigEndian=False)
+  #========================================================================
+  #
+  #  All Device1 properties of path, None if bluetoothd does not know
+  #  the device (anymore)
+  #
+  #========================================================================
+  def _deviceProperties(self, path):
+    try:
+      properties = dbus.Interface(self.bus.get_object("org.bluez", path),
+                                  "org.freedesktop.DBus.Properties")
+      return properties.GetAll("org.bluez.Device1")
+    except dbus.exceptions.DBusException:
+      return None
 
-    hammingBitsToDecode = 8*(countToExtract + 1) + 7 
+  #========================================================================
+  #
+  #  Find overflowArea beacons
+  #  Stores (major, minor, txPower), or None if the device record holds
+  #  no beacon of ours, in record.verdict and returns it.  Nothing is
+  #  decided while the record does not know the manufacturer data yet
+  #
+  #========================================================================
+  def find_beacon(self, record):
+    if not record.complete:
+      return None
+
+    raw = record.manufacturerData
+    beacon = None
+    if raw is not None and len(raw) > 0 and raw[0] == 0x01:
+      # Remove the first byte which is 0x01 indicating overflow packet
+      beacon = self.decodeBeacon(raw[1:])
+
+    record.decoded = True
+    record.verdict = beacon
+    if beacon is not None and record.rssi is not None:
+      major, minor, txPower = beacon
+      self.callback(major, minor, txPower, record.rssi)
+    return beacon
 
-    # bitBuffer.removeLast(bitBuffer.count - hammingBitsToDecode)
-    bitBuffer = bitBuffer[0:hammingBitsToDecode] 
+  #========================================================================
+  #  Extract beacon bytes 
+  #========================================================================
+  def extractBeaconBytes(self, byteBuffer, countToExtract=5):
+    return OverflowArea.extractBeaconBytes(byteBuffer, countToExtract)
 
-    goodBits = HammingEcc().decodeBits(bitBuffer) 
 
-    if len(goodBits) > 0:
-      bytes = HammingEcc().bitsToBytes(goodBits)
-      if bytes[0] == matchingByte:
-        payload = bytes[1:len(bytes)]
-      else:
-        print("This is not our overflow advert")
-    else:
-      print("Overflow area advert does not have our beacon data or it is corrupted")
+  #========================================================================
+  #  Decode a payload (without the leading 0x01) to (major, minor, txPower)
+  #  Returns None if it does not hold our beacon data, results are cached
+  #  in decodeBeacon keyed on the payload bytes
+  #========================================================================
+  def _decodeBeacon(self, packet):
+    return OverflowArea.decodeOverflowArea(packet)
 
-    return payload
+
+  #========================================================================
+  #  Decode cache hits, misses and size
+  #========================================================================
+  def cacheInfo(self):
+    return self.decodeBeacon.cache_info()
+
+
+  #========================================================================
+  #  Signal and evaluation counters
+  #========================================================================
+  def stats(self):
+    return {
+      "signals":     self.signals,
+      "ignored":     self.ignored,
+      "coalesced":   self.coalesced,
+      "evaluations": self.evaluations,
+      "rssiUpdates": self.rssiUpdates,
+      "propertyFetches": self.propertyFetches,
+      "devices":     len(self.devices)
+    }
 
 
   #========================================================================
   #  Beacon callback
   #========================================================================
   def beaconCallback(self, beaconType, bt_addr, rssi, packet, props):
-    payload = self.extractBeaconBytes(packet, 5)
-    if len(payload) == 5:
-      major = payload[0] * 256 + payload[1]
-      minor = payload[2] * 256 + payload[3]     
-      txPower = payload[4]-256
+    beacon = self.decodeBeacon(bytes(packet))
+    if beacon is not None:
+      major, minor, txPower = beacon
       self.callback(major, minor, txPower, rssi)
 
     
@@ -0,0 +1,189 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  RssiFilter.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Streaming RSSI filters and RSSI to distance conversion.
+#
+#  A filter object holds the state of one beacon: update(rssi) takes a
+#  sighting in O(1) and returns the filtered RSSI, new() returns a
+#  fresh filter with the same parameters.  filterMany(rssis) runs the
+#  same filter over a NumPy matrix of traces, one beacon per row,
+#  oldest sample first, rows padded with NaN at the start, and returns
+#  the filtered RSSI after the last sample of every row.
+#
+#========================================================================
+import sys
+import warnings
+from collections import deque
+
+
+#========================================================================
+#
+#  Estimated distance in meters with the log-distance path loss model
+#  txPower is the RSSI at 1m, pathLoss 2 in free space and 2-4 indoors
+#  Works on numbers and NumPy arrays
+#
+#========================================================================
+def distance(rssi, txPower, pathLoss=2.0):
+  return 10 ** ((txPower - rssi) / (10 * pathLoss))
+
+
+#========================================================================
+#
+#  NaN padded matrix of the RSSI histories, one row per history
+#
+#========================================================================
+def historyMatrix(histories):
+  import numpy as np
+
+  columns = max((len(history) for history in histories), default=0)
+  rssis = np.full((len(histories), columns), np.nan)
+  for row, history in enumerate(histories):
+    samples = history.samples()[1]
+    if len(samples):
+      rssis[row, columns - len(samples):] = samples
+  return rssis
+
+
+#========================================================================
+#  Exponential moving average
+#========================================================================
+class EmaFilter:
+  __slots__ = ("alpha", "value")
+
+  # alpha - weight of the new sample, lower is smoother
+  def __init__(self, alpha=0.3):
+    self.alpha = alpha
+    self.value = None
+
+  def new(self):
+    return EmaFilter(self.alpha)
+
+  def update(self, rssi):
+    if self.value is None:
+      self.value = float(rssi)
+    else:
+      self.value = self.value + self.alpha * (rssi - self.value)
+    return self.value
+
+  def filterMany(self, rssis):
+    import numpy as np
+
+    rssis = np.asarray(rssis, dtype=np.float64)
+    value = np.full(rssis.shape[0], np.nan)
+    for column in rssis.T:
+      updated = np.where(np.isnan(value), column, value + self.alpha * (column - value))
+      value = np.where(np.isnan(column), value, updated)
+    return value
+
+
+#========================================================================
+#  One dimensional Kalman filter of a constant RSSI
+#========================================================================
+class KalmanFilter:
+  __slots__ = ("processNoise", "measurementNoise", "value", "variance")
+
+  # processNoise     - variance the RSSI drifts by between sightings
+  # measurementNoise - variance of one RSSI sample
+  def __init__(self, processNoise=0.5, measurementNoise=16.0):
+    self.processNoise = processNoise
+    self.measurementNoise = measurementNoise
+    self.value = None
+    self.variance = None
+
+  def new(self):
+    return KalmanFilter(self.processNoise, self.measurementNoise)
+
+  def update(self, rssi):
+    if self.value is None:
+      self.value = float(rssi)
+      self.variance = self.measurementNoise
+    else:
+      variance = self.variance + self.processNoise
+      gain = variance / (variance + self.measurementNoise)
+      self.value = self.value + gain * (rssi - self.value)
+      self.variance = (1 - gain) * variance
+    return self.value
+
+  def filterMany(self, rssis):
+    import numpy as np
+
+    rssis = np.asarray(rssis, dtype=np.float64)
+    value = np.full(rssis.shape[0], np.nan)
+    variance = np.full(rssis.shape[0], np.nan)
+    for column in rssis.T:
+      first = np.isnan(value)
+      predicted = variance + self.processNoise
+      gain = predicted / (predicted + self.measurementNoise)
+      updated = np.where(first, column, value + gain * (column - value))
+      updatedVariance = np.where(first, self.measurementNoise, (1 - gain) * predicted)
+      missing = np.isnan(column)
+      value = np.where(missing, value, updated)
+      variance = np.where(missing, variance, updatedVariance)
+    return value
+
+
+#========================================================================
+#  Median of the last size samples, drops outliers
+#========================================================================
+class MedianFilter:
+  __slots__ = ("size", "samples")
+
+  def __init__(self, size=5):
+    self.size = size
+    self.samples = deque(maxlen=size)
+
+  def new(self):
+    return MedianFilter(self.size)
+
+  def update(self, rssi):
+    self.samples.append(rssi)
+    ordered = sorted(self.samples)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+      return float(ordered[middle])
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+  def filterMany(self, rssis):
+    import numpy as np
+
+    rssis = np.asarray(rssis, dtype=np.float64)
+    # Rows are NaN padded at the start, the last size columns hold the
+    # newest samples of every row
+    with warnings.catch_warnings():
+      warnings.simplefilter("ignore", RuntimeWarning)
+      return np.nanmedian(rssis[:, -self.size:], axis=1)
+
+
+
+#========================================================================
+#
+#  main: filter the RSSIs given on the command line
+#  bench/bench_rssi_filter.py benchmarks the filters
+#
+#========================================================================
+def main(args):
+  rssis = [int(arg) for arg in args] or [-60, -62, -75, -61, -59, -90, -60]
+  txPower = -59
+
+  for prototype in (EmaFilter(), KalmanFilter(), MedianFilter()):
+    values = [prototype.update(rssi) for rssi in rssis]
+    print(f"{type(prototype).__name__:<12} " +
+          " ".join(f"{value:.1f}({distance(value, txPower):.1f}m)" for value in values))
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
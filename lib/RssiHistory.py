@@ -0,0 +1,205 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  RssiHistory.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Fixed capacity ring buffer of (time.monotonic(), RSSI) samples of
+#  one beacon.  Timestamps are kept in an array('d') and RSSIs in an
+#  array('b'), so a history takes 9 bytes per sample plus about 300
+#  bytes of object overhead: ~870 bytes with the default capacity of
+#  64, whatever the number of sightings.  Queries look at the samples
+#  of the last window seconds through NumPy views of the arrays.
+#
+#========================================================================
+import sys
+import time
+from array import array
+
+
+class RssiHistory:
+  __slots__ = ("capacity", "times", "rssis", "count", "next")
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #  capacity - number of samples kept, the oldest one is overwritten
+  #
+  #========================================================================
+  def __init__(self, capacity=64):
+    if capacity < 1:
+      raise ValueError("RssiHistory capacity must be at least 1")
+    self.capacity = capacity
+    self.times = array('d', bytes(8 * capacity))
+    self.rssis = array('b', bytes(capacity))
+    self.count = 0
+    self.next = 0
+
+
+  #========================================================================
+  #
+  #  Add a sample
+  #
+  #========================================================================
+  def add(self, now, rssi):
+    self.times[self.next] = now
+    self.rssis[self.next] = rssi
+    self.next = self.next + 1
+    if self.next == self.capacity:
+      self.next = 0
+    if self.count < self.capacity:
+      self.count = self.count + 1
+
+
+  #========================================================================
+  #
+  #  Copy of the history, for readers outside of the writer's lock
+  #
+  #========================================================================
+  def copy(self):
+    history = RssiHistory.__new__(RssiHistory)
+    history.capacity = self.capacity
+    history.times = array('d', self.times)
+    history.rssis = array('b', self.rssis)
+    history.count = self.count
+    history.next = self.next
+    return history
+
+  def __len__(self):
+    return self.count
+
+  @property
+  def first(self):
+    if self.count == 0:
+      return None
+    return self.times[self.next if self.count == self.capacity else 0]
+
+  @property
+  def last(self):
+    if self.count == 0:
+      return None
+    return self.times[self.next - 1]
+
+
+  #========================================================================
+  #
+  #  Samples of the last window seconds (all of them if window is None)
+  #  as NumPy arrays (times, rssis), oldest first
+  #
+  #========================================================================
+  def samples(self, window=None, now=None):
+    import numpy as np
+
+    times = np.frombuffer(self.times, dtype=np.float64)
+    rssis = np.frombuffer(self.rssis, dtype=np.int8)
+    if self.count < self.capacity:
+      times = times[0:self.count]
+      rssis = rssis[0:self.count]
+    elif self.next != 0:
+      times = np.concatenate((times[self.next:], times[0:self.next]))
+      rssis = np.concatenate((rssis[self.next:], rssis[0:self.next]))
+
+    if window is not None:
+      if now is None:
+        now = time.monotonic()
+      start = np.searchsorted(times, now - window)
+      times = times[start:]
+      rssis = rssis[start:]
+    return times, rssis
+
+
+  #========================================================================
+  #
+  #  RSSI statistics over the last window seconds
+  #  Return None if there is no sample in the window
+  #
+  #========================================================================
+  def mean(self, window=None, now=None):
+    rssis = self.samples(window, now)[1]
+    return float(rssis.mean()) if len(rssis) else None
+
+  def median(self, window=None, now=None):
+    return self.percentile(50, window, now)
+
+  def percentile(self, q, window=None, now=None):
+    import numpy as np
+    rssis = self.samples(window, now)[1]
+    return float(np.percentile(rssis, q)) if len(rssis) else None
+
+
+  #========================================================================
+  #
+  #  Seconds spent at or above threshold in the last window seconds
+  #  Each sample holds until the next one; the newest one counts up to
+  #  now only if now is given
+  #
+  #========================================================================
+  def timeAbove(self, threshold, window=None, now=None):
+    import numpy as np
+
+    times, rssis = self.samples(window, now)
+    if len(times) == 0:
+      return 0.0
+    ends = np.append(times[1:], times[-1] if now is None else max(now, times[-1]))
+    return float(np.sum((ends - times)[rssis >= threshold]))
+
+
+  #========================================================================
+  #
+  #  Seconds between the first and the last sample kept
+  #
+  #========================================================================
+  def dwell(self):
+    if self.count == 0:
+      return 0.0
+    return self.last - self.first
+
+  def __repr__(self):
+    return f"RssiHistory(count={self.count}, capacity={self.capacity})"
+
+
+
+#========================================================================
+#
+#  main: fill histories and time the queries
+#
+#========================================================================
+def main(args):
+  import random
+
+  capacity = int(args[0]) if len(args) > 0 else 64
+  history = RssiHistory(capacity)
+  rand = random.Random(1)
+  now = 0.0
+  for i in range(10 * capacity):
+    now = now + rand.uniform(0.1, 1.0)
+    history.add(now, rand.randint(-90, -40))
+
+  count = 10000
+  start = time.perf_counter()
+  for i in range(count):
+    history.mean(30.0, now)
+    history.median(30.0, now)
+    history.timeAbove(-60, 30.0, now)
+  elapsed = (time.perf_counter() - start) / count
+
+  print(f"{history} mean={history.mean(30.0, now):.1f} median={history.median(30.0, now)} "
+        f"p90={history.percentile(90, 30.0, now)} above={history.timeAbove(-60, 30.0, now):.1f}s "
+        f"dwell={history.dwell():.1f}s queries={1e6 * elapsed:.1f}us "
+        f"bytes={sys.getsizeof(history) + sys.getsizeof(history.times) + sys.getsizeof(history.rssis)}")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,260 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  SightingAggregator.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  Coalesces beacon sightings per (major, minor).  add() has the same
+#  signature as the scanner callbacks; the aggregator calls its own
+#  callback with at most one Sighting per beacon and window.  The first
+#  sighting of a beacon is passed on right away, the following ones are
+#  summarized (count, min/max/mean RSSI, first/last time) and passed on
+#  once the window has elapsed.  Times are time.monotonic() seconds.
+#
+#  While beacons are tracked a timer runs every window and passes on
+#  the sightings whose window has elapsed, so the last sightings of a
+#  beacon that goes quiet are not held back until the next add().
+#
+#========================================================================
+import sys
+import time
+from collections import OrderedDict
+from threading import Lock, Timer, current_thread
+
+
+#========================================================================
+#  Summary of the sightings of one beacon
+#========================================================================
+class Sighting:
+  __slots__ = ("major", "minor", "txPower", "count", "rssiMin", "rssiMax",
+               "rssiSum", "first", "last")
+
+  def __init__(self, major, minor, txPower, rssi, now):
+    self.major = major
+    self.minor = minor
+    self.txPower = txPower
+    self.count = 1
+    self.rssiMin = rssi
+    self.rssiMax = rssi
+    self.rssiSum = rssi
+    self.first = now
+    self.last = now
+
+  def add(self, txPower, rssi, now):
+    self.txPower = txPower
+    self.count = self.count + 1
+    if rssi < self.rssiMin:
+      self.rssiMin = rssi
+    if rssi > self.rssiMax:
+      self.rssiMax = rssi
+    self.rssiSum = self.rssiSum + rssi
+    self.last = now
+
+  @property
+  def rssiMean(self):
+    return self.rssiSum / self.count
+
+  def __repr__(self):
+    return (f"Sighting(major={self.major}, minor={self.minor}, count={self.count}, "
+            f"rssi={self.rssiMin}/{self.rssiMean:.1f}/{self.rssiMax})")
+
+
+#========================================================================
+#  Aggregation state of one beacon
+#========================================================================
+class _Window:
+  __slots__ = ("sighting", "emitted", "last")
+
+  def __init__(self, now):
+    self.sighting = None
+    self.emitted = now
+    self.last = now
+
+
+class SightingAggregator:
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #  callback - called with a Sighting
+  #  window   - seconds between two sightings passed on for the same beacon
+  #
+  #========================================================================
+  def __init__(self, callback, window=1.0):
+    self.callback = callback
+    self.window = window
+    self.received = 0
+    self.emitted = 0
+
+    # Ordered by last sighting, so idle beacons are found at the front
+    self.windows = OrderedDict()
+    self.timer = None
+    self.lock = Lock()
+
+
+  #========================================================================
+  #
+  #  Add a sighting, same signature as the scanner callbacks
+  #
+  #========================================================================
+  def add(self, major, minor, txPower, rssi):
+    now = time.monotonic()
+    key = (major, minor)
+    emit = []
+
+    self.lock.acquire()
+    self.received = self.received + 1
+
+    window = self.windows.get(key)
+    if window is None:
+      self.windows[key] = _Window(now)
+      emit.append(Sighting(major, minor, txPower, rssi, now))
+    else:
+      self.windows.move_to_end(key)
+      window.last = now
+      if window.sighting is None:
+        window.sighting = Sighting(major, minor, txPower, rssi, now)
+      else:
+        window.sighting.add(txPower, rssi, now)
+
+      if now - window.emitted >= self.window:
+        emit.append(window.sighting)
+        window.sighting = None
+        window.emitted = now
+
+    self._expire(now, emit)
+    self.emitted = self.emitted + len(emit)
+    if self.timer is None:
+      self._startTimer()
+    self.lock.release()
+
+    for sighting in emit:
+      self.callback(sighting)
+
+
+  #========================================================================
+  #
+  #  Pass on the pending sightings whose window has elapsed and drop
+  #  idle beacons, called by the timer
+  #
+  #========================================================================
+  def tick(self):
+    now = time.monotonic()
+    emit = []
+
+    self.lock.acquire()
+    for window in self.windows.values():
+      if window.sighting is not None and now - window.emitted >= self.window:
+        emit.append(window.sighting)
+        window.sighting = None
+        window.emitted = now
+    self._expire(now, emit)
+    self.emitted = self.emitted + len(emit)
+    self.lock.release()
+
+    for sighting in emit:
+      self.callback(sighting)
+
+
+  #========================================================================
+  #
+  #  Stop the timer
+  #
+  #========================================================================
+  def close(self):
+    self.lock.acquire()
+    if self.timer is not None:
+      self.timer.cancel()
+      self.timer = None
+    self.lock.release()
+
+
+  #========================================================================
+  #
+  #  Pass on all pending sightings
+  #
+  #========================================================================
+  def flush(self):
+    emit = []
+
+    self.lock.acquire()
+    for window in self.windows.values():
+      if window.sighting is not None:
+        emit.append(window.sighting)
+    self.windows.clear()
+    self.emitted = self.emitted + len(emit)
+    self.lock.release()
+
+    for sighting in emit:
+      self.callback(sighting)
+
+
+  #========================================================================
+  #
+  #  Drop beacons not seen for a window, passing on what is pending
+  #
+  #========================================================================
+  def _expire(self, now, emit):
+    while self.windows:
+      key = next(iter(self.windows))
+      window = self.windows[key]
+      if now - window.last < self.window:
+        break
+      del self.windows[key]
+      if window.sighting is not None:
+        emit.append(window.sighting)
+
+
+  #========================================================================
+  #
+  #  Run tick every window while beacons are tracked
+  #  Must be called with self.lock held
+  #
+  #========================================================================
+  def _startTimer(self):
+    self.timer = Timer(self.window, self._onTimer)
+    self.timer.daemon = True
+    self.timer.start()
+
+  def _onTimer(self):
+    self.tick()
+    self.lock.acquire()
+    # Not restarted once close() has dropped this timer
+    if self.timer is current_thread():
+      self.timer = None
+      if self.windows:
+        self._startTimer()
+    self.lock.release()
+
+
+
+#========================================================================
+#
+#  main
+#
+#========================================================================
+def main(args):
+  aggregator = SightingAggregator(print, window=0.5)
+  for i in range(50):
+    aggregator.add(2, 7777, -59, -60 - (i % 7))
+    aggregator.add(2, 8888, -59, -70 + (i % 3))
+    time.sleep(0.02)
+  time.sleep(1.0)
+  aggregator.close()
+  print(f"received={aggregator.received} emitted={aggregator.emitted}")
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -1,6 +1,6 @@
 """A library for working with various types of Bluetooth LE Beacons.."""
-from .const import CYPRESS_BEACON_DEFAULT_UUID, BluetoothAddressType, ScanFilter, ScanType
-from .scanner import BeaconScanner
+from .const import CYPRESS_BEACON_DEFAULT_UUID, BluetoothAddressType, ScanFilter, ScanType, DispatchPolicy
+from .scanner import BeaconScanner, AsyncBeaconScanner
 from .parser import parse_packet
 from .packet_types.eddystone import EddystoneUIDFrame, EddystoneURLFrame, \
                                     EddystoneEncryptedTLMFrame, EddystoneTLMFrame, \
@@ -9,6 +9,8 @@ from .packet_types.ibeacon import IBeaconAdvertisement
 from .packet_types.controlj import CJMonitorAdvertisement
 from .packet_types.estimote import EstimoteTelemetryFrameA, EstimoteTelemetryFrameB
 from .packet_types.exposure_notification import ExposureNotificationFrame
+from .packet_types.overflow_area import OverflowAreaAdvertisement
 from .device_filters import IBeaconFilter, EddystoneFilter, BtAddrFilter, EstimoteFilter, \
-                            CJMonitorFilter, ExposureNotificationFilter
+                            CJMonitorFilter, ExposureNotificationFilter, OverflowAreaFilter, \
+                            FilterIndex
 from .utils import is_valid_mac
@@ -1,9 +1,25 @@
-"""Load a different backend depending on the OS."""
+"""Load a different backend depending on the OS.
+
+The platform backend is only imported when one of its functions is used, so that
+beacontools.backend.replay also works on machines without the bluetooth bindings.
+"""
 import sys
+from importlib import import_module
 
 if sys.platform.startswith("linux"):
-    from .linux import *
+    _PLATFORM_BACKEND = ".linux"
 elif sys.platform.startswith("freebsd"):
-    from .freebsd import *
+    _PLATFORM_BACKEND = ".freebsd"
 else:
-    raise NotImplementedError("Scanning not supported on this platform")
+    _PLATFORM_BACKEND = None
+
+_BACKEND_FUNCTIONS = ("open_dev", "send_cmd", "send_req")
+
+
+def __getattr__(name):
+    """Resolve open_dev/send_cmd/send_req from the platform backend."""
+    if name not in _BACKEND_FUNCTIONS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    if _PLATFORM_BACKEND is None:
+        raise NotImplementedError("Scanning not supported on this platform")
+    return getattr(import_module(_PLATFORM_BACKEND, __name__), name)
@@ -0,0 +1,154 @@
+"""Backend replaying HCI events from a btsnoop capture file instead of a live device.
+
+Usage::
+
+    from beacontools.backend import replay
+    sock = replay.ReplaySocket("capture.btsnoop", realtime=False)
+    scanner = BeaconScanner(callback, bt_device_id=sock, backend=replay)
+
+bt_device_id may also be the path of the capture file. Once the capture is exhausted
+recv() returns an empty packet, which ends the scanner loop.
+
+Commands are recorded in ReplaySocket.commands, requests (send_req) in
+ReplaySocket.requests and answered from ReplaySocket.responses, by default a
+Bluetooth 4.2 controller with a white list of 128 entries.
+"""
+import struct
+import time
+
+from ..const import OGF_INFO_PARAM, OCF_READ_LOCAL_VERSION, OGF_LE_CTL, \
+                    OCF_LE_READ_WHITE_LIST_SIZE
+
+BTSNOOP_MAGIC = b"btsnoop\0"
+BTSNOOP_HEADER = struct.Struct(">8sII")
+BTSNOOP_RECORD = struct.Struct(">IIIIq")
+
+# datalink types, see RFC 1761 and the btsnoop format used by btmon/Android
+DATALINK_H1 = 1001
+DATALINK_H4 = 1002
+DATALINK_MONITOR = 2001
+
+HCI_EVENT_PKT = 0x04
+# flags for H1/H4 captures: bit 0 is the direction, bit 1 set for commands and events
+FLAG_RECEIVED = 0x01
+FLAG_COMMAND_OR_EVENT = 0x02
+# opcode (lower 16 bit of the flags) of event packets in btmon captures
+MONITOR_EVENT_PKT = 0x03
+
+# return parameters of the command complete events, see BT Core 5.1 Specification,
+# pages 1875 (Read Local Version Information) and 2348 (LE Read White List Size)
+DEFAULT_RESPONSES = {
+    # status, hci version 4.2, revision, lmp version, manufacturer, lmp subversion
+    (OGF_INFO_PARAM, OCF_READ_LOCAL_VERSION): bytes([0x00, 0x08, 0x00, 0x00, 0x08,
+                                                     0xFF, 0xFF, 0x00, 0x00]),
+    # status, white list size
+    (OGF_LE_CTL, OCF_LE_READ_WHITE_LIST_SIZE): bytes([0x00, 0x80]),
+}
+
+
+class ReplaySocket(object):
+    """Socket like object returning the HCI event packets of a btsnoop capture."""
+
+    def __init__(self, path, realtime=False):
+        """Open the capture.
+
+        Args:
+            path: btsnoop capture file (as written by btmon -w or Android's HCI snoop log)
+            realtime: replay at the recorded pace instead of as fast as possible
+        """
+        self.path = path
+        self.realtime = realtime
+        self.commands = []
+        self.requests = []
+        # (ogf, ocf) -> return parameters send_req answers with
+        self.responses = dict(DEFAULT_RESPONSES)
+        self.packets = 0
+        self.started = None
+        self.finished = None
+        self._file = open(path, "rb")
+        magic, _version, self.datalink = BTSNOOP_HEADER.unpack(
+            self._file.read(BTSNOOP_HEADER.size))
+        if magic != BTSNOOP_MAGIC:
+            self._file.close()
+            raise ValueError("{} is not a btsnoop capture".format(path))
+        if self.datalink not in (DATALINK_H1, DATALINK_H4, DATALINK_MONITOR):
+            self._file.close()
+            raise ValueError("Unsupported btsnoop datalink type {}".format(self.datalink))
+        self._first_timestamp = None
+
+    def recv(self, bufsize):
+        """Return the next HCI event packet (including the packet type byte)."""
+        if self.started is None:
+            self.started = time.monotonic()
+        while True:
+            header = self._file.read(BTSNOOP_RECORD.size)
+            if len(header) < BTSNOOP_RECORD.size:
+                if self.finished is None:
+                    self.finished = time.monotonic()
+                return b""
+            _orig_len, incl_len, flags, _drops, timestamp = BTSNOOP_RECORD.unpack(header)
+            data = self._file.read(incl_len)
+
+            pkt = self._event_packet(flags, data)
+            if pkt is None:
+                continue
+
+            if self.realtime:
+                self._wait_for(timestamp)
+            self.packets += 1
+            return pkt[:bufsize]
+
+    def _event_packet(self, flags, data):
+        """Return data as an H4 event packet, or None if it is not an event."""
+        if self.datalink == DATALINK_MONITOR:
+            if flags & 0xFFFF != MONITOR_EVENT_PKT:
+                return None
+            return bytes([HCI_EVENT_PKT]) + data
+        if flags & (FLAG_RECEIVED | FLAG_COMMAND_OR_EVENT) != FLAG_RECEIVED | FLAG_COMMAND_OR_EVENT:
+            return None
+        if self.datalink == DATALINK_H1:
+            return bytes([HCI_EVENT_PKT]) + data
+        if not data or data[0] != HCI_EVENT_PKT:
+            return None
+        return data
+
+    def _wait_for(self, timestamp):
+        """Sleep until the packet with the given timestamp (in us) is due."""
+        if self._first_timestamp is None:
+            self._first_timestamp = timestamp
+            return
+        delay = (timestamp - self._first_timestamp) / 1e6 - (time.monotonic() - self.started)
+        if delay > 0:
+            time.sleep(delay)
+
+    @property
+    def packets_per_second(self):
+        """Event packets delivered per second since the first recv()."""
+        if self.started is None:
+            return 0.0
+        elapsed = (self.finished or time.monotonic()) - self.started
+        return self.packets / elapsed if elapsed > 0 else 0.0
+
+    def close(self):
+        """Close the capture file."""
+        self._file.close()
+
+
+def open_dev(bt_device_id):
+    """Open the capture, bt_device_id is a ReplaySocket or the path of the capture."""
+    if isinstance(bt_device_id, ReplaySocket):
+        return bt_device_id
+    return ReplaySocket(bt_device_id)
+
+def send_cmd(socket, group_field, command_field, data):
+    """Record the hci command, there is no device to send it to."""
+    socket.commands.append((group_field, command_field, bytes(data)))
+
+def send_req(socket, group_field, command_field, _event, rlen, params, _timeout):
+    """Record the hci request and answer it from socket.responses.
+
+    A capture holds no answers to our requests, so the canned response for the
+    command is returned (status 0x01, unknown command, if there is none).
+    """
+    socket.requests.append((group_field, command_field, bytes(params)))
+    return socket.responses.get((group_field, command_field), bytes([0x01]))[:rlen]
@@ -11,7 +11,16 @@ class ScannerMode(IntEnum):
     MODE_ESTIMOTE = 4
     MODE_CJMONITOR = 8
     MODE_EXPOSURE_NOTIFICATION = 16
-    MODE_ALL = MODE_IBEACON | MODE_EDDYSTONE | MODE_ESTIMOTE | MODE_CJMONITOR  | MODE_EXPOSURE_NOTIFICATION
+    MODE_OVERFLOW_AREA = 32
+    MODE_ALL = MODE_IBEACON | MODE_EDDYSTONE | MODE_ESTIMOTE | MODE_CJMONITOR  | MODE_EXPOSURE_NOTIFICATION | \
+               MODE_OVERFLOW_AREA
+
+
+class DispatchPolicy(IntEnum):
+    """Determines what is lost when the dispatch buffer is full."""
+    DROP_OLDEST = 0
+    DROP_NEWEST = 1
+    COALESCE = 2  # replace queued items of the same beacon, else drop oldest
 
 
 # hci le scan parameters
@@ -40,6 +49,16 @@ LE_META_EVENT = 0x3e
 OGF_LE_CTL = 0x08
 OCF_LE_SET_SCAN_PARAMETERS = 0x000B
 OCF_LE_SET_SCAN_ENABLE = 0x000C
+OCF_LE_READ_WHITE_LIST_SIZE = 0x000F
+OCF_LE_CLEAR_WHITE_LIST = 0x0010
+OCF_LE_ADD_DEVICE_TO_WHITE_LIST = 0x0011
+OCF_LE_REMOVE_DEVICE_FROM_WHITE_LIST = 0x0012
+OCF_LE_SET_ADVERTISING_PARAMETERS = 0x0006
+OCF_LE_SET_ADVERTISING_DATA = 0x0008
+OCF_LE_SET_ADVERTISE_ENABLE = 0x000A
+OCF_LE_SET_EXT_ADVERTISING_PARAMETERS = 0x0036
+OCF_LE_SET_EXT_ADVERTISING_DATA = 0x0037
+OCF_LE_SET_EXT_ADVERTISE_ENABLE = 0x0039
 EVT_LE_ADVERTISING_REPORT = 0x02
 OCF_LE_SET_EXT_SCAN_PARAMETERS = 0x0041
 OCF_LE_SET_EXT_SCAN_ENABLE = 0x0042
@@ -96,6 +115,15 @@ EDDYSTONE_TLD_ENCODINGS = {
 IBEACON_MANUFACTURER_ID = b"\x4c\x00"
 IBEACON_PROXIMITY_TYPE = b"\x02\x15"
 CYPRESS_BEACON_DEFAULT_UUID = "00050001-0000-1000-8000-00805f9b0131"
+# apple manufacturer data type of the overflow area of backgrounded iOS apps
+OVERFLOW_AREA_TYPE = b"\x01"
+# length of the overflow area following the type byte
+OVERFLOW_AREA_LENGTH = 16
+# offset of the Hamming encoded beacon data in the overflow area
+OVERFLOW_AREA_DATA_OFFSET = 8
+# first decoded byte of the beacon data, followed by major, minor and tx power
+OVERFLOW_AREA_MARKER = 0xaa
+OVERFLOW_AREA_PAYLOAD_LENGTH = 5
 
 # for Estimote
 ESTIMOTE_UUID = b"\x9a\xfe"
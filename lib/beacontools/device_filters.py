@@ -1,15 +1,23 @@
 """Filters passed to the BeaconScanner to filter results."""
 from .const import CJ_MANUFACTURER_ID, CJ_TEMPHUM_TYPE
+from .packet_types import IBeaconAdvertisement, OverflowAreaAdvertisement
 from .utils import is_valid_mac
 
 
 class DeviceFilter(object):
     """Base class for all device filters. Should not be used by itself."""
 
+    # packet classes the filter applies to, None for all of them
+    packet_types = None
+
     def __init__(self):
         """Initialize filter."""
         self.properties = {}
 
+    def applies_to(self, packet):
+        """Check if the filter applies to the packet class of packet."""
+        return self.packet_types is None or isinstance(packet, self.packet_types)
+
     def matches(self, filter_props):
         """Check if the filter matches the supplied properties."""
         if filter_props is None:
@@ -46,6 +54,9 @@ class CJMonitorFilter(DeviceFilter):
 class IBeaconFilter(DeviceFilter):
     """Filter for iBeacon."""
 
+    # major and minor are overflow area properties as well
+    packet_types = (IBeaconAdvertisement,)
+
     def __init__(self, uuid=None, major=None, minor=None):
         """Initialize filter."""
         super().__init__()
@@ -98,12 +109,34 @@ class ExposureNotificationFilter(DeviceFilter):
         self.properties['identifier'] = identifier
 
 
+class OverflowAreaFilter(DeviceFilter):
+    """Filter for overflow area beacons, matches all of them if no argument is set."""
+
+    packet_types = (OverflowAreaAdvertisement,)
+
+    def __init__(self, major=None, minor=None):
+        """Initialize filter."""
+        super().__init__()
+        self.properties['overflow_area'] = True
+        if major is not None:
+            self.properties['major'] = major
+        if minor is not None:
+            self.properties['minor'] = minor
+
+
 class BtAddrFilter(DeviceFilter):
-    """Filter by bluetooth address."""
+    """Filter by bluetooth address.
+
+    address_type (BluetoothAddressType) is only used when the address is pushed to the
+    controller white list (ScanFilter.WHITELIST_ONLY). If it is None the address is
+    added as public and as random address, so the filter takes two of the controller's
+    white list entries (see BeaconScanner.whitelist_size).
+    """
 
-    def __init__(self, bt_addr):
+    def __init__(self, bt_addr, address_type=None):
         """Initialize filter."""
         super().__init__()
+        self.address_type = address_type
         try:
             bt_addr = bt_addr.lower()
         except AttributeError as exc:
@@ -112,3 +145,80 @@ class BtAddrFilter(DeviceFilter):
             raise ValueError("Invalid bluetooth MAC address given,"
                              " format should match aa:bb:cc:dd:ee:ff")
         self.properties['bt_addr'] = bt_addr
+
+
+class FilterIndex(object):
+    """Hash index over a list of device filters.
+
+    match() returns the first filter (in list order) that applies to the packet and
+    whose matches() accepts the advertisement, like iterating over the list would.
+    Filters are grouped by their packet types and the set of property names they
+    check and each group is a dict lookup, so the cost depends on the number of
+    distinct filter shapes and not on the number of filters.
+    """
+
+    def __init__(self, filters):
+        """Compile the filters."""
+        self._filters = list(filters)
+        # bt_addr -> position of the first BtAddrFilter
+        self._bt_addrs = {}
+        # (packet types, property names) -> [(position, filter)]
+        self._groups = {}
+        # filters with unhashable values, checked one by one
+        self._linear = []
+        # (property names of group, property names of packet) -> (names, {values: position})
+        self._projections = {}
+
+        for pos, filtr in enumerate(self._filters):
+            if isinstance(filtr, BtAddrFilter):
+                self._bt_addrs.setdefault(filtr.properties['bt_addr'], pos)
+                continue
+            try:
+                hash(tuple(filtr.properties.values()))
+            except TypeError:
+                self._linear.append((pos, filtr))
+                continue
+            group = (filtr.packet_types, frozenset(filtr.properties))
+            self._groups.setdefault(group, []).append((pos, filtr))
+
+    def _projection(self, group, prop_keys):
+        """Index of a group on the property names it shares with the packet."""
+        projection = self._projections.get((group, prop_keys))
+        if projection is None:
+            # DeviceFilter.matches ignores the filter properties the packet does not have
+            names = tuple(sorted(group[1] & prop_keys))
+            table = {}
+            for pos, filtr in self._groups[group]:
+                table.setdefault(tuple(filtr.properties[name] for name in names), pos)
+            projection = self._projections[(group, prop_keys)] = (names, table)
+        return projection
+
+    def match(self, bt_addr, properties, packet=None):
+        """Return the first filter that applies to packet and matches or None.
+
+        If packet is None the packet types of the filters are not checked.
+        """
+        best = self._bt_addrs.get(bt_addr)
+
+        if properties:
+            prop_keys = frozenset(properties)
+            for group in self._groups:
+                packet_types = group[0]
+                if packet is not None and packet_types is not None \
+                        and not isinstance(packet, packet_types):
+                    continue
+                names, table = self._projection(group, prop_keys)
+                if not names:
+                    continue
+                pos = table.get(tuple(properties[name] for name in names))
+                if pos is not None and (best is None or pos < best):
+                    best = pos
+
+            for pos, filtr in self._linear:
+                if best is not None and pos > best:
+                    break
+                if (packet is None or filtr.applies_to(packet)) and filtr.matches(properties):
+                    best = pos
+                    break
+
+        return None if best is None else self._filters[best]
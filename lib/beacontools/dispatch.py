@@ -0,0 +1,135 @@
+"""Bounded buffer between packet reception and callback dispatch."""
+import logging
+import threading
+
+from .const import DispatchPolicy
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Dispatcher(object):
+    """Preallocated ring buffer drained by one or more dispatcher threads.
+
+    put() never blocks the receive loop. When the buffer is full the policy decides
+    what is lost: DROP_OLDEST discards the oldest queued item, DROP_NEWEST the item
+    being put. COALESCE replaces a still queued item of the same key (the bt address
+    of the beacon) in place and otherwise behaves like DROP_OLDEST.
+    """
+
+    def __init__(self, callback, size=256, policy=DispatchPolicy.DROP_OLDEST, workers=1):
+        """Initialize dispatcher."""
+        if size < 1:
+            raise ValueError("Dispatcher size must be at least 1")
+        if workers < 1:
+            raise ValueError("Dispatcher needs at least one worker")
+        self.callback = callback
+        self.size = size
+        self.policy = DispatchPolicy(policy)
+        self.workers = workers
+
+        self._items = [None] * size
+        self._keys = [None] * size
+        # key -> slot of the queued item, only used when coalescing
+        self._slots = {}
+        self._head = 0
+        self._count = 0
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads = []
+
+        self.received = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    def put(self, key, args):
+        """Queue the callback arguments args, key identifies the beacon for COALESCE."""
+        with self._cond:
+            self.received += 1
+            coalesce = self.policy == DispatchPolicy.COALESCE
+            if coalesce:
+                slot = self._slots.get(key)
+                if slot is not None:
+                    self._items[slot] = args
+                    self.coalesced += 1
+                    return
+
+            if self._count == self.size:
+                self.dropped += 1
+                if self.policy == DispatchPolicy.DROP_NEWEST:
+                    return
+                self._pop()
+
+            slot = (self._head + self._count) % self.size
+            self._items[slot] = args
+            if coalesce:
+                self._keys[slot] = key
+                self._slots[key] = slot
+            self._count += 1
+            if self._count > self.max_depth:
+                self.max_depth = self._count
+            self._cond.notify()
+
+    def _pop(self):
+        """Remove and return the oldest item, the lock must be held."""
+        slot = self._head
+        args = self._items[slot]
+        self._items[slot] = None
+        if self.policy == DispatchPolicy.COALESCE:
+            del self._slots[self._keys[slot]]
+            self._keys[slot] = None
+        self._head = (slot + 1) % self.size
+        self._count -= 1
+        return args
+
+    def _run(self):
+        """Dispatcher thread, calls the callback for every queued item."""
+        while True:
+            with self._cond:
+                while self._count == 0 and self._running:
+                    self._cond.wait()
+                if self._count == 0:
+                    return
+                args = self._pop()
+                self.dispatched += 1
+            try:
+                self.callback(*args)
+            except Exception:  # pylint: disable=broad-except
+                _LOGGER.exception("Beacon callback failed")
+
+    def start(self):
+        """Start the dispatcher threads."""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [threading.Thread(target=self._run, name="beacontools-dispatch-{}".format(i),
+                                          daemon=True) for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, drain=True):
+        """Stop the dispatcher threads, by default after the queued items were dispatched."""
+        with self._cond:
+            self._running = False
+            if not drain:
+                self.dropped += self._count
+                while self._count:
+                    self._pop()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    @property
+    def depth(self):
+        """Number of queued items."""
+        return self._count
+
+    def stats(self):
+        """Counters of the dispatcher."""
+        with self._cond:
+            return {'received': self.received, 'dispatched': self.dispatched,
+                    'dropped': self.dropped, 'coalesced': self.coalesced,
+                    'depth': self._count, 'max_depth': self.max_depth}
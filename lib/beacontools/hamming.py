@@ -0,0 +1,146 @@
+"""Hamming (SECDED style) code of the overflow area beacon data.
+
+Codewords are ints packed LSB first (bit j of the int is bit j of the codeword), the
+parity bits sit at positions 2^i - 1 and the extra parity bit is the highest bit. All
+parity work is done with per-byte lookup tables that are built once per code length.
+"""
+
+# every byte value with its bit order reversed, use with bytes.translate()
+BIT_REVERSED = bytes(int("{:08b}".format(value)[::-1], 2) for value in range(256))
+
+# tables per data length (encoder) and per codeword length (decoder)
+_ENCODE_TABLES = {}
+_DECODE_TABLES = {}
+
+
+def parity_count(data_length):
+    """Number of parity bits for data_length data bits."""
+    count = 0
+    while data_length > ((1 << count) - (count + 1)):
+        count += 1
+    return count
+
+
+def data_positions(code_length):
+    """Positions of the data bits in a codeword of code_length bits (without extra parity)."""
+    return [j for j in range(code_length) if (j + 1) & j != 0]
+
+
+def encode_tables(data_length):
+    """For every data byte and value the spread codeword bits and their syndrome."""
+    tables = _ENCODE_TABLES.get(data_length)
+    if tables is None:
+        code_length = data_length + parity_count(data_length)
+        positions = data_positions(code_length)
+        byte_tables = []
+        for byte_num in range((data_length + 7) // 8):
+            table = []
+            for value in range(256):
+                spread = 0
+                syndrome = 0
+                for bit in range(8):
+                    index = byte_num * 8 + bit
+                    if index < data_length and (value >> bit) & 1:
+                        spread |= 1 << positions[index]
+                        syndrome ^= positions[index] + 1
+                table.append((spread, syndrome))
+            byte_tables.append(table)
+        tables = _ENCODE_TABLES[data_length] = (code_length, byte_tables)
+    return tables
+
+
+def decode_tables(code_length):
+    """For every codeword byte and value the syndrome and the gathered data bits.
+
+    code_length is the codeword length without the extra parity bit. Returns
+    (data length, syndrome tables, gather tables).
+    """
+    tables = _DECODE_TABLES.get(code_length)
+    if tables is None:
+        positions = data_positions(code_length)
+        data_index = {j: index for index, j in enumerate(positions)}
+        syndromes = []
+        gathers = []
+        for byte_num in range((code_length + 7) // 8):
+            syndrome_table = []
+            gather_table = []
+            for value in range(256):
+                syndrome = 0
+                gather = 0
+                for bit in range(8):
+                    j = byte_num * 8 + bit
+                    if j < code_length and (value >> bit) & 1:
+                        syndrome ^= j + 1
+                        if j in data_index:
+                            gather |= 1 << data_index[j]
+                syndrome_table.append(syndrome)
+                gather_table.append(gather)
+            syndromes.append(syndrome_table)
+            gathers.append(gather_table)
+        tables = _DECODE_TABLES[code_length] = (len(positions), syndromes, gathers)
+    return tables
+
+
+def encode_int(value, data_length):
+    """Encode the lowest data_length bits of value.
+
+    Returns (codeword, codeword length), the codeword includes the extra parity bit.
+    """
+    code_length, tables = encode_tables(data_length)
+    value &= (1 << data_length) - 1
+
+    codeword = 0
+    syndrome = 0
+    for table in tables:
+        spread, contribution = table[value & 0xff]
+        codeword |= spread
+        syndrome ^= contribution
+        value >>= 8
+
+    # parity bit i sits at position 2^i - 1 and makes the syndrome zero
+    i = 0
+    while syndrome:
+        if syndrome & 1:
+            codeword |= 1 << ((1 << i) - 1)
+        syndrome >>= 1
+        i += 1
+
+    if codeword != 0:
+        codeword |= 1 << code_length
+
+    return codeword, code_length + 1
+
+
+def decode_int(codeword, code_length):
+    """Decode a codeword of code_length bits (including the extra parity bit).
+
+    A single bit error is corrected. Returns (data, data length) or None if the parity
+    check fails, raises IndexError if the syndrome points outside of the codeword.
+    """
+    work_length = code_length - 1
+    data_length, syndromes, gathers = decode_tables(work_length)
+    extra_parity = (codeword >> work_length) & 1
+    work = codeword & ((1 << work_length) - 1)
+
+    syndrome = 0
+    value = work
+    for table in syndromes:
+        syndrome ^= table[value & 0xff]
+        value >>= 8
+
+    if syndrome != 0:
+        if syndrome > work_length:
+            raise IndexError("Hamming syndrome {} outside of a {} bit codeword"
+                             .format(syndrome, work_length))
+        work ^= 1 << (syndrome - 1)
+
+    data = 0
+    shift = 0
+    for table in gathers:
+        data |= table[(work >> shift) & 0xff]
+        shift += 8
+
+    if (1 if data != 0 else 0) != extra_parity:
+        return None
+
+    return data, data_length
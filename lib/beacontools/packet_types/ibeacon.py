@@ -10,6 +10,16 @@ class IBeaconAdvertisement(object):
         self._minor = data['minor']
         self._tx_power = data['tx_power']
 
+    @classmethod
+    def from_fields(cls, uuid, major, minor, tx_power):
+        """Create an advertisement from already decoded fields (uuid as string)."""
+        adv = cls.__new__(cls)
+        adv._uuid = uuid
+        adv._major = major
+        adv._minor = minor
+        adv._tx_power = tx_power
+        return adv
+
     @property
     def tx_power(self):
         """Calibrated Tx power at 0 m."""
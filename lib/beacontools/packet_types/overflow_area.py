@@ -0,0 +1,92 @@
+"""Packet class for the beacon data of backgrounded iOS apps (Apple overflow area)."""
+from ..const import OVERFLOW_AREA_LENGTH, OVERFLOW_AREA_DATA_OFFSET, OVERFLOW_AREA_MARKER, \
+                    OVERFLOW_AREA_PAYLOAD_LENGTH
+from ..hamming import BIT_REVERSED, encode_int, decode_int
+
+
+def extract_overflow_area_bytes(area, count=OVERFLOW_AREA_PAYLOAD_LENGTH):
+    """Return the count bytes following the marker byte of an overflow area.
+
+    area is the 16 byte overflow area without the type byte. Returns b"" if it does not
+    hold beacon data or more than one bit is flipped.
+    """
+    # iOS sends every byte with its bit order reversed
+    buffer = bytes(area[OVERFLOW_AREA_DATA_OFFSET:]).translate(BIT_REVERSED)
+
+    code_length = 8 * (count + 1) + 7
+    if 8 * len(buffer) < code_length:
+        return b""
+
+    codeword = int.from_bytes(buffer, 'little') & ((1 << code_length) - 1)
+    try:
+        decoded = decode_int(codeword, code_length)
+    except IndexError:
+        # syndrome outside of the codeword, more than one bit flipped
+        return b""
+    if decoded is None:
+        return b""
+
+    data, data_length = decoded
+    data = data.to_bytes(data_length // 8, 'little')
+    if data[0] != OVERFLOW_AREA_MARKER:
+        return b""
+    return data[1:]
+
+
+def decode_overflow_area(area):
+    """Decode an overflow area, returns (major, minor, tx_power) or None."""
+    payload = extract_overflow_area_bytes(area)
+    if len(payload) != OVERFLOW_AREA_PAYLOAD_LENGTH:
+        return None
+    return (payload[0] << 8 | payload[1], payload[2] << 8 | payload[3], payload[4] - 256)
+
+
+def encode_overflow_area(major, minor, tx_power):
+    """Encode major, minor and tx power into a 16 byte overflow area (without type byte)."""
+    payload = bytes([OVERFLOW_AREA_MARKER, major >> 8, major & 0xff, minor >> 8, minor & 0xff,
+                     tx_power & 0xff])
+    codeword, _ = encode_int(int.from_bytes(payload, 'little'), 8 * len(payload))
+    area = bytes(OVERFLOW_AREA_DATA_OFFSET) + \
+        codeword.to_bytes(OVERFLOW_AREA_LENGTH - OVERFLOW_AREA_DATA_OFFSET, 'little')
+    return area.translate(BIT_REVERSED)
+
+
+class OverflowAreaAdvertisement(object):
+    """Overflow area advertisement carrying major, minor and tx power."""
+
+    def __init__(self, major, minor, tx_power):
+        self._major = major
+        self._minor = minor
+        self._tx_power = tx_power
+
+    @classmethod
+    def from_data(cls, data):
+        """Decode the 16 byte overflow area, returns None if it holds no beacon data."""
+        fields = decode_overflow_area(data)
+        if fields is None:
+            return None
+        return cls(*fields)
+
+    @property
+    def tx_power(self):
+        """Calibrated Tx power at 0 m."""
+        return self._tx_power
+
+    @property
+    def major(self):
+        """2-byte major identifier."""
+        return self._major
+
+    @property
+    def minor(self):
+        """2-byte minor identifier."""
+        return self._minor
+
+    @property
+    def properties(self):
+        """Get beacon properties."""
+        return {'overflow_area': True, 'major': self.major, 'minor': self.minor}
+
+    def __str__(self):
+        return "OverflowAreaAdvertisement<tx_power: %d, major: %d, minor: %d>" \
+               % (self.tx_power, self.major, self.minor)
@@ -1,23 +1,107 @@
 """Beacon advertisement parser."""
+import struct
+
 from construct import ConstructError
 
 from .structs import LTVFrame
 from .packet_types import EddystoneUIDFrame, EddystoneURLFrame, EddystoneEncryptedTLMFrame, \
                           EddystoneTLMFrame, EddystoneEIDFrame, IBeaconAdvertisement, \
                           EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, EstimoteNearable, \
-                          CJMonitorAdvertisement, ExposureNotificationFrame
+                          CJMonitorAdvertisement, ExposureNotificationFrame, \
+                          OverflowAreaAdvertisement
 from .const import EDDYSTONE_TLM_UNENCRYPTED, EDDYSTONE_TLM_ENCRYPTED, SERVICE_DATA_TYPE, \
                    EDDYSTONE_UID_FRAME, EDDYSTONE_TLM_FRAME, EDDYSTONE_URL_FRAME, \
                    EDDYSTONE_EID_FRAME, EDDYSTONE_UUID, ESTIMOTE_UUID, ESTIMOTE_TELEMETRY_FRAME, \
                    ESTIMOTE_TELEMETRY_SUBFRAME_A, ESTIMOTE_TELEMETRY_SUBFRAME_B, \
                    MANUFACTURER_SPECIFIC_DATA_TYPE, ESTIMOTE_MANUFACTURER_ID, CJ_MANUFACTURER_ID, \
-                   IBEACON_MANUFACTURER_ID, EXPOSURE_NOTIFICATION_UUID
+                   IBEACON_MANUFACTURER_ID, EXPOSURE_NOTIFICATION_UUID, IBEACON_PROXIMITY_TYPE, \
+                   OVERFLOW_AREA_TYPE
+from .utils import data_to_uuid
 
 # pylint: disable=invalid-name,too-many-return-statements
 
+# length byte of an iBeacon AD structure (type, company id, beacon type and 21 byte payload)
+IBEACON_AD_LENGTH = 0x1A
+IBEACON_PREFIX = bytes([MANUFACTURER_SPECIFIC_DATA_TYPE]) + IBEACON_MANUFACTURER_ID + \
+                 IBEACON_PROXIMITY_TYPE
+# uuid, major, minor, tx_power
+IBeaconFields = struct.Struct(">16sHHb")
+
+# length byte of an overflow area AD structure (type, company id, data type and 16 byte area)
+OVERFLOW_AREA_AD_LENGTH = 0x14
+OVERFLOW_AREA_PREFIX = bytes([MANUFACTURER_SPECIFIC_DATA_TYPE]) + IBEACON_MANUFACTURER_ID + \
+                       OVERFLOW_AREA_TYPE
+
+# formatted uuid strings by raw uuid, there are only a handful of distinct uuids in the air
+_UUID_CACHE = {}
+_UUID_CACHE_SIZE = 256
+# decoded advertisement (or None) by raw overflow area, phones repeat the same area
+_OVERFLOW_AREA_CACHE = {}
+_OVERFLOW_AREA_CACHE_SIZE = 1024
+
+
 def parse_packet(packet):
     """Parse a beacon advertisement packet."""
-    return parse_ltv_packet(packet)
+    return parse_ibeacon_packet(packet) or parse_overflow_area_packet(packet) or \
+           parse_ltv_packet(packet)
+
+def parse_ibeacon_packet(packet):
+    """Decode an iBeacon advertisement without going through construct.
+
+    Walks the AD structures by their length byte and unpacks the first iBeacon
+    manufacturer record in place. Returns None if the packet contains no iBeacon,
+    so the caller can fall back to parse_ltv_packet for the other beacon types.
+    """
+    view = memoryview(packet)
+    end = len(view)
+    pos = 0
+    while pos < end:
+        length = view[pos]
+        if length == 0:
+            return None
+        if length == IBEACON_AD_LENGTH and pos + IBEACON_AD_LENGTH < end \
+                and view[pos + 1] == IBEACON_PREFIX[0] and view[pos + 2] == IBEACON_PREFIX[1] \
+                and view[pos + 3] == IBEACON_PREFIX[2] and view[pos + 4] == IBEACON_PREFIX[3] \
+                and view[pos + 5] == IBEACON_PREFIX[4]:
+            uuid, major, minor, tx_power = IBeaconFields.unpack_from(view, pos + 6)
+            uuid_str = _UUID_CACHE.get(uuid)
+            if uuid_str is None:
+                if len(_UUID_CACHE) >= _UUID_CACHE_SIZE:
+                    _UUID_CACHE.clear()
+                uuid_str = _UUID_CACHE[uuid] = data_to_uuid(uuid)
+            return IBeaconAdvertisement.from_fields(uuid_str, major, minor, tx_power)
+        pos += length + 1
+    return None
+
+def parse_overflow_area_packet(packet):
+    """Decode the beacon data in the Apple overflow area of a backgrounded iOS app.
+
+    Returns None if the packet has no overflow area or the area does not hold
+    (or fails the Hamming check of) beacon data.
+    """
+    view = memoryview(packet)
+    end = len(view)
+    pos = 0
+    while pos < end:
+        length = view[pos]
+        if length == 0:
+            return None
+        if length == OVERFLOW_AREA_AD_LENGTH and pos + OVERFLOW_AREA_AD_LENGTH < end \
+                and view[pos + 1] == OVERFLOW_AREA_PREFIX[0] \
+                and view[pos + 2] == OVERFLOW_AREA_PREFIX[1] \
+                and view[pos + 3] == OVERFLOW_AREA_PREFIX[2] \
+                and view[pos + 4] == OVERFLOW_AREA_PREFIX[3]:
+            area = bytes(view[pos + 5:pos + OVERFLOW_AREA_AD_LENGTH + 1])
+            try:
+                return _OVERFLOW_AREA_CACHE[area]
+            except KeyError:
+                pass
+            if len(_OVERFLOW_AREA_CACHE) >= _OVERFLOW_AREA_CACHE_SIZE:
+                _OVERFLOW_AREA_CACHE.clear()
+            adv = _OVERFLOW_AREA_CACHE[area] = OverflowAreaAdvertisement.from_data(area)
+            return adv
+        pos += length + 1
+    return None
 
 def parse_ltv_packet(packet):
     """Parse a tag-length-value style beacon packet."""
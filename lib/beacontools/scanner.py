@@ -1,5 +1,9 @@
 """Classes responsible for Beacon scanning."""
+import asyncio
+import errno
 import logging
+import os
+import selectors
 import struct
 import threading
 from importlib import import_module
@@ -18,14 +22,17 @@ from .const import (CJ_MANUFACTURER_ID, EDDYSTONE_UUID,
                     BluetoothAddressType, ScanFilter, ScannerMode, ScanType,
                     OCF_LE_SET_EXT_SCAN_PARAMETERS, OCF_LE_SET_EXT_SCAN_ENABLE,
                     EVT_LE_EXT_ADVERTISING_REPORT, OGF_INFO_PARAM,
-                    OCF_READ_LOCAL_VERSION, EVT_CMD_COMPLETE)
-from .device_filters import BtAddrFilter, DeviceFilter
+                    OCF_READ_LOCAL_VERSION, EVT_CMD_COMPLETE, DispatchPolicy,
+                    OCF_LE_READ_WHITE_LIST_SIZE, OCF_LE_CLEAR_WHITE_LIST,
+                    OCF_LE_ADD_DEVICE_TO_WHITE_LIST, OCF_LE_REMOVE_DEVICE_FROM_WHITE_LIST)
+from .device_filters import BtAddrFilter, DeviceFilter, FilterIndex
 from .packet_types import (EddystoneEIDFrame, EddystoneEncryptedTLMFrame,
                            EddystoneTLMFrame, EddystoneUIDFrame,
-                           EddystoneURLFrame)
-from .parser import parse_packet
-from .utils import (bin_to_int, bt_addr_to_string, get_mode, is_one_of,
-                    is_packet_type, to_int)
+                           EddystoneURLFrame, OverflowAreaAdvertisement)
+from .dispatch import Dispatcher
+from .parser import parse_ibeacon_packet, parse_ltv_packet, parse_overflow_area_packet
+from .utils import (bt_addr_to_bytes, bt_addr_to_string, get_mode, is_one_of, is_packet_type,
+                    iter_advertising_reports, to_int)
 
 
 class HCIVersion(IntEnum):
@@ -50,40 +57,66 @@ class HCIVersion(IntEnum):
 _LOGGER = logging.getLogger(__name__)
 _LOGGER.setLevel(logging.DEBUG)
 
+# errno values of a non-blocking recv that has nothing to read (yet)
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
 # pylint: disable=no-member
 
 
+def check_filters(device_filter, packet_filter):
+    """Validate device and packet filters, returns them as lists (or None if empty)."""
+    # check if device filters are valid
+    if device_filter is not None:
+        if not isinstance(device_filter, list):
+            device_filter = [device_filter]
+        if len(device_filter) > 0:
+            for filtr in device_filter:
+                if not isinstance(filtr, DeviceFilter):
+                    raise ValueError("Device filters must be instances of DeviceFilter")
+        else:
+            device_filter = None
+
+    # check if packet filters are valid
+    if packet_filter is not None:
+        if not isinstance(packet_filter, list):
+            packet_filter = [packet_filter]
+        if len(packet_filter) > 0:
+            for filtr in packet_filter:
+                if not is_packet_type(filtr):
+                    raise ValueError("Packet filters must be one of the packet types")
+        else:
+            packet_filter = None
+
+    return device_filter, packet_filter
+
+
 class BeaconScanner(object):
     """Scan for Beacon advertisements."""
 
-    def __init__(self, callback, bt_device_id=0, device_filter=None, packet_filter=None, scan_parameters=None):
-        """Initialize scanner."""
-        # check if device filters are valid
-        if device_filter is not None:
-            if not isinstance(device_filter, list):
-                device_filter = [device_filter]
-            if len(device_filter) > 0:
-                for filtr in device_filter:
-                    if not isinstance(filtr, DeviceFilter):
-                        raise ValueError("Device filters must be instances of DeviceFilter")
-            else:
-                device_filter = None
-
-        # check if packet filters are valid
-        if packet_filter is not None:
-            if not isinstance(packet_filter, list):
-                packet_filter = [packet_filter]
-            if len(packet_filter) > 0:
-                for filtr in packet_filter:
-                    if not is_packet_type(filtr):
-                        raise ValueError("Packet filters must be one of the packet types")
-            else:
-                packet_filter = None
+    def __init__(self, callback, bt_device_id=0, device_filter=None, packet_filter=None, scan_parameters=None,
+                 backend=None, queue_size=None, queue_policy=DispatchPolicy.DROP_OLDEST, dispatch_workers=1):
+        """Initialize scanner.
+
+        backend is the module (or module name) providing open_dev/send_cmd/send_req,
+        by default the one for the current platform. Use beacontools.backend.replay
+        to scan a btsnoop capture instead of a live device.
+
+        By default the callback runs on the receiving thread. With queue_size set,
+        advertisements go through a Dispatcher of that size and the callback runs
+        on dispatch_workers separate threads, queue_policy decides what is dropped
+        when the callback can not keep up.
+        """
+        device_filter, packet_filter = check_filters(device_filter, packet_filter)
 
         if scan_parameters is None:
             scan_parameters = {}
 
-        self._mon = Monitor(callback, bt_device_id, device_filter, packet_filter, scan_parameters)
+        dispatcher = None
+        if queue_size is not None:
+            dispatcher = Dispatcher(callback, queue_size, queue_policy, dispatch_workers)
+
+        self._mon = Monitor(callback, bt_device_id, device_filter, packet_filter, scan_parameters, backend,
+                            dispatcher)
 
     def start(self):
         """Start beacon scanning."""
@@ -93,35 +126,231 @@ class BeaconScanner(object):
         """Stop beacon scanning."""
         self._mon.terminate()
 
+    def add_to_whitelist(self, bt_addr, address_type=BluetoothAddressType.PUBLIC):
+        """Add a device to the controller white list (scanner must be started)."""
+        self._mon.add_to_whitelist(bt_addr, address_type)
+
+    def remove_from_whitelist(self, bt_addr, address_type=BluetoothAddressType.PUBLIC):
+        """Remove a device from the controller white list (scanner must be started)."""
+        self._mon.remove_from_whitelist(bt_addr, address_type)
+
+    def clear_whitelist(self):
+        """Remove all devices from the controller white list (scanner must be started)."""
+        self._mon.clear_whitelist()
+
+    @property
+    def whitelist_size(self):
+        """Number of white list entries supported by the controller (None if unknown)."""
+        return self._mon.whitelist_size
+
+    @property
+    def dispatch_stats(self):
+        """Counters of the dispatch buffer (None if the callback runs on the receiving thread)."""
+        if self._mon.dispatcher is None:
+            return None
+        return self._mon.dispatcher.stats()
+
+
+class AsyncBeaconScanner(object):
+    """Scan for Beacon advertisements on an asyncio event loop.
+
+    The HCI socket is registered with loop.add_reader, so no thread is involved.
+    Sockets without a file descriptor (replayed or simulated traffic) are read on
+    the loop's default executor instead. Filters behave like the ones of
+    BeaconScanner. Usage::
+
+        async with AsyncBeaconScanner(device_filter=IBeaconFilter(uuid=...)) as scanner:
+            async for bt_addr, rssi, packet, properties in scanner:
+                ...
+
+    Advertisements are buffered in a queue of queue_size entries, when the consumer
+    falls behind new advertisements are dropped and counted in dropped. The iteration
+    ends when the scanner is stopped or the device is gone, a receive error is raised
+    to the consumer.
+    """
+
+    def __init__(self, bt_device_id=0, device_filter=None, packet_filter=None, scan_parameters=None,
+                 backend=None, queue_size=256):
+        """Initialize scanner."""
+        device_filter, packet_filter = check_filters(device_filter, packet_filter)
+
+        if scan_parameters is None:
+            scan_parameters = {}
+
+        self._mon = Monitor(self._enqueue, bt_device_id, device_filter, packet_filter, scan_parameters, backend)
+        self._queue_size = queue_size
+        self._queue = None
+        self._loop = None
+        self._fd = None
+        self._task = None
+        self._running = False
+        self._error = None
+        self.dropped = 0
+
+    async def start(self):
+        """Open the device and start beacon scanning."""
+        if self._running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(self._queue_size)
+        self._error = None
+        self._mon.open_socket()
+        self._running = True
+        self._fd = self._mon.socket_fileno()
+        if self._fd is None:
+            self._task = self._loop.create_task(self._read_events())
+        else:
+            self._mon.socket.setblocking(False)
+            self._loop.add_reader(self._fd, self._on_readable)
+
+    async def stop(self):
+        """Stop beacon scanning and end the iteration."""
+        if not self._running:
+            return
+        self._running = False
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        else:
+            # recv of these sockets returns soon, the task ends after it
+            await self._task
+        self._task = None
+        self._mon.toggle_scan(False)
+        self._mon.socket.close()
+        self._finish()
+
+    def _on_readable(self):
+        """Read and process one HCI event, called by the event loop."""
+        try:
+            pkt = self._mon.socket.recv(255)
+        except Exception as error:  # pylint: disable=broad-except
+            # pybluez raises its own error type for EAGAIN
+            if not would_block(error):
+                self._end(error)
+            return
+        if not pkt:
+            # device gone
+            self._end()
+            return
+        self._mon.handle_event(pkt)
+
+    async def _read_events(self):
+        """Read a socket without file descriptor on the executor until stopped."""
+        while self._running:
+            try:
+                pkt = await self._loop.run_in_executor(None, self._mon.socket.recv, 255)
+            except Exception as error:  # pylint: disable=broad-except
+                self._end(error)
+                return
+            if not pkt:
+                # end of a replayed capture
+                self._end()
+                return
+            self._mon.handle_event(pkt)
+
+    def _end(self, error=None):
+        """Close the socket after an error or the end of the data and end the iteration."""
+        if not self._running:
+            # stop() closes the socket
+            return
+        self._running = False
+        if self._fd is not None:
+            self._loop.remove_reader(self._fd)
+            self._fd = None
+        self._mon.socket.close()
+        self._error = error
+        self._finish()
+
+    def _enqueue(self, _monitor, _beacon_type, bt_addr, rssi, packet, properties):
+        """Monitor callback, queue the advertisement for the consumer."""
+        try:
+            self._queue.put_nowait((bt_addr, rssi, packet, properties))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def _finish(self):
+        """Wake up the consumer with the end of iteration marker."""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._queue is None:
+            raise RuntimeError("AsyncBeaconScanner must be started before iterating")
+        item = await self._queue.get()
+        if item is None:
+            # keep the marker for other consumers
+            self._queue.put_nowait(None)
+            if self._error is not None:
+                raise self._error
+            raise StopAsyncIteration
+        return item
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.stop()
+
+
+def would_block(error):
+    """Whether a recv error only means there is nothing to read on a non-blocking socket."""
+    if isinstance(error, (BlockingIOError, InterruptedError)):
+        return True
+    code = getattr(error, "errno", None)
+    if code is None and error.args:
+        code = error.args[0]
+    return code in _WOULD_BLOCK
+
 
 class Monitor(threading.Thread):
     """Continously scan for BLE advertisements."""
 
-    def __init__(self, callback, bt_device_id, device_filter, packet_filter, scan_parameters):
+    def __init__(self, callback, bt_device_id, device_filter, packet_filter, scan_parameters, backend=None,
+                 dispatcher=None):
         """Construct interface object."""
         # do import here so that the package can be used in parsing-only mode (no bluez required)
-        self.backend = import_module('beacontools.backend')
+        if backend is None:
+            backend = 'beacontools.backend'
+        self.backend = import_module(backend) if isinstance(backend, str) else backend
 
         threading.Thread.__init__(self)
         self.daemon = False
         self.keep_going = True
         self.callback = callback
+        # optional buffer between reception and the callback
+        self.dispatcher = dispatcher
 
         # number of the bt device (hciX)
         self.bt_device_id = bt_device_id
         # list of beacons to monitor
         self.device_filter = device_filter
+        self.filter_index = FilterIndex(device_filter) if device_filter is not None else None
         self.mode = get_mode(device_filter)
         # list of packet types to monitor
         self.packet_filter = packet_filter
+        # packet class -> result of the packet filter
+        self.packet_filter_cache = {}
         # bluetooth socket
         self.socket = None
+        # write end of the pipe waking up the receive loop
+        self._wakeup_fd = None
+        self._wakeup_lock = threading.Lock()
         # keep track of Eddystone Beacon <-> bt addr mapping
         self.eddystone_mappings = []
         # parameters to pass to bt device
         self.scan_parameters = scan_parameters
         # hci version
         self.hci_version = HCIVersion.BT_CORE_SPEC_1_0
+        # state of the controller
+        self.scanning = False
+        self.filter_type = ScanFilter.ALL
+        self.whitelist_size = None
 
         # construct an aho-corasick search tree for efficient prefiltering
         service_uuid_prefix = b"\x03\x03"
@@ -141,20 +370,77 @@ class Monitor(threading.Thread):
 
     def run(self):
         """Continously scan for BLE advertisements."""
+        if self.dispatcher is not None:
+            self.dispatcher.start()
+        self.open_socket()
+
+        fileno = self.socket_fileno()
+        if fileno is None:
+            while self.keep_going:
+                pkt = self.socket.recv(255)
+                if not pkt:
+                    # device gone or end of a replayed capture
+                    break
+                self.handle_event(pkt)
+        else:
+            self.receive_loop(fileno)
+
+        if not self.keep_going:
+            self.toggle_scan(False)
+        self.socket.close()
+
+    def socket_fileno(self):
+        """File descriptor of the socket, None for replayed or simulated traffic.
+
+        recv of sockets without file descriptor never blocks for long.
+        """
+        try:
+            return self.socket.fileno()
+        except AttributeError:
+            return None
+
+    def receive_loop(self, fileno):
+        """Wait for the socket and the wakeup pipe, so terminate() does not hang in recv."""
+        wakeup_read, wakeup_write = os.pipe()
+        with self._wakeup_lock:
+            self._wakeup_fd = wakeup_write
+        selector = selectors.DefaultSelector()
+        selector.register(fileno, selectors.EVENT_READ)
+        selector.register(wakeup_read, selectors.EVENT_READ)
+        try:
+            while self.keep_going:
+                for key, _ in selector.select():
+                    if key.fd != fileno or not self.keep_going:
+                        continue
+                    pkt = self.socket.recv(255)
+                    if not pkt:
+                        # device gone
+                        return
+                    self.handle_event(pkt)
+        finally:
+            selector.close()
+            with self._wakeup_lock:
+                self._wakeup_fd = None
+            os.close(wakeup_write)
+            os.close(wakeup_read)
+
+    def open_socket(self):
+        """Open the bluetooth socket and enable scanning."""
         self.socket = self.backend.open_dev(self.bt_device_id)
 
         self.hci_version = self.get_hci_version()
+        if self.scan_parameters.get('filter_type') == ScanFilter.WHITELIST_ONLY:
+            self.push_whitelist()
         self.set_scan_parameters(**self.scan_parameters)
         self.toggle_scan(True)
 
-        while self.keep_going:
-            pkt = self.socket.recv(255)
-            event = to_int(pkt[1])
-            subevent = to_int(pkt[3])
-            if event == LE_META_EVENT and subevent in [EVT_LE_ADVERTISING_REPORT, EVT_LE_EXT_ADVERTISING_REPORT]:
-                # we have an BLE advertisement
-                self.process_packet(pkt)
-        self.socket.close()
+    def handle_event(self, pkt):
+        """Process a received HCI event packet."""
+        event = to_int(pkt[1])
+        subevent = to_int(pkt[3])
+        if event == LE_META_EVENT and subevent in [EVT_LE_ADVERTISING_REPORT, EVT_LE_EXT_ADVERTISING_REPORT]:
+            # we have an BLE advertisement
+            self.process_packet(pkt)
 
     def get_hci_version(self):
         """Gets the HCI version"""
@@ -192,9 +478,10 @@ class Monitor(threading.Thread):
             address_type: Bluetooth address type BluetoothAddressType.(PUBLIC|RANDOM)
                 * PUBLIC = use device MAC address
                 * RANDOM = generate a random MAC address and use that
-            filter: ScanFilter.(ALL|WHITELIST_ONLY) only ALL is supported, which will
-                return all fetched bluetooth packets (WHITELIST_ONLY is not supported,
-                because OCF_LE_ADD_DEVICE_TO_WHITE_LIST command is not implemented)
+            filter: ScanFilter.(ALL|WHITELIST_ONLY) ALL returns all fetched bluetooth packets,
+                WHITELIST_ONLY only the ones of devices in the controller white list. When
+                scanning is started with WHITELIST_ONLY, the addresses of all BtAddrFilters
+                are pushed to the white list (see push_whitelist)
 
         Raises:
             ValueError: A value had an unexpected format or was not in range
@@ -234,6 +521,80 @@ class Monitor(threading.Thread):
                 window_fractions)
 
         self.backend.send_cmd(self.socket, OGF_LE_CTL, command_field, scan_parameter_pkg)
+        self.filter_type = filter_type
+
+    def push_whitelist(self):
+        """Replace the controller white list by the addresses of all BtAddrFilters.
+
+        A BtAddrFilter without address_type is pushed twice, as public and as random
+        address, and uses two entries. A warning is logged if there are no entries,
+        nothing is received until add_to_whitelist() is called, or if there are more
+        entries than the controller supports.
+        """
+        self.whitelist_size = self.read_whitelist_size()
+        self.clear_whitelist()
+
+        entries = 0
+        for filtr in self.device_filter or []:
+            if not isinstance(filtr, BtAddrFilter):
+                continue
+            if filtr.address_type is None:
+                address_types = [BluetoothAddressType.PUBLIC, BluetoothAddressType.RANDOM]
+            else:
+                address_types = [filtr.address_type]
+            for address_type in address_types:
+                self.add_to_whitelist(filtr.properties['bt_addr'], address_type)
+                entries += 1
+
+        if entries == 0:
+            _LOGGER.warning("White list only scan without BtAddrFilter, the white list is empty "
+                            "and nothing is received until add_to_whitelist() is called")
+        elif self.whitelist_size is not None and entries > self.whitelist_size:
+            _LOGGER.warning("%d white list entries pushed, but the controller supports only %d",
+                            entries, self.whitelist_size)
+
+    def read_whitelist_size(self):
+        """Read the number of white list entries supported by the controller.
+
+        Must not be called while the receive loop is running, it would race for the
+        command complete event. Returns None if the backend does not support requests.
+        """
+        try:
+            resp = self.backend.send_req(self.socket, OGF_LE_CTL, OCF_LE_READ_WHITE_LIST_SIZE,
+                                         EVT_CMD_COMPLETE, 2, bytes(), 0)
+        except NotImplementedError:
+            return None
+        status, size = struct.unpack("<BB", resp[:2])
+        if status != 0:
+            raise RuntimeError("LE Read White List Size failed with status 0x{:02x}".format(status))
+        return size
+
+    def add_to_whitelist(self, bt_addr, address_type=BluetoothAddressType.PUBLIC):
+        """Add a device to the controller white list."""
+        self._whitelist_cmd(OCF_LE_ADD_DEVICE_TO_WHITE_LIST,
+                            struct.pack("<B", address_type) + bt_addr_to_bytes(bt_addr))
+
+    def remove_from_whitelist(self, bt_addr, address_type=BluetoothAddressType.PUBLIC):
+        """Remove a device from the controller white list."""
+        self._whitelist_cmd(OCF_LE_REMOVE_DEVICE_FROM_WHITE_LIST,
+                            struct.pack("<B", address_type) + bt_addr_to_bytes(bt_addr))
+
+    def clear_whitelist(self):
+        """Remove all devices from the controller white list."""
+        self._whitelist_cmd(OCF_LE_CLEAR_WHITE_LIST, bytes())
+
+    def _whitelist_cmd(self, command_field, data):
+        """Send a white list command.
+
+        The white list can not be changed while scanning uses it, so scanning is
+        paused meanwhile.
+        """
+        pause = self.scanning and self.filter_type == ScanFilter.WHITELIST_ONLY
+        if pause:
+            self.toggle_scan(False)
+        self.backend.send_cmd(self.socket, OGF_LE_CTL, command_field, data)
+        if pause:
+            self.toggle_scan(True)
 
     def toggle_scan(self, enable, filter_duplicates=False):
         """Enables or disables BLE scanning
@@ -258,25 +619,34 @@ class Monitor(threading.Thread):
                                   )
 
         self.backend.send_cmd(self.socket, OGF_LE_CTL, command_field, command)
+        self.scanning = bool(enable)
 
     def process_packet(self, pkt):
-        """Parse the packet and call callback if one of the filters matches."""
-        payload = pkt[14:-1] if self.hci_version < HCIVersion.BT_CORE_SPEC_5_0 else pkt[29:]
-
+        """Parse every report of the event and call callback if one of the filters matches."""
+        for bt_addr, rssi, payload in iter_advertising_reports(pkt):
+            self.process_report(bt_addr, rssi, payload)
+
+    def process_report(self, bt_addr, rssi, payload):
+        """Parse a single advertising report and call callback if one of the filters matches."""
+        # iBeacons are by far the most common advertisement, decode them at fixed
+        # offsets and only hand everything else to the construct based parser
+        packet = parse_ibeacon_packet(payload) if self.mode & ScannerMode.MODE_IBEACON else None
+        if packet is None and self.mode & ScannerMode.MODE_OVERFLOW_AREA:
+            packet = parse_overflow_area_packet(payload)
+        if packet is None:
+            payload = bytes(payload)
+            # check if this could be a valid packet before parsing
+            # this reduces the CPU load significantly
+            if not self.kwtree.search(payload):
+                return
 
-        # check if this could be a valid packet before parsing
-        # this reduces the CPU load significantly
-        if not self.kwtree.search(payload):
-            return
+            packet = parse_ltv_packet(payload)
 
-        bt_addr = bt_addr_to_string(pkt[7:13])
-        rssi = bin_to_int(pkt[-1] if self.hci_version < HCIVersion.BT_CORE_SPEC_5_0 else pkt[18])
-        # strip bluetooth address and parse packet
-        packet = parse_packet(payload)
+            # return if packet was not an beacon advertisement
+            if not packet:
+                return
 
-        # return if packet was not an beacon advertisement
-        if not packet:
-            return
+        bt_addr = bt_addr_to_string(bt_addr)
 
         # we need to remeber which eddystone beacon has which bt address
         # because the TLM and URL frames do not contain the namespace and instance
@@ -287,28 +657,41 @@ class Monitor(threading.Thread):
 
         if self.device_filter is None and self.packet_filter is None:
             # no filters selected
-            self.callback(self, "", bt_addr, rssi, packet, properties)
+            self.emit("", bt_addr, rssi, packet, properties)
 
         elif self.device_filter is None:
             # filter by packet type
-            if is_one_of(packet, self.packet_filter):
-                self.callback(self, "", t_addr, rssi, packet, properties)
+            if self.packet_filter_matches(packet):
+                self.emit("", bt_addr, rssi, packet, properties)
         else:
             # filter by device and packet type
-            if self.packet_filter and not is_one_of(packet, self.packet_filter):
+            if self.packet_filter and not self.packet_filter_matches(packet):
                 # return if packet filter does not match
                 return
 
-            # iterate over filters and call .matches() on each
-            for filtr in self.device_filter:
-                if isinstance(filtr, BtAddrFilter):
-                    if filtr.matches({'bt_addr':bt_addr}):
-                        self.callback(self, "", bt_addr, rssi, packet, properties)
-                        return
-
-                elif filtr.matches(properties):
-                    self.callback(self, "iBeacon", bt_addr, rssi, packet, properties)
-                    return
+            filtr = self.filter_index.match(bt_addr, properties, packet)
+            if filtr is None:
+                return
+            if isinstance(filtr, BtAddrFilter):
+                self.emit("", bt_addr, rssi, packet, properties)
+            elif isinstance(packet, OverflowAreaAdvertisement):
+                self.emit("OverflowArea", bt_addr, rssi, packet, properties)
+            else:
+                self.emit("iBeacon", bt_addr, rssi, packet, properties)
+
+    def packet_filter_matches(self, packet):
+        """Check the packet against the packet filter, cached per packet class."""
+        matches = self.packet_filter_cache.get(type(packet))
+        if matches is None:
+            matches = self.packet_filter_cache[type(packet)] = is_one_of(packet, self.packet_filter)
+        return matches
+
+    def emit(self, beacon_type, bt_addr, rssi, packet, properties):
+        """Call the callback directly or hand the advertisement to the dispatcher."""
+        if self.dispatcher is None:
+            self.callback(self, beacon_type, bt_addr, rssi, packet, properties)
+        else:
+            self.dispatcher.put(bt_addr, (self, beacon_type, bt_addr, rssi, packet, properties))
 
     def save_bt_addr(self, packet, bt_addr):
         """Add to the list of mappings."""
@@ -336,7 +719,14 @@ class Monitor(threading.Thread):
         return None
 
     def terminate(self):
-        """Signal runner to stop and join thread."""
-        self.toggle_scan(False)
+        """Signal runner to stop and join thread.
+
+        Scanning is disabled by the receive loop once it woke up.
+        """
         self.keep_going = False
+        with self._wakeup_lock:
+            if self._wakeup_fd is not None:
+                os.write(self._wakeup_fd, b"\0")
         self.join()
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
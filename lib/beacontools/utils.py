@@ -4,7 +4,17 @@ from re import compile as compile_regex
 import array
 import struct
 
-from .const import ScannerMode
+from .const import ScannerMode, EVT_LE_EXT_ADVERTISING_REPORT
+
+# offsets inside a single report of an LE (extended) advertising report event,
+# see BT Core 5.1 Specification, pages 2382 and 2400
+LEGACY_REPORT_ADDR = 2
+LEGACY_REPORT_DATA_LEN = 8
+LEGACY_REPORT_HEADER = 9
+EXT_REPORT_ADDR = 3
+EXT_REPORT_RSSI = 13
+EXT_REPORT_DATA_LEN = 23
+EXT_REPORT_HEADER = 24
 
 # compiled regex to match lowercase MAC-addresses coming from
 # bt_addr_to_string
@@ -45,6 +55,51 @@ def bt_addr_to_string(addr):
     return ':'.join(a+b for a, b in zip(hex_str[::2], hex_str[1::2]))
 
 
+def iter_advertising_reports(pkt):
+    """Iterate over all reports of an HCI LE (extended) advertising report event.
+
+    Controllers batch several reports into one event, each with its own data length.
+    Yields (bt_addr, rssi, payload) per report, where bt_addr and payload are
+    memoryview slices of pkt (nothing is copied). Truncated reports are skipped.
+    """
+    view = memoryview(pkt)
+    end = len(view)
+    if end < 5:
+        return
+    num_reports = view[4]
+    pos = 5
+    if view[3] == EVT_LE_EXT_ADVERTISING_REPORT:
+        for _ in range(num_reports):
+            if pos + EXT_REPORT_HEADER > end:
+                return
+            data_end = pos + EXT_REPORT_HEADER + view[pos + EXT_REPORT_DATA_LEN]
+            if data_end > end:
+                return
+            rssi = view[pos + EXT_REPORT_RSSI]
+            yield (view[pos + EXT_REPORT_ADDR:pos + EXT_REPORT_ADDR + 6],
+                   rssi - 256 if rssi > 127 else rssi,
+                   view[pos + EXT_REPORT_HEADER:data_end])
+            pos = data_end
+    else:
+        for _ in range(num_reports):
+            if pos + LEGACY_REPORT_HEADER > end:
+                return
+            data_end = pos + LEGACY_REPORT_HEADER + view[pos + LEGACY_REPORT_DATA_LEN]
+            # the rssi byte follows the data
+            if data_end >= end:
+                return
+            rssi = view[data_end]
+            yield (view[pos + LEGACY_REPORT_ADDR:pos + LEGACY_REPORT_ADDR + 6],
+                   rssi - 256 if rssi > 127 else rssi,
+                   view[pos + LEGACY_REPORT_HEADER:data_end])
+            pos = data_end + 1
+
+
+def bt_addr_to_bytes(bt_addr):
+    """Convert a bluetooth address string to the little endian byte order used by HCI."""
+    return bytes.fromhex(bt_addr.replace(':', ''))[::-1]
+
+
 def is_one_of(obj, types):
     """Return true iff obj is an instance of one of the types."""
     for type_ in types:
@@ -60,13 +115,13 @@ def is_packet_type(cls):
                               EddystoneEncryptedTLMFrame, EddystoneTLMFrame, \
                               EddystoneEIDFrame, IBeaconAdvertisement, \
                               EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, \
-                              ExposureNotificationFrame
+                              ExposureNotificationFrame, OverflowAreaAdvertisement
     # pylint: enable=import-outside-toplevel
 
     return (cls in [EddystoneURLFrame, EddystoneUIDFrame, EddystoneEncryptedTLMFrame, \
                     EddystoneTLMFrame, EddystoneEIDFrame, IBeaconAdvertisement, \
                     EstimoteTelemetryFrameA, EstimoteTelemetryFrameB, \
-                    ExposureNotificationFrame])
+                    ExposureNotificationFrame, OverflowAreaAdvertisement])
 
 
 def to_int(string):
@@ -88,7 +143,8 @@ def bin_to_int(string):
 def get_mode(device_filter):
     """Determine which beacons the scanner should look for."""
     from .device_filters import IBeaconFilter, EddystoneFilter, BtAddrFilter, EstimoteFilter, \
-                                CJMonitorFilter, ExposureNotificationFilter  # pylint: disable=import-outside-toplevel
+                                CJMonitorFilter, ExposureNotificationFilter, \
+                                OverflowAreaFilter  # pylint: disable=import-outside-toplevel
 
     if device_filter is None or len(device_filter) == 0:
         return ScannerMode.MODE_ALL
@@ -105,6 +161,8 @@ def get_mode(device_filter):
             mode |= ScannerMode.MODE_CJMONITOR
         elif isinstance(filtr, ExposureNotificationFilter):
             mode |= ScannerMode.MODE_EXPOSURE_NOTIFICATION
+        elif isinstance(filtr, OverflowAreaFilter):
+            mode |= ScannerMode.MODE_OVERFLOW_AREA
         elif isinstance(filtr, BtAddrFilter):
             mode |= ScannerMode.MODE_ALL
             break
@@ -19,6 +19,7 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
+import sys
 import time
 import threading
 
@@ -130,6 +131,15 @@ class Advertisement(dbus.service.Object):
             self.manufacturer_data = dbus.Dictionary({}, signature='qv')
         self.manufacturer_data[manuf_code] = dbus.Array(data, signature='y')
 
+    def set_manufacturer_data(self, manuf_code, data):
+        # bluetoothd watches the properties of registered advertisements
+        # and refreshes the advertising data in place when they change
+        self.manufacturer_data = None
+        self.add_manufacturer_data(manuf_code, data)
+        changed = {'ManufacturerData': dbus.Dictionary(self.manufacturer_data,
+                                                       signature='qv')}
+        self.PropertiesChanged(LE_ADVERTISEMENT_IFACE, changed, [])
+
     def add_service_data(self, uuid, data):
         if not self.service_data:
             self.service_data = dbus.Dictionary({}, signature='sv')
@@ -153,6 +163,11 @@ class Advertisement(dbus.service.Object):
             raise InvalidArgsException()
         return self.get_properties()[LE_ADVERTISEMENT_IFACE]
 
+    @dbus.service.signal(DBUS_PROP_IFACE,
+                         signature='sa{sv}as')
+    def PropertiesChanged(self, interface, changed, invalidated):
+        pass
+
     @dbus.service.method(LE_ADVERTISEMENT_IFACE,
                          in_signature='',
                          out_signature='')
@@ -165,23 +180,34 @@ class Advertisement(dbus.service.Object):
 #---------------------------------------------------------------
 class iBeaconAdvertiser():
 
+  # Index of the exported advertisement object, unique per advertiser
+  # class so that several adverts can be registered on one bus
+  AD_INDEX = 0
+
   #---------------------------------------------------------------
   #  Constructor
+  #
+  #  uuid    - proximity UUID, None for adverts without one
+  #  session - shared BluezSession, start() then returns right away
+  #            and the session's main loop thread serves BlueZ
   #---------------------------------------------------------------
-  def __init__(self, uuid, major, minor, tx_power):
+  def __init__(self, uuid, major, minor, tx_power, session=None):
     self.company_id = 0x004C
     self.beacon_type = [0x02, 0x15]
 
-    self.uuid = self._parse_uuid(uuid) 
+    self.uuid = self._parse_uuid(uuid) if uuid is not None else None
 
-    self.major = [(major & 0xff00)>>8, (major & 0x00ff)]  
-    self.minor = [(minor & 0xff00)>>8, (minor & 0x00ff)]  
-    if tx_power < 0:
-      self.tx_power = [256+tx_power]
-    else:
-      self.tx_power = [tx_power]
-   
     self.is_advert = False
+    self.is_paused = False
+    self.session = session
+
+    # Set by the RegisterAdvertisement reply (or error), cleared before
+    # every registration
+    self.registered = threading.Event()
+
+    # major, minor and tx power are encoded by update(), which
+    # subclasses override for their own advert format
+    self.update(major, minor, tx_power)
  
     #self._setupAdvertiser()
       
@@ -190,9 +216,13 @@ class iBeaconAdvertiser():
   #  _setupAdvertiser 
   #---------------------------------------------------------------
   def _setupAdvertiser(self): 
-    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
-    bus = dbus.SystemBus()
-    adapter = self._find_adapter(bus)
+    if self.session is not None:
+      bus = self.session.bus
+      adapter = self.session.findAdapterPath(LE_ADVERTISING_MANAGER_IFACE)
+    else:
+      dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+      bus = dbus.SystemBus()
+      adapter = self._find_adapter(bus)
     if not adapter:
       self.error = "LEAdvertisingManager1 interface not found"
       return -1
@@ -205,20 +235,30 @@ class iBeaconAdvertiser():
     self.ad_manager = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, adapter),
                                 LE_ADVERTISING_MANAGER_IFACE)
 
-    self.advertiser = Advertisement(bus, 0, 'peripheral')
+    self.advertiser = Advertisement(bus, self.AD_INDEX, 'peripheral')
+
+    # Set the data before registering, a running main loop may serve
+    # BlueZ's GetAll before RegisterAdvertisement returns
+    self.advertiser.add_manufacturer_data(self.company_id, self._data())
 
-    self.mainloop = GLib.MainLoop()
+    if self.session is None:
+      self.mainloop = GLib.MainLoop()
 
+    self.registered.clear()
     self.ad_manager.RegisterAdvertisement(self.advertiser.get_path(), {},
                                      reply_handler=self._register_ad_cb,
                                      error_handler=self._register_ad_error_cb)
 
-    data = self.beacon_type + self.uuid + self.major + self.minor + self.tx_power
-    self.advertiser.add_manufacturer_data(self.company_id, data)
-
     return 0 
 
  
+  #---------------------------------------------------------------
+  #  Manufacturer data of the iBeacon advert
+  #---------------------------------------------------------------
+  def _data(self):
+    return self.beacon_type + self.uuid + self.major + self.minor + self.tx_power
+
+ 
   #---------------------------------------------------------------
   #  Parse UUID string into a list of byte value
   #---------------------------------------------------------------
@@ -231,10 +271,10 @@ class iBeaconAdvertiser():
 
  
   #---------------------------------------------------------------
-  #  Unregister callack
+  #  Register callack
   #---------------------------------------------------------------
   def _register_ad_cb(self):
-    pass
+    self.registered.set()
 
 
   #---------------------------------------------------------------
@@ -242,7 +282,9 @@ class iBeaconAdvertiser():
   #---------------------------------------------------------------
   def _register_ad_error_cb(self, error):
     self.error = "failed to register error: " + str(error)
-    self.mainloop.quit()
+    self.registered.set()
+    if self.session is None:
+      self.mainloop.quit()
 
   #---------------------------------------------------------------
   #  Find adaptor on bus 
@@ -262,10 +304,15 @@ class iBeaconAdvertiser():
   #---------------------------------------------------------------
   def stop(self):
     if self.is_advert:
-      self.mainloop.quit()
+      if self.session is None:
+        self.mainloop.quit()
       self.is_advert = False
-      self.ad_manager.UnregisterAdvertisement(self.advertiser)
+      if not self.is_paused:
+        self.ad_manager.UnregisterAdvertisement(self.advertiser)
+      self.is_paused = False
       dbus.service.Object.remove_from_connection(self.advertiser)
+      if self.session is not None:
+        self.session.release()
 
 
   #---------------------------------------------------------------
@@ -274,21 +321,89 @@ class iBeaconAdvertiser():
   def start(self):
     if self.is_advert != True:
       self.is_advert = True 
-      self._setupAdvertiser()
+      if self._setupAdvertiser() != 0:
+        self.is_advert = False
+        return
+      if self.session is not None:
+        self.session.acquire()
+        return
       self.mainloop.run()  # blocks until mainloop.quit() is called
 
 
+  #---------------------------------------------------------------
+  #  Pause advertising, the advertisement stays exported so that
+  #  resume() only has to register it again
+  #---------------------------------------------------------------
+  def pause(self):
+    if self.is_advert and not self.is_paused:
+      self.is_paused = True
+      self.ad_manager.UnregisterAdvertisement(self.advertiser)
+
+
+  #---------------------------------------------------------------
+  #  Resume advertising after pause()
+  #---------------------------------------------------------------
+  def resume(self):
+    if self.is_advert and self.is_paused:
+      self.is_paused = False
+      self.registered.clear()
+      self.ad_manager.RegisterAdvertisement(self.advertiser.get_path(), {},
+                                       reply_handler=self._register_ad_cb,
+                                       error_handler=self._register_ad_error_cb)
+
+
+  #---------------------------------------------------------------
+  #  Change major, minor and/or tx power in place
+  #---------------------------------------------------------------
+  def update(self, major=None, minor=None, tx_power=None):
+    if major is not None:
+      self.major = [(major & 0xff00)>>8, (major & 0x00ff)]
+    if minor is not None:
+      self.minor = [(minor & 0xff00)>>8, (minor & 0x00ff)]
+    if tx_power is not None:
+      self.tx_power = [tx_power & 0xff]
+
+    if self.is_advert:
+      self.advertiser.set_manufacturer_data(self.company_id, self._data())
+
+
 #---------------------------------------------------------------
-#  Main 
+#  Main: toggle and rotate an advert, print the latencies.  The
+#  toggle is timed until BlueZ replied to RegisterAdvertisement,
+#  the rotation until PropertiesChanged was emitted
 #---------------------------------------------------------------
 def main():
+  import random
+  sys.path.append('lib')
+  from BluezSession import BluezSession
+
   uuid = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
   major = 2 
   minor = 8888 
   tx_power = -59
-  advertiser = IBeaconAdvertiser(uuid, major, minor, tx_power)
+  advertiser = iBeaconAdvertiser(uuid, major, minor, tx_power, session=BluezSession())
   advertiser.start()                  
 
+  for i in range(10):
+    time.sleep(1.0)
+    start = time.perf_counter()
+    advertiser.pause()
+    advertiser.resume()
+    # RegisterAdvertisement is asynchronous, wait for BlueZ's reply
+    if not advertiser.registered.wait(timeout=5.0):
+      print("no RegisterAdvertisement reply within 5s")
+      break
+    toggle = time.perf_counter() - start
+
+    start = time.perf_counter()
+    advertiser.update(minor=random.randrange(0x10000))
+    rotate = time.perf_counter() - start
+    print(f"toggle (UnregisterAdvertisement to RegisterAdvertisement reply)="
+          f"{toggle*1000:.1f}ms "
+          f"rotate (PropertiesChanged emitted, not yet on air)={rotate*1000:.1f}ms")
+
+  advertiser.stop()
+
 
 if __name__ == '__main__':
   main()
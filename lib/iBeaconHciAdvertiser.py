@@ -0,0 +1,254 @@
+#!/usr/bin/python3
+#========================================================================
+#
+#  iBeaconHciAdvertiser.py
+#
+#  Copyright (c) 2020-2021, E-Motion, Inc.
+#
+#  This SOFTWARE PRODUCT is provided "as-is". PROVIDER  makes no
+#  representations or warranties of any kind concerning the suitability
+#  and safety of the SOFTWARE PRODUCT for any applications.  Makers of
+#  products containing the SOFTWARE are solely responsible for the
+#  suitability and safety the product.  E-Motion will not be liable
+#  for any damages one may suffer in connection with using, modifying,
+#  or distributing this SOFTWARE PRODUCT.
+#
+#========================================================================
+#
+#  iBeacon advertiser sending the LE advertising commands straight to
+#  the controller through a beacontools backend, without bluetoothd and
+#  D-Bus.  Same start/stop API as iBeaconAdvertiser.  BT 5 controllers
+#  get the extended advertising commands (one legacy PDU advertising
+#  set), older ones the legacy commands.  All command parameters are
+#  built once, start/stop/update only send them.
+#
+#  bluetoothd does not know about this advert, do not use it together
+#  with advertisements registered through LEAdvertisingManager1.
+#
+#========================================================================
+import sys
+import time
+import struct
+from importlib import import_module
+
+sys.path.append('lib')
+from beacontools.const import (OGF_LE_CTL, OGF_INFO_PARAM, OCF_READ_LOCAL_VERSION,
+                               EVT_CMD_COMPLETE, MS_FRACTION_DIVIDER,
+                               OCF_LE_SET_ADVERTISING_PARAMETERS, OCF_LE_SET_ADVERTISING_DATA,
+                               OCF_LE_SET_ADVERTISE_ENABLE, OCF_LE_SET_EXT_ADVERTISING_PARAMETERS,
+                               OCF_LE_SET_EXT_ADVERTISING_DATA, OCF_LE_SET_EXT_ADVERTISE_ENABLE)
+
+
+# HCI version of Bluetooth Core Specification 5.0
+HCI_VERSION_5_0 = 9
+
+ADV_NONCONN_IND = 0x03
+# Extended advertising event properties: legacy PDU, non-connectable, non-scannable
+EXT_ADV_LEGACY_NONCONN = 0x0010
+PUBLIC_ADDRESS = 0x00
+ALL_CHANNELS = 0x07
+LE_1M_PHY = 0x01
+NO_TX_POWER_PREFERENCE = 0x7F
+ADV_HANDLE = 0x00
+# Extended advertising data operation: complete data, fragmentation not preferred
+EXT_ADV_DATA_COMPLETE = 0x03
+EXT_ADV_NO_FRAGMENTATION = 0x01
+
+LEGACY_ADV_DATA_LEN = 31
+
+
+class iBeaconHciAdvertiser:
+
+  #========================================================================
+  #
+  #  Constructor
+  #
+  #  btDeviceId - hci device number, or whatever the backend opens
+  #  backend    - beacontools backend module (or its name), defaults to
+  #               the one of the platform
+  #  intervalMs - advertising interval in milliseconds
+  #  extended   - use the extended advertising commands, None asks the
+  #               controller for its HCI version
+  #
+  #========================================================================
+  def __init__(self, uuid, major, minor, txPower, btDeviceId=0, backend=None,
+               intervalMs=100, extended=None):
+    if backend is None:
+      backend = 'beacontools.backend'
+    self.backend = import_module(backend) if isinstance(backend, str) else backend
+    self.btDeviceId = btDeviceId
+    self.socket = None
+    self.extended = extended
+    self.isAdvertising = False
+
+    self.uuid = bytes.fromhex(uuid.replace("-", ""))
+    self.major = major
+    self.minor = minor
+    self.txPower = txPower
+    self.interval = int(round(intervalMs / MS_FRACTION_DIVIDER))
+
+    self.data = self._advertisingData()
+
+
+  #========================================================================
+  #
+  #  Start advertising, opens the device on first use
+  #
+  #========================================================================
+  def start(self):
+    if self.isAdvertising:
+      return
+
+    if self.socket is None:
+      self.socket = self.backend.open_dev(self.btDeviceId)
+      if self.extended is None:
+        self.extended = self._hciVersion() >= HCI_VERSION_5_0
+
+    self._send(self._parametersCommand())
+    self._send(self._dataCommand())
+    self._send(self._enableCommand(True))
+    self.isAdvertising = True
+
+
+  #========================================================================
+  #
+  #  Stop advertising, the device stays open for the next start
+  #
+  #========================================================================
+  def stop(self):
+    if self.isAdvertising:
+      self._send(self._enableCommand(False))
+      self.isAdvertising = False
+
+
+  #========================================================================
+  #
+  #  Pause/resume, same as stop/start: only the enable command is sent
+  #
+  #========================================================================
+  def pause(self):
+    self.stop()
+
+  def resume(self):
+    self.start()
+
+
+  #========================================================================
+  #
+  #  Change major, minor and/or tx power, a running advert is updated
+  #  in place with a single set advertising data command
+  #
+  #========================================================================
+  def update(self, major=None, minor=None, txPower=None):
+    if major is not None:
+      self.major = major
+    if minor is not None:
+      self.minor = minor
+    if txPower is not None:
+      self.txPower = txPower
+    self.data = self._advertisingData()
+
+    if self.isAdvertising:
+      self._send(self._dataCommand())
+
+
+  #========================================================================
+  #
+  #  Close the device
+  #
+  #========================================================================
+  def close(self):
+    self.stop()
+    if self.socket is not None and hasattr(self.socket, "close"):
+      self.socket.close()
+    self.socket = None
+
+
+  #========================================================================
+  #
+  #  Flags and iBeacon manufacturer data AD structures (30 bytes)
+  #
+  #========================================================================
+  def _advertisingData(self):
+    return bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) + self.uuid + \
+           struct.pack(">HHb", self.major, self.minor, self.txPower)
+
+
+  #========================================================================
+  #
+  #  HCI commands as (command field, parameters)
+  #
+  #========================================================================
+  def _parametersCommand(self):
+    if self.extended:
+      interval = self.interval.to_bytes(3, 'little')
+      return (OCF_LE_SET_EXT_ADVERTISING_PARAMETERS,
+              struct.pack("<BH", ADV_HANDLE, EXT_ADV_LEGACY_NONCONN) + interval + interval +
+              struct.pack("<BBB6sBbBBBBB", ALL_CHANNELS, PUBLIC_ADDRESS, PUBLIC_ADDRESS,
+                          bytes(6), 0x00, NO_TX_POWER_PREFERENCE, LE_1M_PHY, 0x00,
+                          LE_1M_PHY, 0x00, 0x00))
+    return (OCF_LE_SET_ADVERTISING_PARAMETERS,
+            struct.pack("<HHBBB6sBB", self.interval, self.interval, ADV_NONCONN_IND,
+                        PUBLIC_ADDRESS, PUBLIC_ADDRESS, bytes(6), ALL_CHANNELS, 0x00))
+
+  def _dataCommand(self):
+    if self.extended:
+      return (OCF_LE_SET_EXT_ADVERTISING_DATA,
+              struct.pack("<BBBB", ADV_HANDLE, EXT_ADV_DATA_COMPLETE, EXT_ADV_NO_FRAGMENTATION,
+                          len(self.data)) + self.data)
+    return (OCF_LE_SET_ADVERTISING_DATA,
+            bytes([len(self.data)]) + self.data.ljust(LEGACY_ADV_DATA_LEN, b"\x00"))
+
+  def _enableCommand(self, enable):
+    if self.extended:
+      # one set, no duration and no max number of events
+      return (OCF_LE_SET_EXT_ADVERTISE_ENABLE,
+              struct.pack("<BBBHB", enable, 1, ADV_HANDLE, 0, 0))
+    return (OCF_LE_SET_ADVERTISE_ENABLE, bytes([enable]))
+
+  def _send(self, command):
+    commandField, parameters = command
+    self.backend.send_cmd(self.socket, OGF_LE_CTL, commandField, parameters)
+
+
+  #========================================================================
+  #
+  #  HCI version of the controller, 0 if the backend can not tell
+  #
+  #========================================================================
+  def _hciVersion(self):
+    try:
+      resp = self.backend.send_req(self.socket, OGF_INFO_PARAM, OCF_READ_LOCAL_VERSION,
+                                   EVT_CMD_COMPLETE, 9, bytes(), 0)
+    except NotImplementedError:
+      return 0
+    if len(resp) < 2 or resp[0] != 0:
+      return 0
+    return resp[1]
+
+
+
+#========================================================================
+#
+#  main: advertise for 10 seconds, rotating the minor every second
+#
+#========================================================================
+def main(args):
+  btDeviceId = int(args[0]) if len(args) > 0 else 0
+  advertiser = iBeaconHciAdvertiser("2f234454-cf6d-4a0f-adf2-f4911ba9ffa6", 2, 8888, -59,
+                                    btDeviceId=btDeviceId)
+  start = time.perf_counter()
+  advertiser.start()
+  print(f"start={1000*(time.perf_counter()-start):.1f}ms extended={advertiser.extended}")
+
+  for minor in range(8889, 8899):
+    time.sleep(1.0)
+    start = time.perf_counter()
+    advertiser.update(minor=minor)
+    print(f"minor={minor} update={1000*(time.perf_counter()-start):.1f}ms")
+
+  advertiser.close()
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
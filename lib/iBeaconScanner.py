@@ -17,7 +17,7 @@
 import sys, getopt, time
 
 sys.path.append('lib')
-from beacontools import BeaconScanner, IBeaconFilter 
+from beacontools import BeaconScanner, IBeaconFilter, OverflowAreaFilter, DispatchPolicy
 
 
 class iBeaconScanner:
@@ -26,13 +26,42 @@ class iBeaconScanner:
   #
   #  Constructor
   #
+  #  btDeviceId and backend are handed to BeaconScanner, e.g. a capture 
+  #  file and beacontools.backend.replay to scan without a radio
+  #
+  #  overflowArea - also decode the overflowArea beacons of backgrounded
+  #                 iOS apps from the same HCI socket
+  #  queueSize    - if set, sightings are buffered in a queue of that size
+  #                 and callback runs on a dispatcher thread, so a slow
+  #                 callback does not stall the HCI socket
+  #  queuePolicy  - DispatchPolicy deciding what is lost when the queue
+  #                 is full, COALESCE keeps the newest sighting per beacon
+  #
   #========================================================================
-  def __init__(self, uuid, callback):
+  def __init__(self, uuid, callback, btDeviceId=0, backend=None, overflowArea=False,
+               queueSize=None, queuePolicy=DispatchPolicy.DROP_OLDEST):
     self.isScanning = False
     self.callback = callback
     self.uuid = uuid 
-    self.iBeaconScanner = BeaconScanner(self.beaconCallback, 
-        device_filter=IBeaconFilter(uuid=self.uuid) )
+    self.btDeviceId = btDeviceId
+    self.backend = backend
+    self.overflowArea = overflowArea
+    self.queueSize = queueSize
+    self.queuePolicy = queuePolicy
+    self.iBeaconScanner = self._newScanner()
+
+  #========================================================================
+  #
+  #  Create the underlying beacontools scanner
+  #
+  #========================================================================
+  def _newScanner(self):
+    deviceFilter = [IBeaconFilter(uuid=self.uuid)]
+    if self.overflowArea:
+      deviceFilter.append(OverflowAreaFilter())
+    return BeaconScanner(self.beaconCallback, bt_device_id=self.btDeviceId,
+        device_filter=deviceFilter, backend=self.backend,
+        queue_size=self.queueSize, queue_policy=self.queuePolicy)
 
   #========================================================================
   #
@@ -41,8 +70,7 @@ class iBeaconScanner:
   #========================================================================
   def start(self):
     if self.isScanning != True:
-      self.iBeaconScanner = BeaconScanner(self.beaconCallback, 
-                 device_filter=IBeaconFilter(uuid=self.uuid) )
+      self.iBeaconScanner = self._newScanner()
       self.iBeaconScanner.start()
       self.isScanning = True
  
@@ -57,11 +85,20 @@ class iBeaconScanner:
       self.isScanning = False
 
 
+  #========================================================================
+  #
+  #  Counters of the dispatch queue, None without queueSize
+  #
+  #========================================================================
+  def dispatchStats(self):
+    return self.iBeaconScanner.dispatch_stats
+
+
   #========================================================================
   #  Beacon callback
   #========================================================================
   def beaconCallback(self, scanner, beaconType, t_addr, rssi, packet, props):
-    if beaconType == "iBeacon":
+    if beaconType == "iBeacon" or beaconType == "OverflowArea":
       major = props['major']
       minor = props['minor']
       txPower = packet.tx_power
@@ -22,9 +22,11 @@ import threading
 from threading import Lock, Thread 
 
 sys.path.append('lib')
-from iBeaconAdvertiser import iBeaconAdvertiser
+from iBeaconHciAdvertiser import iBeaconHciAdvertiser
 from iBeaconScanner import iBeaconScanner
-from OverflowAreaBeaconScanner import OverflowAreaBeaconScanner
+from beacontools import DispatchPolicy
+from SightingAggregator import SightingAggregator
+from NearbyBeacons import NearbyBeacons, NearbyBeacon, NearbySnapshot
 
 
 class vBeacon:
@@ -33,9 +35,35 @@ class vBeacon:
   #
   #  Constructor
   #
+  #  aggregateWindow - if set, sightings are coalesced per beacon and at
+  #                    most one per window (seconds) is processed, with
+  #                    the mean RSSI of the window
+  #  hciOverflowArea - decode overflowArea beacons from the HCI socket of
+  #                    the iBeacon scanner instead of a D-Bus discovery
+  #  hciAdvertiser   - advertise with raw HCI commands instead of through
+  #                    bluetoothd's LEAdvertisingManager1
+  #  overflowAreaAdvertising - also advertise in the overflowArea format
+  #                    of backgrounded iOS apps
+  #  rssiHistory     - number of (time, RSSI) samples kept per nearby
+  #                    beacon (~9 bytes each), None keeps none
+  #  rssiFilter      - RssiFilter filter (EmaFilter, KalmanFilter,
+  #                    MedianFilter), each nearby beacon gets its new()
+  #  pathLoss        - path loss exponent of the distance estimate
+  #  publishDelay    - max seconds before a sighting shows up in
+  #                    getNearbyBeacons, 0 publishes on every sighting
+  #  queueSize       - size of the queue between the HCI socket and the
+  #                    sighting processing, None processes sightings on
+  #                    the receiving thread
+  #  queuePolicy     - what is lost when the queue is full, by default
+  #                    older queued sightings of the same beacon
+  #
   #========================================================================
   def __init__(self, uuid, major, minor, txPower, 
-                                  callback=None, expiration=10):
+                                  callback=None, expiration=10, aggregateWindow=None,
+                                  hciOverflowArea=False, hciAdvertiser=False,
+                                  overflowAreaAdvertising=False, rssiHistory=64,
+                                  rssiFilter=None, pathLoss=2.0, publishDelay=0.1,
+                                  queueSize=256, queuePolicy=DispatchPolicy.COALESCE):
     self.isScanning = False
     self.isAdvertising = False
 
@@ -45,13 +73,49 @@ class vBeacon:
     self.txPower = txPower
     self.callback = callback
     self.expiration = expiration
+    self.rssiHistory = rssiHistory
+    self.rssiFilter = rssiFilter
+    self.pathLoss = pathLoss
+
+    if aggregateWindow is not None:
+      self.aggregator = SightingAggregator(self._sightingCallback, aggregateWindow)
+      iBeaconCallback = self.aggregator.add
+      overflowAreaBeaconCallback = self.aggregator.add
+    else:
+      self.aggregator = None
+      iBeaconCallback = self._iBeaconCallback
+      overflowAreaBeaconCallback = self._overflowAreaBeaconCallback
  
-    self.iBeaconScanner = iBeaconScanner(self.uuid, self._iBeaconCallback) 
-    self.overflowAreaBeaconScanner = OverflowAreaBeaconScanner(self._overflowAreaBeaconCallback) 
-    self.iBeaconAdvertiser = iBeaconAdvertiser(self.uuid, self.major, self.minor, self.txPower)
-
-    self.nearbyBeacons = {}
-    self.lock = Lock() 
+    # One bus connection and main loop thread for the D-Bus components,
+    # created by the first of them.  The D-Bus modules are only imported
+    # when used, so HCI only setups do not need the dbus bindings
+    self.session = None
+
+    if hciOverflowArea:
+      self.iBeaconScanner = iBeaconScanner(self.uuid, iBeaconCallback, overflowArea=True,
+                                           queueSize=queueSize, queuePolicy=queuePolicy)
+      self.overflowAreaBeaconScanner = None
+    else:
+      from OverflowAreaBeaconScanner import OverflowAreaBeaconScanner
+      self.iBeaconScanner = iBeaconScanner(self.uuid, iBeaconCallback,
+                                           queueSize=queueSize, queuePolicy=queuePolicy)
+      self.overflowAreaBeaconScanner = OverflowAreaBeaconScanner(overflowAreaBeaconCallback,
+                                                                 session=self._bluezSession()) 
+    if hciAdvertiser:
+      self.iBeaconAdvertiser = iBeaconHciAdvertiser(self.uuid, self.major, self.minor, self.txPower)
+    else:
+      from iBeaconAdvertiser import iBeaconAdvertiser
+      self.iBeaconAdvertiser = iBeaconAdvertiser(self.uuid, self.major, self.minor, self.txPower,
+                                                 session=self._bluezSession())
+    if overflowAreaAdvertising:
+      from OverflowAreaAdvertiser import OverflowAreaAdvertiser
+      self.overflowAreaAdvertiser = OverflowAreaAdvertiser(self.major, self.minor, self.txPower,
+                                                           session=self._bluezSession())
+    else:
+      self.overflowAreaAdvertiser = None
+
+    # Written by the scanner callbacks, read through its snapshot
+    self.nearby = NearbyBeacons(expiration, publishDelay, rssiHistory, rssiFilter, pathLoss)
 
 
   #========================================================================
@@ -61,8 +125,7 @@ class vBeacon:
   #========================================================================
   def startScanning(self):
     if self.isScanning != True:
-      self.scanningThread = Thread(target=self._startScanning)
-      self.scanningThread.start()
+      self._startScanning()
       self.isScanning = True
 
 
@@ -73,8 +136,7 @@ class vBeacon:
   #========================================================================
   def startAdvertising(self):
     if self.isAdvertising != True:
-      self.advertisingThread = Thread(target=self._startAdvertising)
-      self.advertisingThread.start()
+      self._startAdvertising()
       self.isAdvertising = True
 
   #========================================================================
@@ -85,8 +147,8 @@ class vBeacon:
   def stopScanning(self):
     if self.isScanning:
       self.iBeaconScanner.stop()
-      self.overflowAreaBeaconScanner.stop()
-      self.scanningThread.join()  
+      if self.overflowAreaBeaconScanner is not None:
+        self.overflowAreaBeaconScanner.stop()
       self.isScanning = False
 
 
@@ -98,27 +160,103 @@ class vBeacon:
   def stopAdvertising(self):
     if self.isAdvertising:
       self.iBeaconAdvertiser.stop()
-      self.advertisingThread.join()  
+      if self.overflowAreaAdvertiser is not None:
+        self.overflowAreaAdvertiser.stop()
       self.isAdvertising = False
     
   #========================================================================
   #
-  #  Return a list of nearby beacons
+  #  Pause advertising without tearing the advertisement down
   #
   #========================================================================
-  def getNearbyBeacons(self): 
-    beacons = [] 
+  def pauseAdvertising(self):
+    if self.isAdvertising:
+      self.iBeaconAdvertiser.pause()
+      if self.overflowAreaAdvertiser is not None:
+        self.overflowAreaAdvertiser.pause()
+
+
+  #========================================================================
+  #
+  #  Resume advertising after pauseAdvertising (or start it)
+  #
+  #========================================================================
+  def resumeAdvertising(self):
+    if self.isAdvertising:
+      self.iBeaconAdvertiser.resume()
+      if self.overflowAreaAdvertiser is not None:
+        self.overflowAreaAdvertiser.resume()
+    else:
+      self.startAdvertising()
+
+
+  #========================================================================
+  #
+  #  Change the advertised major/minor in place
+  #
+  #========================================================================
+  def setIdentity(self, major, minor):
+    self.major = major
+    self.minor = minor
+    self.iBeaconAdvertiser.update(major, minor)
+    if self.overflowAreaAdvertiser is not None:
+      self.overflowAreaAdvertiser.update(major, minor)
 
-    self.lock.acquire()
 
-    for beacon in self.nearbyBeacons.values():
-      beacons.append(beacon)
+  #========================================================================
+  #
+  #  Return a tuple of nearby beacons (NearbyBeacon records)
+  #
+  #========================================================================
+  def getNearbyBeacons(self): 
+    return self.nearby.snapshot.beacons
 
-    self.lock.release()
 
-    return beacons 
+  #========================================================================
+  #
+  #  Return the current NearbySnapshot
+  #
+  #  The scanner callbacks publish a new snapshot after every change
+  #  (within publishDelay), reading it never locks or waits
+  #
+  #========================================================================
+  def getNearbySnapshot(self):
+    return self.nearby.snapshot
   
 
+  #========================================================================
+  #
+  #  Return a copy of the RSSI history of a nearby beacon, None if the
+  #  beacon is not nearby or no history is kept
+  #
+  #========================================================================
+  def getRssiHistory(self, major, minor):
+    return self.nearby.getRssiHistory(major, minor)
+
+
+  #========================================================================
+  #
+  #  Run rssiFilter (the vBeacon one if None) over the RSSI histories
+  #  of all nearby beacons at once with NumPy
+  #  Returns {(major, minor): (filteredRssi, distance)}
+  #
+  #========================================================================
+  def recomputeNearby(self, rssiFilter=None):
+    return self.nearby.recompute(rssiFilter)
+
+
+  #========================================================================
+  #
+  #  Shared BluezSession of the D-Bus components, created on first use
+  #
+  #========================================================================
+  def _bluezSession(self):
+    if self.session is None:
+      from BluezSession import BluezSession
+      self.session = BluezSession()
+    return self.session
+
+
   #========================================================================
   #
   #  Start VBeacon advertisement
@@ -126,6 +264,8 @@ class vBeacon:
   #========================================================================
   def _startAdvertising(self):
     self.iBeaconAdvertiser.start()
+    if self.overflowAreaAdvertiser is not None:
+      self.overflowAreaAdvertiser.start()
 
 
   #========================================================================
@@ -135,7 +275,8 @@ class vBeacon:
   #========================================================================
   def _startScanning(self):
     self.iBeaconScanner.start() 
-    self.overflowAreaBeaconScanner.start() 
+    if self.overflowAreaBeaconScanner is not None:
+      self.overflowAreaBeaconScanner.start() 
 
   #========================================================================
   #
@@ -143,30 +284,7 @@ class vBeacon:
   #
   #========================================================================
   def _updateNearbyBeacons(self, major, minor, txPower, rssi):
-
-    id = str(major)+"-"+str(minor)
-
-    self.lock.acquire()
-    self.nearbyBeacons[id] = { 
-      "date":    datetime.datetime.utcnow(),
-      "major":   major,
-      "minor":   minor,
-      "txPower": txPower,
-      "rssi":    rssi
-    }
-
-    removeId = []
-    for id in self.nearbyBeacons.keys(): 
-      beacon = self.nearbyBeacons[id]
-      diff = datetime.datetime.utcnow() - beacon["date"]
-      if diff.seconds > self.expiration:
-        removeId.append(id)
-    
-    for id in removeId:
-      #print(f"Deleting ${self.nearbyBeacons[id]}")
-      del(self.nearbyBeacons[id])
-
-    self.lock.release()
+    self.nearby.update(major, minor, txPower, rssi)
 
  
   #========================================================================
@@ -189,6 +307,17 @@ class vBeacon:
     if self.callback != None:
       self.callback(major, minor, txPower, rssi) 
 
+  #========================================================================
+  #
+  #  Aggregated sighting callback
+  #
+  #========================================================================
+  def _sightingCallback(self, sighting):
+    rssi = round(sighting.rssiMean)
+    self._updateNearbyBeacons(sighting.major, sighting.minor, sighting.txPower, rssi)
+    if self.callback != None:
+      self.callback(sighting.major, sighting.minor, sighting.txPower, rssi) 
+
 
 
 #========================================================================
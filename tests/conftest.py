@@ -0,0 +1,5 @@
+"""Make the modules in lib importable the way the apps import them."""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib"))
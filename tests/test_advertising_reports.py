@@ -0,0 +1,133 @@
+"""Tests for the iteration over the reports of batched LE advertising events."""
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import BeaconScanner, IBeaconFilter
+from beacontools.const import LE_META_EVENT, EVT_LE_ADVERTISING_REPORT, EVT_LE_EXT_ADVERTISING_REPORT
+from beacontools.utils import iter_advertising_reports
+
+HCI_EVENT_PKT = 0x04
+UUID = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+
+# (address as sent, rssi, advertising data)
+REPORTS = [
+    (bytes([1, 2, 3, 4, 5, 6]), -40, b""),
+    (bytes([7, 8, 9, 10, 11, 12]), -100, bytes(range(5))),
+    (bytes([13, 14, 15, 16, 17, 18]), 20, bytes(range(100, 131))),
+]
+
+
+def legacy_report(address, rssi, data):
+    """One LE advertising report: event type, address type, address, data, rssi."""
+    return bytes([0x03, 0x01]) + address + bytes([len(data)]) + data + bytes([rssi & 0xff])
+
+
+def ext_report(address, rssi, data):
+    """One LE extended advertising report with a 24 byte header."""
+    header = bytearray(24)
+    header[0:2] = (0x0010).to_bytes(2, 'little')
+    header[2] = 0x01
+    header[3:9] = address
+    header[9] = 0x01
+    header[12] = 0x7f
+    header[13] = rssi & 0xff
+    header[23] = len(data)
+    return bytes(header) + data
+
+
+def event(subevent, reports, num_reports=None):
+    """H4 LE meta event holding the given encoded reports."""
+    if num_reports is None:
+        num_reports = len(reports)
+    params = bytes([subevent, num_reports]) + b"".join(reports)
+    return bytes([HCI_EVENT_PKT, LE_META_EVENT, len(params) & 0xff]) + params
+
+
+def decoded(pkt):
+    """The reports of pkt as (address, rssi, data) with bytes instead of memoryviews."""
+    return [(bytes(address), rssi, bytes(data)) for address, rssi, data in iter_advertising_reports(pkt)]
+
+
+def test_multi_report_legacy_event():
+    """Every report of a legacy event is returned with its own data length and rssi."""
+    pkt = event(EVT_LE_ADVERTISING_REPORT, [legacy_report(*report) for report in REPORTS])
+    assert decoded(pkt) == REPORTS
+
+
+def test_extended_reports():
+    """Extended reports take the address at 3, the rssi at 13 and the data length at 23."""
+    pkt = event(EVT_LE_EXT_ADVERTISING_REPORT, [ext_report(*report) for report in REPORTS])
+    assert decoded(pkt) == REPORTS
+
+
+def test_slices_are_views():
+    """Address and data are slices of the packet, not copies."""
+    pkt = bytearray(event(EVT_LE_ADVERTISING_REPORT, [legacy_report(*REPORTS[1])]))
+    address, _, data = next(iter_advertising_reports(pkt))
+    pkt[5 + 2] = 0xee
+    pkt[5 + 9] = 0xdd
+    assert address[0] == 0xee and data[0] == 0xdd
+
+
+@pytest.mark.parametrize("subevent, encode", [(EVT_LE_ADVERTISING_REPORT, legacy_report),
+                                              (EVT_LE_EXT_ADVERTISING_REPORT, ext_report)])
+def test_truncated_event(subevent, encode):
+    """A cut event yields the reports it fully holds and stops."""
+    reports = [encode(*report) for report in REPORTS]
+    pkt = event(subevent, reports)
+    ends = []
+    pos = 5
+    for report in reports:
+        pos += len(report)
+        ends.append(pos)
+
+    for cut in range(len(pkt) + 1):
+        complete = sum(1 for end in ends if end <= cut)
+        assert decoded(pkt[:cut]) == REPORTS[:complete], cut
+
+
+@pytest.mark.parametrize("subevent, encode, length_offset",
+                         [(EVT_LE_ADVERTISING_REPORT, legacy_report, 8),
+                          (EVT_LE_EXT_ADVERTISING_REPORT, ext_report, 23)])
+def test_oversized_data_length(subevent, encode, length_offset):
+    """A data length running past the event stops the iteration at that report."""
+    reports = [encode(*report) for report in REPORTS]
+    broken = bytearray(reports[1])
+    broken[length_offset] = 0xff
+    pkt = event(subevent, [reports[0], bytes(broken), reports[2]])
+    assert decoded(pkt) == REPORTS[:1]
+
+
+@pytest.mark.parametrize("subevent, encode", [(EVT_LE_ADVERTISING_REPORT, legacy_report),
+                                              (EVT_LE_EXT_ADVERTISING_REPORT, ext_report)])
+def test_report_count(subevent, encode):
+    """More reports announced than sent stops cleanly, fewer ignores the rest."""
+    reports = [encode(*report) for report in REPORTS]
+    assert decoded(event(subevent, reports, num_reports=10)) == REPORTS
+    assert decoded(event(subevent, reports, num_reports=2)) == REPORTS[:2]
+    assert decoded(event(subevent, reports, num_reports=0)) == []
+
+
+def test_short_packets():
+    """Packets without a report count yield nothing."""
+    for pkt in (b"", bytes([HCI_EVENT_PKT]), bytes([HCI_EVENT_PKT, LE_META_EVENT, 1, 2])):
+        assert decoded(pkt) == []
+
+
+def test_scanner_sees_every_report():
+    """The monitor calls back once per report of a batched event."""
+    ibeacon = bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) + \
+        bytes.fromhex(UUID.replace("-", "")) + bytes([0x00, 0x01, 0x00, 0x02, 0xc5])
+    seen = []
+
+    def callback(_scanner, _beacon_type, bt_addr, rssi, _packet, _properties):
+        seen.append((bt_addr, rssi))
+
+    scanner = BeaconScanner(callback, device_filter=IBeaconFilter(uuid=UUID))
+    pkt = event(EVT_LE_ADVERTISING_REPORT, [legacy_report(address, rssi, ibeacon)
+                                            for address, rssi, _ in REPORTS])
+    scanner._mon.handle_event(pkt)  # pylint: disable=protected-access
+    assert seen == [("06:05:04:03:02:01", -40), ("0c:0b:0a:09:08:07", -100),
+                    ("12:11:10:0f:0e:0d", 20)]
@@ -0,0 +1,182 @@
+"""Tests for the asyncio scanner."""
+import asyncio
+import errno
+import os
+
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import AsyncBeaconScanner, BtAddrFilter
+from beacontools.backend import replay
+from beacontools.scanner import would_block
+from test_replay_backend import IBEACON, advertising_event, write_capture
+
+ADDRESS = "01:02:03:04:05:06"
+
+
+class BluezError(Exception):
+    """Stand-in for pybluez' _bluetooth.error, which is not an OSError."""
+
+
+class PipeSocket(object):
+    """HCI socket stand-in with a real file descriptor, recv returns or raises results in order."""
+
+    def __init__(self, results):
+        self.read_fd, self.write_fd = os.pipe()
+        self.results = list(results)
+        self.closed = False
+        self.blocking = True
+
+    def fileno(self):
+        return self.read_fd
+
+    def setblocking(self, blocking):
+        self.blocking = blocking
+
+    def readable(self):
+        """Make the descriptor readable once per pending result."""
+        os.write(self.write_fd, bytes(len(self.results)))
+
+    def recv(self, _bufsize):
+        os.read(self.read_fd, 1)
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+
+
+class FakeBackend(object):
+    """Backend handing out the socket passed as bt_device_id and recording commands."""
+
+    def __init__(self):
+        self.commands = []
+
+    @staticmethod
+    def open_dev(socket):
+        return socket
+
+    def send_cmd(self, _socket, group_field, command_field, data):
+        self.commands.append((group_field, command_field, bytes(data)))
+
+    @staticmethod
+    def send_req(*_args):
+        raise NotImplementedError
+
+
+async def collect(scanner):
+    """All advertisements until the end of the iteration."""
+    return [item async for item in scanner]
+
+
+def test_iterate_replay(tmp_path):
+    """Iterating over a replayed capture yields its advertisements, then ends."""
+    path = str(tmp_path / "capture.btsnoop")
+    write_capture(path, [advertising_event(IBEACON, rssi) for rssi in (-50, -60, -70)])
+    sock = replay.ReplaySocket(path)
+
+    async def scan():
+        async with AsyncBeaconScanner(bt_device_id=sock, backend=replay,
+                                      device_filter=BtAddrFilter(ADDRESS)) as scanner:
+            return await collect(scanner)
+
+    items = asyncio.run(asyncio.wait_for(scan(), 5))
+    assert [(bt_addr, rssi) for bt_addr, rssi, _, _ in items] == \
+        [(ADDRESS, -50), (ADDRESS, -60), (ADDRESS, -70)]
+    assert items[0][3]['major'] == 2
+
+
+def test_stop_replay_early(tmp_path):
+    """stop() ends the iteration of a socket without file descriptor before its end."""
+    path = str(tmp_path / "capture.btsnoop")
+    write_capture(path, [advertising_event(IBEACON)] * 1000)
+    sock = replay.ReplaySocket(path)
+
+    async def scan():
+        scanner = AsyncBeaconScanner(bt_device_id=sock, backend=replay, queue_size=4,
+                                     device_filter=BtAddrFilter(ADDRESS))
+        await scanner.start()
+        first = await scanner.__anext__()
+        await scanner.stop()
+        rest = await collect(scanner)
+        return first, rest, scanner.dropped
+
+    first, rest, dropped = asyncio.run(asyncio.wait_for(scan(), 5))
+    assert first[0] == ADDRESS
+    # what was queued when stop() was called, the rest of the capture is not read
+    assert len(rest) + dropped <= sock.packets - 1
+    assert sock.packets < 1000
+
+
+def test_iterate_crowd_simulator():
+    """The crowd simulator drives the scanner through the executor like a replay."""
+    from CrowdSimulator import CrowdSimulator
+    from beacontools import IBeaconFilter, OverflowAreaFilter
+
+    uuid = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+    simulator = CrowdSimulator(uuid, iBeacons=5, overflowBeacons=5, maxAdverts=100, seed=1)
+
+    async def scan():
+        async with AsyncBeaconScanner(backend=simulator, queue_size=200,
+                                      device_filter=[IBeaconFilter(uuid=uuid),
+                                                     OverflowAreaFilter()]) as scanner:
+            return await collect(scanner)
+
+    items = asyncio.run(asyncio.wait_for(scan(), 5))
+    assert len(items) == 100
+    assert {type(packet).__name__ for _, _, packet, _ in items} == \
+        {"IBeaconAdvertisement", "OverflowAreaAdvertisement"}
+
+
+def test_iterate_before_start():
+    """Iterating before start() raises a RuntimeError, not an AttributeError."""
+    scanner = AsyncBeaconScanner(backend=replay)
+
+    async def scan():
+        return await collect(scanner)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(scan())
+
+
+def test_would_block():
+    """EAGAIN is recognized whatever the error type carrying it."""
+    assert would_block(BlockingIOError())
+    assert would_block(InterruptedError())
+    assert would_block(BluezError(errno.EAGAIN, "Resource temporarily unavailable"))
+    assert would_block(OSError(errno.EWOULDBLOCK, "Resource temporarily unavailable"))
+    assert not would_block(BluezError(errno.EIO, "Input/output error"))
+    assert not would_block(BluezError("no errno"))
+    assert not would_block(BluezError())
+
+
+def test_reader_errors():
+    """EAGAIN of a pybluez socket is skipped, another error ends the iteration with it."""
+    error = BluezError(errno.ENODEV, "No such device")
+    sock = PipeSocket([BluezError(errno.EAGAIN, "Resource temporarily unavailable"),
+                       advertising_event(IBEACON, -55), error])
+    backend = FakeBackend()
+
+    async def scan():
+        scanner = AsyncBeaconScanner(bt_device_id=sock, backend=backend,
+                                     device_filter=BtAddrFilter(ADDRESS))
+        await scanner.start()
+        sock.readable()
+        items = []
+        with pytest.raises(BluezError) as raised:
+            async for item in scanner:
+                items.append(item)
+        await scanner.stop()
+        return items, raised.value
+
+    items, raised = asyncio.run(asyncio.wait_for(scan(), 5))
+    assert [(bt_addr, rssi) for bt_addr, rssi, _, _ in items] == [(ADDRESS, -55)]
+    assert raised is error
+    assert not sock.blocking and sock.closed
@@ -0,0 +1,110 @@
+"""Tests for the pruning of stale BlueZ devices against a stand-in ObjectManager."""
+import pytest
+
+dbus = pytest.importorskip("dbus")
+pytest.importorskip("gi")
+
+from BluezDevicePruner import BluezDevicePruner
+
+ADAPTER = "/org/bluez/hci0"
+
+
+def device_path(number, adapter=ADAPTER):
+    """Object path of a device below adapter."""
+    return "{}/dev_00_00_00_00_00_{:02X}".format(adapter, number)
+
+
+class FakeObjectManager:
+    """org.freedesktop.DBus.ObjectManager of bluetoothd, objects maps path -> interfaces."""
+
+    def __init__(self, objects):
+        self.objects = objects
+
+    def GetManagedObjects(self):  # pylint: disable=invalid-name
+        return self.objects
+
+
+class FakeAdapter:
+    """org.bluez.Adapter1 that records RemoveDevice calls and drops the devices."""
+
+    object_path = ADAPTER
+
+    def __init__(self, object_manager, failing=()):
+        self.object_manager = object_manager
+        self.failing = set(failing)
+        self.removed = []
+
+    def RemoveDevice(self, path):  # pylint: disable=invalid-name
+        if str(path) in self.failing:
+            raise dbus.exceptions.DBusException("org.bluez.Error.DoesNotExist")
+        self.removed.append(str(path))
+        del self.object_manager.objects[str(path)]
+
+
+def objects(**devices):
+    """Managed objects with the adapter and one Device1 per keyword (path number -> properties)."""
+    result = {ADAPTER: {"org.bluez.Adapter1": {}}}
+    for name, properties in devices.items():
+        result[device_path(int(name[1:]))] = {"org.bluez.Device1": properties}
+    return result
+
+
+def make_pruner(managed, **kwargs):
+    """A pruner over managed, its object manager and adapter."""
+    object_manager = FakeObjectManager(managed)
+    adapter = FakeAdapter(object_manager, kwargs.pop("failing", ()))
+    return BluezDevicePruner(object_manager, adapter, **kwargs), object_manager, adapter
+
+
+def test_skips_paired_trusted_connected():
+    """Only stale devices that are neither paired, trusted nor connected are removed."""
+    managed = objects(d1={}, d2={'Paired': True}, d3={'Trusted': True},
+                      d4={'Connected': True}, d5={'Paired': False, 'Trusted': False,
+                                                  'Connected': False})
+    # a device of another adapter is never touched
+    managed[device_path(6, "/org/bluez/hci1")] = {"org.bluez.Device1": {}}
+    removed_paths = []
+    pruner, _, adapter = make_pruner(managed, window=10, lastSeen=lambda path: 0.0,
+                                     onRemoved=removed_paths.append)
+
+    assert pruner.prune(now=100.0) == 2
+    assert sorted(adapter.removed) == [device_path(1), device_path(5)]
+    assert sorted(removed_paths) == sorted(adapter.removed)
+    assert device_path(2) in managed and device_path(3) in managed and device_path(4) in managed
+    assert pruner.stats()["removed"] == 2
+
+
+def test_window_and_first_seen():
+    """Devices are kept for window seconds, timed from the first run without lastSeen."""
+    managed = objects(d1={}, d2={})
+    seen = {device_path(1): 95.0}
+    pruner, _, adapter = make_pruner(managed, window=10, lastSeen=seen.get)
+
+    assert pruner.prune(now=100.0) == 0
+    assert pruner.prune(now=106.0) == 1
+    assert adapter.removed == [device_path(1)]
+    assert pruner.prune(now=111.0) == 1
+    assert adapter.removed == [device_path(1), device_path(2)]
+    assert pruner.firstSeen == {}
+
+
+def test_max_removals_oldest_first():
+    """At most maxRemovals devices go per run, the ones unseen longest first."""
+    managed = objects(d1={}, d2={}, d3={})
+    seen = {device_path(1): 30.0, device_path(2): 10.0, device_path(3): 20.0}
+    pruner, _, adapter = make_pruner(managed, window=10, maxRemovals=2, lastSeen=seen.get)
+
+    assert pruner.prune(now=100.0) == 2
+    assert adapter.removed == [device_path(2), device_path(3)]
+    assert pruner.deferred == 1
+
+
+def test_remove_failure_counted():
+    """A failing RemoveDevice is counted and does not stop the run."""
+    managed = objects(d1={}, d2={})
+    pruner, _, adapter = make_pruner(managed, window=10, lastSeen=lambda path: 0.0,
+                                     failing=[device_path(1)])
+
+    assert pruner.prune(now=100.0) == 1
+    assert adapter.removed == [device_path(2)]
+    assert pruner.failures == 1
@@ -0,0 +1,30 @@
+"""Tests for the device table of the D-Bus scanners."""
+from DeviceTable import DeviceTable, APPLE_COMPANY_ID
+
+PATH = "/org/bluez/hci0/dev_01_02_03_04_05_06"
+APPLE_DATA = {APPLE_COMPANY_ID: [0x01] + [0] * 16}
+
+
+def test_complete_once_manufacturer_data_seen():
+    """Only a record that saw ManufacturerData or all properties is complete."""
+    table = DeviceTable(ttl=None, maxSize=None)
+    assert not table.update(PATH, {'RSSI': -60}).complete
+    assert table.update(PATH, {'ManufacturerData': APPLE_DATA}).complete
+
+    other = "/org/bluez/hci0/dev_0A_0B_0C_0D_0E_0F"
+    record = table.update(other, {'Address': "0A:0B:0C:0D:0E:0F", 'RSSI': -70}, complete=True)
+    assert record.complete and record.manufacturerData is None
+
+
+def test_evicted_record_starts_incomplete():
+    """After a TTL eviction an RSSI only update yields a record without the payload."""
+    table = DeviceTable(ttl=1.0, maxSize=None)
+    record = table.update(PATH, {'RSSI': -60, 'ManufacturerData': APPLE_DATA}, now=0.0)
+    record.decoded = True
+
+    table.expire(now=2.0)
+    assert PATH not in table and table.evictions == 1
+
+    record = table.update(PATH, {'RSSI': -61}, now=2.0)
+    assert record.rssi == -61
+    assert not record.complete and not record.decoded
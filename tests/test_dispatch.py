@@ -0,0 +1,210 @@
+"""Tests for the bounded dispatch buffer between reception and callbacks."""
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import BeaconScanner, IBeaconFilter, DispatchPolicy
+from beacontools.dispatch import Dispatcher
+
+UUID = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+
+
+class BlockedCallback:
+    """Callback that records its calls and blocks in the first one until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        self.entered.set()
+        assert self.gate.wait(5)
+
+
+def blocked_dispatcher(policy, size=3):
+    """A started dispatcher whose single worker is stuck in the callback of item 0."""
+    callback = BlockedCallback()
+    dispatcher = Dispatcher(callback, size=size, policy=policy)
+    dispatcher.start()
+    dispatcher.put("first", ("first", 0))
+    assert callback.entered.wait(5)
+    return dispatcher, callback
+
+
+def wait_until(condition):
+    """Poll condition for up to 5 seconds."""
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_arguments_checked():
+    """The buffer needs a slot and a worker."""
+    with pytest.raises(ValueError):
+        Dispatcher(print, size=0)
+    with pytest.raises(ValueError):
+        Dispatcher(print, workers=0)
+
+
+def test_drop_oldest():
+    """A full buffer loses its oldest items."""
+    dispatcher, callback = blocked_dispatcher(DispatchPolicy.DROP_OLDEST)
+    for i in range(1, 6):
+        dispatcher.put("key{}".format(i), ("key", i))
+    assert dispatcher.depth == 3
+
+    callback.gate.set()
+    dispatcher.stop()
+    assert [args[1] for args in callback.calls] == [0, 3, 4, 5]
+    assert dispatcher.stats() == {'received': 6, 'dispatched': 4, 'dropped': 2,
+                                  'coalesced': 0, 'depth': 0, 'max_depth': 3}
+
+
+def test_drop_newest():
+    """A full buffer loses the items put while it is full."""
+    dispatcher, callback = blocked_dispatcher(DispatchPolicy.DROP_NEWEST)
+    for i in range(1, 6):
+        dispatcher.put("key{}".format(i), ("key", i))
+
+    callback.gate.set()
+    dispatcher.stop()
+    assert [args[1] for args in callback.calls] == [0, 1, 2, 3]
+    stats = dispatcher.stats()
+    assert (stats['received'], stats['dispatched'], stats['dropped']) == (6, 4, 2)
+
+
+def test_coalesce():
+    """Queued items of the same key are replaced in place, a full buffer drops the oldest."""
+    dispatcher, callback = blocked_dispatcher(DispatchPolicy.COALESCE)
+    for key, value in [("a", 1), ("b", 2), ("a", 3), ("c", 4), ("d", 5), ("b", 6)]:
+        dispatcher.put(key, (key, value))
+    # a3 was dropped as the oldest to make room for d5, b6 replaced b2
+    assert dispatcher.depth == 3
+
+    callback.gate.set()
+    dispatcher.stop()
+    assert callback.calls == [("first", 0), ("b", 6), ("c", 4), ("d", 5)]
+    stats = dispatcher.stats()
+    assert (stats['received'], stats['dispatched'], stats['dropped'], stats['coalesced']) == \
+        (7, 4, 1, 2)
+
+
+def test_coalesce_after_dispatch():
+    """An item already handed to the callback is not replaced, the next one is queued."""
+    dispatcher, callback = blocked_dispatcher(DispatchPolicy.COALESCE)
+    dispatcher.put("first", ("first", 1))
+    assert dispatcher.depth == 1 and dispatcher.coalesced == 0
+
+    callback.gate.set()
+    dispatcher.stop()
+    assert callback.calls == [("first", 0), ("first", 1)]
+
+
+def test_stop_drains_by_default():
+    """stop() dispatches what is queued before the workers exit."""
+    dispatcher, callback = blocked_dispatcher(DispatchPolicy.DROP_OLDEST, size=8)
+    for i in range(1, 5):
+        dispatcher.put(i, ("key", i))
+
+    stopper = threading.Thread(target=dispatcher.stop)
+    stopper.start()
+    callback.gate.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    assert [args[1] for args in callback.calls] == [0, 1, 2, 3, 4]
+    assert dispatcher.dropped == 0
+
+
+def test_stop_without_drain():
+    """stop(drain=False) drops the queued items and counts them."""
+    dispatcher, callback = blocked_dispatcher(DispatchPolicy.DROP_OLDEST, size=8)
+    for i in range(1, 5):
+        dispatcher.put(i, ("key", i))
+
+    stopper = threading.Thread(target=dispatcher.stop, kwargs={'drain': False})
+    stopper.start()
+    wait_until(lambda: dispatcher.depth == 0)
+    callback.gate.set()
+    stopper.join(5)
+    assert not stopper.is_alive()
+    assert callback.calls == [("first", 0)]
+    assert dispatcher.stats()['dropped'] == 4
+    assert dispatcher.stats()['dispatched'] == 1
+
+
+def test_callback_exception_does_not_stop_worker():
+    """A failing callback is logged and the following items are still dispatched."""
+    calls = []
+
+    def callback(value):
+        calls.append(value)
+        if value == 1:
+            raise RuntimeError("callback failed")
+
+    dispatcher = Dispatcher(callback, size=8)
+    dispatcher.start()
+    for i in range(3):
+        dispatcher.put(i, (i,))
+    dispatcher.stop()
+    assert calls == [0, 1, 2]
+
+
+def ibeacon_report(minor):
+    """Advertising data of an iBeacon with major 1."""
+    return bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) + \
+        bytes.fromhex(UUID.replace("-", "")) + bytes([0x00, 0x01, 0x00, minor, 0xc5])
+
+
+def test_scanner_coalesces_per_address():
+    """A slow scanner callback gets the newest sighting of each address, recv is not stalled."""
+    callback = BlockedCallback()
+    scanner = BeaconScanner(callback, device_filter=IBeaconFilter(uuid=UUID), queue_size=4,
+                            queue_policy=DispatchPolicy.COALESCE)
+    # pylint: disable=protected-access
+    monitor = scanner._mon
+    monitor.dispatcher.start()
+
+    first, second = bytes([1, 0, 0, 0, 0, 0]), bytes([2, 0, 0, 0, 0, 0])
+    monitor.process_report(first, -60, ibeacon_report(0))
+    assert callback.entered.wait(5)
+    start = time.monotonic()
+    for minor in range(1, 50):
+        monitor.process_report(first if minor % 2 else second, -60, ibeacon_report(minor))
+    # the receive side never waits for the blocked callback
+    assert time.monotonic() - start < 1
+
+    callback.gate.set()
+    monitor.dispatcher.stop()
+    minors = [(args[2], args[5]['minor']) for args in callback.calls]
+    assert minors == [("00:00:00:00:00:01", 0), ("00:00:00:00:00:01", 49),
+                      ("00:00:00:00:00:02", 48)]
+    assert scanner.dispatch_stats['coalesced'] == 47
+
+
+def test_ibeacon_scanner_and_vbeacon_pass_queue_options():
+    """iBeaconScanner hands its queue options to BeaconScanner, vBeacon queues by default."""
+    from iBeaconScanner import iBeaconScanner
+    from vBeacon import vBeacon
+
+    scanner = iBeaconScanner(UUID, print)
+    assert scanner.iBeaconScanner._mon.dispatcher is None  # pylint: disable=protected-access
+    assert scanner.dispatchStats() is None
+
+    scanner = iBeaconScanner(UUID, print, queueSize=16, queuePolicy=DispatchPolicy.DROP_NEWEST)
+    dispatcher = scanner.iBeaconScanner._mon.dispatcher  # pylint: disable=protected-access
+    assert (dispatcher.size, dispatcher.policy) == (16, DispatchPolicy.DROP_NEWEST)
+    assert scanner.dispatchStats()['received'] == 0
+
+    vbeacon = vBeacon(UUID, 2, 8888, -59, hciOverflowArea=True, hciAdvertiser=True)
+    dispatcher = vbeacon.iBeaconScanner.iBeaconScanner._mon.dispatcher  # pylint: disable=protected-access
+    assert (dispatcher.size, dispatcher.policy) == (256, DispatchPolicy.COALESCE)
+
+    vbeacon = vBeacon(UUID, 2, 8888, -59, hciOverflowArea=True, hciAdvertiser=True, queueSize=None)
+    assert vbeacon.iBeaconScanner.iBeaconScanner._mon.dispatcher is None  # pylint: disable=protected-access
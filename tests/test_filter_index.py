@@ -0,0 +1,153 @@
+"""Tests for the device filter index."""
+import random
+
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import BeaconScanner, IBeaconFilter, OverflowAreaFilter, BtAddrFilter, \
+                        EddystoneFilter, FilterIndex, IBeaconAdvertisement, \
+                        OverflowAreaAdvertisement, CYPRESS_BEACON_DEFAULT_UUID
+from beacontools.device_filters import DeviceFilter
+from beacontools.parser import parse_packet
+from beacontools.packet_types.overflow_area import encode_overflow_area
+from beacontools.utils import is_packet_type
+
+UUID = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+IBEACON = bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) + \
+          bytes.fromhex(UUID.replace("-", "")) + bytes([0x00, 0x05, 0x00, 0x07, 0xc5])
+OVERFLOW_AREA = bytes([0x02, 0x01, 0x1a, 0x14, 0xff, 0x4c, 0x00, 0x01]) + \
+                encode_overflow_area(5, 7, -59)
+ADDRESS = "01:02:03:04:05:06"
+
+
+def test_packets():
+    """Both payloads parse to the expected packet types."""
+    assert isinstance(parse_packet(IBEACON), IBeaconAdvertisement)
+    overflow = parse_packet(OVERFLOW_AREA)
+    assert isinstance(overflow, OverflowAreaAdvertisement)
+    assert (overflow.major, overflow.minor, overflow.tx_power) == (5, 7, -59)
+    assert is_packet_type(OverflowAreaAdvertisement)
+
+
+@pytest.mark.parametrize("filtr, payload", [
+    (OverflowAreaFilter(major=5), IBEACON),
+    (OverflowAreaFilter(major=5, minor=7), IBEACON),
+    (IBeaconFilter(major=5), OVERFLOW_AREA),
+    (IBeaconFilter(major=5, minor=7), OVERFLOW_AREA),
+])
+def test_no_match_across_packet_families(filtr, payload):
+    """A filter never matches a packet of another family with the same major/minor."""
+    packet = parse_packet(payload)
+    assert not filtr.applies_to(packet)
+    assert FilterIndex([filtr]).match(ADDRESS, packet.properties, packet) is None
+
+
+@pytest.mark.parametrize("filtr, payload", [
+    (OverflowAreaFilter(), OVERFLOW_AREA),
+    (OverflowAreaFilter(major=5), OVERFLOW_AREA),
+    (IBeaconFilter(major=5), IBEACON),
+    (IBeaconFilter(uuid=UUID, minor=7), IBEACON),
+])
+def test_match_within_packet_family(filtr, payload):
+    """Filters still match the packets of their own family."""
+    packet = parse_packet(payload)
+    assert FilterIndex([filtr]).match(ADDRESS, packet.properties, packet) is filtr
+
+
+@pytest.mark.parametrize("device_filter, payload, beacon_type", [
+    ([IBeaconFilter(major=5), OverflowAreaFilter(major=5)], IBEACON, "iBeacon"),
+    ([IBeaconFilter(major=5), OverflowAreaFilter(major=5)], OVERFLOW_AREA, "OverflowArea"),
+    ([OverflowAreaFilter(major=5), IBeaconFilter(major=5)], IBEACON, "iBeacon"),
+    ([OverflowAreaFilter(major=5)], IBEACON, None),
+    ([IBeaconFilter(major=5)], OVERFLOW_AREA, None),
+    ([BtAddrFilter(ADDRESS)], OVERFLOW_AREA, ""),
+])
+def test_beacon_type_from_packet(device_filter, payload, beacon_type):
+    """The scanner labels sightings by the parsed packet, not by the matching filter."""
+    seen = []
+
+    def callback(_scanner, beacon_type, _bt_addr, _rssi, _packet, _properties):
+        seen.append(beacon_type)
+
+    scanner = BeaconScanner(callback, device_filter=device_filter)
+    # pylint: disable=protected-access
+    scanner._mon.process_report(bytes([6, 5, 4, 3, 2, 1]), -60, payload)
+
+    assert seen == ([] if beacon_type is None else [beacon_type])
+
+
+def linear_match(filters, bt_addr, properties, packet):
+    """Reference: the first filter of the list that matches, like the scanner's old loop."""
+    for filtr in filters:
+        if isinstance(filtr, BtAddrFilter):
+            if filtr.matches({'bt_addr': bt_addr}):
+                return filtr
+        elif (packet is None or filtr.applies_to(packet)) and filtr.matches(properties):
+            return filtr
+    return None
+
+
+def random_filter(rand, addresses):
+    """A filter of a random type and shape over small value domains."""
+    kind = rand.randrange(5)
+    if kind == 0:
+        return BtAddrFilter(rand.choice(addresses))
+    if kind == 1:
+        args = {}
+        while not args:
+            if rand.random() < 0.3:
+                args['uuid'] = rand.choice([UUID, CYPRESS_BEACON_DEFAULT_UUID])
+            if rand.random() < 0.5:
+                args['major'] = rand.randrange(3)
+            if rand.random() < 0.5:
+                args['minor'] = rand.randrange(3)
+        return IBeaconFilter(**args)
+    if kind == 2:
+        return OverflowAreaFilter(major=rand.choice([None, 0, 1, 2]),
+                                  minor=rand.choice([None, 0, 1, 2]))
+    if kind == 3:
+        return EddystoneFilter(namespace=rand.choice(["a", "b"]),
+                               instance=rand.choice([None, "x", "y"]))
+    # unhashable values are checked one by one
+    filtr = DeviceFilter()
+    filtr.properties['data'] = [rand.randrange(2)]
+    if rand.random() < 0.5:
+        filtr.properties['major'] = rand.randrange(3)
+    return filtr
+
+
+def random_packet(rand):
+    """A packet and its properties, of a random family."""
+    kind = rand.randrange(4)
+    major, minor = rand.randrange(3), rand.randrange(3)
+    if kind == 0:
+        packet = IBeaconAdvertisement.from_fields(
+            rand.choice([UUID, CYPRESS_BEACON_DEFAULT_UUID]), major, minor, -59)
+        return packet, packet.properties
+    if kind == 1:
+        packet = OverflowAreaAdvertisement(major, minor, -59)
+        return packet, packet.properties
+    if kind == 2:
+        return object(), {'namespace': rand.choice(["a", "b"]), 'instance': rand.choice(["x", "y"])}
+    return object(), {'data': [rand.randrange(2)], 'major': major}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_index_matches_linear_scan(seed):
+    """FilterIndex.match returns what scanning the filter list in order returns."""
+    rand = random.Random(seed)
+    addresses = ["01:02:03:04:05:0{}".format(i) for i in range(4)]
+    filters = [random_filter(rand, addresses) for _ in range(rand.randrange(1, 30))]
+    index = FilterIndex(filters)
+
+    for _ in range(300):
+        bt_addr = rand.choice(addresses)
+        packet, properties = random_packet(rand)
+        if rand.random() < 0.05:
+            properties = None
+        assert index.match(bt_addr, properties, packet) is \
+            linear_match(filters, bt_addr, properties, packet)
+        assert index.match(bt_addr, properties) is \
+            linear_match(filters, bt_addr, properties, None)
@@ -0,0 +1,136 @@
+"""Tests for the table driven Hamming codec against the former bit list implementation."""
+import random
+
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from HammingEcc import HammingEcc
+
+
+def reference_encode(data_bits):
+    """Bit list encoder of the original HammingEcc."""
+    parity_count = 0
+    while len(data_bits) > (1 << parity_count) - (parity_count + 1):
+        parity_count += 1
+
+    bits = []
+    parity_pos = 0
+    data = iter(data_bits)
+    for i in range(parity_count + len(data_bits)):
+        if i == (1 << parity_pos) - 1:
+            bits.append(0)
+            parity_pos += 1
+        else:
+            bits.append(next(data))
+
+    for i in range(parity_count):
+        position = 1 << i
+        count = 0
+        for start in range(position - 1, len(bits), 2 * position):
+            count += sum(bits[start:start + position])
+        bits[position - 1] = count % 2
+
+    bits.append(1 if any(bits) else 0)
+    return bits
+
+
+def reference_decode(code_bits):
+    """Bit list decoder of the original HammingEcc, [] if the parity check fails."""
+    extra_parity = code_bits[-1]
+    work = list(code_bits[:-1])
+
+    parity_count = 0
+    while len(code_bits) - parity_count > (1 << parity_count) - (parity_count + 1):
+        parity_count += 1
+
+    error = 0
+    for i in range(parity_count):
+        position = 1 << i
+        count = 0
+        for start in range(position - 1, len(work), 2 * position):
+            count += sum(work[start:start + position])
+        if count % 2:
+            error += position
+    if error:
+        # IndexError if the syndrome points outside of the codeword
+        work[error - 1] ^= 1
+
+    data = [bit for i, bit in enumerate(work) if (i + 1) & i != 0]
+    if (1 if any(data) else 0) != extra_parity:
+        return []
+    return data
+
+
+def flip(bits, rand, count):
+    """Copy of bits with count random bits flipped."""
+    bits = list(bits)
+    for pos in rand.sample(range(len(bits)), count):
+        bits[pos] ^= 1
+    return bits
+
+
+@pytest.mark.parametrize("data_length", [1, 4, 8, 11, 26, 40, 48, 57, 64])
+def test_matches_reference(data_length):
+    """encodeBits/decodeBits return what the bit list implementation returned."""
+    ecc = HammingEcc()
+    rand = random.Random(data_length)
+
+    for _ in range(200):
+        data = [rand.randrange(2) for _ in range(data_length)]
+        code = ecc.encodeBits(data)
+        assert code == reference_encode(data)
+
+        assert ecc.decodeBits(code) == data
+        # one flipped bit besides the extra parity bit is corrected
+        assert ecc.decodeBits(flip(code[:-1], rand, 1) + code[-1:]) == data
+
+        for flips in (1, 2, 3):
+            received = flip(code, rand, flips)
+            try:
+                expected = reference_decode(received)
+            except IndexError:
+                with pytest.raises(IndexError):
+                    ecc.decodeBits(received)
+                continue
+            assert ecc.decodeBits(received) == expected
+
+
+def test_int_and_list_forms_agree():
+    """encodeInt/decodeInt are the packed form of encodeBits/decodeBits."""
+    ecc = HammingEcc()
+    rand = random.Random(1)
+    for _ in range(500):
+        value = rand.getrandbits(48)
+        codeword, length = ecc.encodeInt(value, 48)
+        assert ecc.intToBits(codeword, length) == ecc.encodeBits(ecc.intToBits(value, 48))
+        assert ecc.decodeInt(codeword ^ (1 << rand.randrange(length - 1)), length) == \
+            ((value, 48) if value else None)
+
+
+def test_decode_many_matches_decode_int():
+    """decodeMany decodes a batch like decodeInt decodes every codeword."""
+    np = pytest.importorskip("numpy")
+    ecc = HammingEcc()
+    rand = random.Random(2)
+    length = 55
+    codewords = []
+    for _ in range(300):
+        codeword = ecc.encodeInt(rand.getrandbits(48), 48)[0]
+        for pos in rand.sample(range(length), rand.randrange(3)):
+            codeword ^= 1 << pos
+        codewords.append(codeword)
+
+    words = np.array([list(codeword.to_bytes(7, 'little')) for codeword in codewords],
+                     dtype=np.uint8)
+    data, ok = ecc.decodeMany(words, length)
+
+    for row, codeword in enumerate(codewords):
+        try:
+            expected = ecc.decodeInt(codeword, length)
+        except IndexError:
+            expected = None
+        assert bool(ok[row]) == (expected is not None)
+        if expected is not None:
+            assert int.from_bytes(bytes(data[row]), 'little') == expected[0]
@@ -0,0 +1,110 @@
+"""Tests for the raw HCI iBeacon advertiser."""
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from iBeaconHciAdvertiser import iBeaconHciAdvertiser
+
+UUID = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+IBEACON_DATA = bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) + \
+               bytes.fromhex(UUID.replace("-", "")) + bytes([0x00, 0x02, 0x22, 0xb8, 0xc5])
+OGF_LE_CTL = 0x08
+
+
+class FakeBackend(object):
+    """Backend recording the commands, answering the local version request."""
+
+    def __init__(self, hci_version):
+        self.hci_version = hci_version
+        self.commands = []
+        self.requests = []
+
+    def open_dev(self, bt_device_id):
+        return ("socket", bt_device_id)
+
+    def send_cmd(self, _socket, group_field, command_field, data):
+        self.commands.append((group_field, command_field, bytes(data)))
+
+    def send_req(self, _socket, group_field, command_field, _event, rlen, _params, _timeout):
+        self.requests.append((group_field, command_field))
+        return bytes([0x00, self.hci_version, 0, 0, self.hci_version, 0xff, 0xff, 0, 0])[:rlen]
+
+
+def test_legacy_commands():
+    """Controllers before BT 5 get the legacy advertising commands."""
+    backend = FakeBackend(hci_version=8)
+    advertiser = iBeaconHciAdvertiser(UUID, 2, 8888, -59, backend=backend)
+    advertiser.start()
+
+    assert backend.requests == [(0x04, 0x0001)]
+    assert not advertiser.extended
+    params = bytes([0xa0, 0x00, 0xa0, 0x00,   # 100ms min and max interval
+                    0x03,                     # ADV_NONCONN_IND
+                    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,  # own/peer address
+                    0x07,                     # all channels
+                    0x00])                    # no white list
+    assert len(params) == 15
+    data = bytes([30]) + IBEACON_DATA + bytes(1)
+    assert len(data) == 32
+    assert backend.commands == [(OGF_LE_CTL, 0x06, params),
+                                (OGF_LE_CTL, 0x08, data),
+                                (OGF_LE_CTL, 0x0a, b"\x01")]
+
+    backend.commands.clear()
+    advertiser.update(minor=8889)
+    advertiser.stop()
+    assert backend.commands == [(OGF_LE_CTL, 0x08, data[:-3] + bytes([0xb9, 0xc5, 0x00])),
+                                (OGF_LE_CTL, 0x0a, b"\x00")]
+
+
+def test_extended_commands():
+    """BT 5 controllers get one legacy PDU extended advertising set."""
+    backend = FakeBackend(hci_version=9)
+    advertiser = iBeaconHciAdvertiser(UUID, 2, 8888, -59, backend=backend)
+    advertiser.start()
+
+    assert advertiser.extended
+    params = bytes([0x00,                     # advertising handle
+                    0x10, 0x00,               # legacy PDU, non-connectable, non-scannable
+                    0xa0, 0x00, 0x00, 0xa0, 0x00, 0x00,  # 100ms min and max interval
+                    0x07,                     # all channels
+                    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,  # own/peer address
+                    0x00,                     # no white list
+                    0x7f,                     # no tx power preference
+                    0x01, 0x00, 0x01,         # LE 1M primary, no skip, LE 1M secondary
+                    0x00, 0x00])              # set id, no scan request notifications
+    assert len(params) == 25
+    data = bytes([0x00, 0x03, 0x01, 30]) + IBEACON_DATA
+    assert len(data) == 34
+    enable = bytes([0x01, 0x01, 0x00, 0x00, 0x00, 0x00])
+    assert backend.commands == [(OGF_LE_CTL, 0x36, params),
+                                (OGF_LE_CTL, 0x37, data),
+                                (OGF_LE_CTL, 0x39, enable)]
+
+    backend.commands.clear()
+    advertiser.stop()
+    assert backend.commands == [(OGF_LE_CTL, 0x39, b"\x00" + enable[1:])]
+
+
+def test_unknown_version_uses_legacy_commands():
+    """Backends that can not answer requests get the legacy commands."""
+    backend = FakeBackend(hci_version=9)
+
+    def send_req(*_args):
+        raise NotImplementedError
+
+    backend.send_req = send_req
+    advertiser = iBeaconHciAdvertiser(UUID, 2, 8888, -59, backend=backend)
+    advertiser.start()
+    assert [command[1] for command in backend.commands] == [0x06, 0x08, 0x0a]
+
+
+def test_vbeacon_hci_only_has_no_bluez_session():
+    """vBeacon only creates the D-Bus session for D-Bus components."""
+    from vBeacon import vBeacon
+
+    vbeacon = vBeacon(UUID, 2, 8888, -59, hciOverflowArea=True, hciAdvertiser=True)
+    assert vbeacon.session is None
+    assert vbeacon.overflowAreaBeaconScanner is None
+    assert isinstance(vbeacon.iBeaconAdvertiser, iBeaconHciAdvertiser)
@@ -0,0 +1,87 @@
+"""Tests for the nearby beacon table and its published snapshots."""
+import time
+
+from NearbyBeacons import NearbyBeacons
+
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_update_publishes_snapshot():
+    """With publishDelay 0 every sighting publishes a new snapshot."""
+    clock = FakeClock()
+    nearby = NearbyBeacons(expiration=10, publishDelay=0, clock=clock)
+    nearby.update(2, 1, -59, -60)
+    clock.now += 1
+    nearby.update(2, 2, -59, -70)
+
+    snapshot = nearby.snapshot
+    assert [(beacon.major, beacon.minor) for beacon in snapshot.beacons] == [(2, 1), (2, 2)]
+    assert snapshot.version == nearby.version
+    assert snapshot.expiresAt == 1010.0
+    nearby.close()
+
+
+def test_readers_do_not_lock_or_mutate():
+    """Reading the snapshot works while a writer holds the lock and changes nothing."""
+    clock = FakeClock()
+    nearby = NearbyBeacons(expiration=10, publishDelay=0, clock=clock)
+    nearby.update(2, 1, -59, -60)
+    published = nearby.snapshot
+
+    clock.now += 60
+    with nearby.lock:
+        assert nearby.snapshot is published
+        assert len(nearby.snapshot.beacons) == 1
+    assert len(nearby) == 1
+    nearby.close()
+
+
+def test_expire_publishes_removal():
+    """Expired beacons leave the table and the next snapshot."""
+    clock = FakeClock()
+    nearby = NearbyBeacons(expiration=10, publishDelay=0, clock=clock)
+    nearby.update(2, 1, -59, -60)
+    clock.now += 5
+    nearby.update(2, 2, -59, -60)
+    clock.now += 6
+    nearby.expire()
+
+    assert [beacon.minor for beacon in nearby.snapshot.beacons] == [2]
+    assert nearby.getRssiHistory(2, 1) is None
+    assert len(nearby.getRssiHistory(2, 2)) == 1
+    nearby.close()
+
+
+def test_delayed_publish():
+    """Sightings are published by the timer within publishDelay."""
+    nearby = NearbyBeacons(expiration=10, publishDelay=0.05)
+    nearby.update(2, 1, -59, -60)
+    assert nearby.snapshot.beacons == ()
+
+    deadline = time.monotonic() + 2
+    while not nearby.snapshot.beacons and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [beacon.minor for beacon in nearby.snapshot.beacons] == [1]
+    nearby.close()
+
+
+def test_quiet_beacons_expire():
+    """Beacons expire without further sightings."""
+    nearby = NearbyBeacons(expiration=0.1, publishDelay=0)
+    nearby.update(2, 1, -59, -60)
+    assert len(nearby.snapshot.beacons) == 1
+
+    deadline = time.monotonic() + 2
+    while nearby.snapshot.beacons and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert nearby.snapshot.beacons == ()
+    assert len(nearby) == 0
+    nearby.close()
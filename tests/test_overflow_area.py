@@ -0,0 +1,93 @@
+"""Tests for the overflow area encoding of backgrounded iOS beacons."""
+import random
+
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import OverflowAreaAdvertisement
+from beacontools.parser import parse_packet
+from OverflowArea import encodeOverflowArea, decodeOverflowArea, extractBeaconBytes, \
+                         OVERFLOW_AREA_TYPE, OVERFLOW_AREA_LENGTH
+
+# flags and the AD header of an overflow area advert, followed by the area
+ADVERT_HEADER = bytes([0x02, 0x01, 0x1a, 0x14, 0xff, 0x4c, 0x00, OVERFLOW_AREA_TYPE])
+
+
+def identities(count, seed=1):
+    """Random (major, minor, tx_power) triples, including the edge values."""
+    rand = random.Random(seed)
+    yield (0, 0, -1)
+    yield (0xffff, 0xffff, -128)
+    for _ in range(count):
+        yield (rand.randrange(0x10000), rand.randrange(0x10000), rand.randint(-128, -1))
+
+
+def test_round_trip():
+    """decodeOverflowArea(encodeOverflowArea(...)) returns the identity."""
+    for identity in identities(2000):
+        area = encodeOverflowArea(*identity)
+        assert len(area) == OVERFLOW_AREA_LENGTH
+        assert decodeOverflowArea(area) == identity
+        assert extractBeaconBytes(area, 5) == [identity[0] >> 8, identity[0] & 0xff,
+                                               identity[1] >> 8, identity[1] & 0xff,
+                                               identity[2] & 0xff]
+
+
+def test_round_trip_through_parser():
+    """The HCI parser decodes a full advert built from the encoded area."""
+    for major, minor, tx_power in identities(200):
+        packet = parse_packet(ADVERT_HEADER + encodeOverflowArea(major, minor, tx_power))
+        assert isinstance(packet, OverflowAreaAdvertisement)
+        assert (packet.major, packet.minor, packet.tx_power) == (major, minor, tx_power)
+
+
+def test_single_bit_error_corrected():
+    """One flipped bit in the encoded beacon data is corrected."""
+    rand = random.Random(2)
+    for identity in identities(200):
+        area = bytearray(encodeOverflowArea(*identity))
+        # the 55 bit codeword starts at byte 8, bits are reversed per byte
+        bit = rand.randrange(54)
+        area[8 + bit // 8] ^= 0x80 >> (bit % 8)
+        assert decodeOverflowArea(bytes(area)) == identity
+
+
+def test_not_our_beacon():
+    """Areas without the marker byte are not decoded."""
+    assert decodeOverflowArea(bytes(OVERFLOW_AREA_LENGTH)) is None
+    assert decodeOverflowArea(bytes(8)) is None
+    assert parse_packet(ADVERT_HEADER + bytes(OVERFLOW_AREA_LENGTH)) is None
+
+
+def test_advertiser_payload():
+    """The advertiser sends the type byte followed by the encoded area."""
+    pytest.importorskip("dbus")
+    from OverflowAreaAdvertiser import OverflowAreaAdvertiser
+
+    advertiser = OverflowAreaAdvertiser(2, 8877, -59)
+    assert advertiser.payload[0] == OVERFLOW_AREA_TYPE
+    assert decodeOverflowArea(bytes(advertiser.payload[1:])) == (2, 8877, -59)
+    advertiser.update(minor=1)
+    assert decodeOverflowArea(bytes(advertiser.payload[1:])) == (2, 1, -59)
+
+
+def test_advertiser_shares_ibeacon_state():
+    """The overflow area advertiser is set up by iBeaconAdvertiser, only its payload differs."""
+    pytest.importorskip("dbus")
+    from iBeaconAdvertiser import iBeaconAdvertiser
+    from OverflowAreaAdvertiser import OverflowAreaAdvertiser
+
+    session = object()
+    ibeacon = iBeaconAdvertiser("2f234454-cf6d-4a0f-adf2-f4911ba9ffa6", 2, 8877, -59, session)
+    overflow = OverflowAreaAdvertiser(2, 8877, -59, session)
+    for advertiser in (ibeacon, overflow):
+        assert (advertiser.company_id, advertiser.session) == (0x004C, session)
+        assert not advertiser.is_advert and not advertiser.is_paused
+        assert not advertiser.registered.is_set()
+
+    assert ibeacon._data()[-5:] == [0x00, 0x02, 0x22, 0xad, 0xc5]  # pylint: disable=protected-access
+    assert overflow.uuid is None
+    assert (overflow.major, overflow.minor, overflow.tx_power) == (2, 8877, -59)
+    assert overflow._data() == overflow.payload  # pylint: disable=protected-access
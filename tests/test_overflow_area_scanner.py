@@ -0,0 +1,216 @@
+"""Tests for the D-Bus overflow area scanner against a stand-in bluetoothd."""
+import threading
+
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+dbus = pytest.importorskip("dbus")
+pytest.importorskip("gi")
+
+from DeviceTable import APPLE_COMPANY_ID
+from OverflowArea import encodeOverflowArea, OVERFLOW_AREA_TYPE
+import OverflowAreaBeaconScanner as scanner_module
+from OverflowAreaBeaconScanner import OverflowAreaBeaconScanner
+
+PATH = "/org/bluez/hci0/dev_01_02_03_04_05_06"
+OTHER = "/org/bluez/hci0/dev_0A_0B_0C_0D_0E_0F"
+
+
+def device(address, rssi, area=None):
+    """Device1 properties, with overflow area manufacturer data if area is given."""
+    properties = {'Address': address, 'RSSI': rssi}
+    if area is not None:
+        properties['ManufacturerData'] = {APPLE_COMPANY_ID: bytes([OVERFLOW_AREA_TYPE]) + area}
+    return properties
+
+
+class FakeDevice:
+    """Device1 object of the stand-in bluetoothd, only Properties.GetAll is served."""
+
+    def __init__(self, bluez, path):
+        self.bluez = bluez
+        self.path = path
+
+    def get_dbus_method(self, member, dbus_interface=None):
+        assert (member, dbus_interface) == ("GetAll", "org.freedesktop.DBus.Properties")
+
+        def get_all(interface):
+            assert interface == "org.bluez.Device1"
+            self.bluez.get_all_calls.append(self.path)
+            return dict(self.bluez.devices[self.path])
+        return get_all
+
+
+class FakeBus:
+    """System bus that records signal receivers and hands out FakeDevice objects."""
+
+    def __init__(self, bluez):
+        self.bluez = bluez
+
+    def add_signal_receiver(self, *_args, **_kwargs):
+        pass
+
+    def get_object(self, bus_name, path):
+        assert bus_name == "org.bluez"
+        return FakeDevice(self.bluez, path)
+
+
+class FakeAdapter:
+    """Adapter1 interface, discovery calls are accepted and ignored."""
+
+    def SetDiscoveryFilter(self, _scan_filter):  # pylint: disable=invalid-name
+        pass
+
+    def StartDiscovery(self):  # pylint: disable=invalid-name
+        pass
+
+    def StopDiscovery(self):  # pylint: disable=invalid-name
+        pass
+
+
+class FakeGLib:
+    """GLib timeouts that only record adding and removing."""
+
+    def __init__(self):
+        self.timeouts = {}
+        self.removed = []
+
+    def timeout_add(self, _interval, function):
+        source = len(self.timeouts) + len(self.removed) + 1
+        self.timeouts[source] = function
+        return source
+
+    def source_remove(self, source):
+        assert source in self.timeouts, "source removed twice or never added"
+        del self.timeouts[source]
+        self.removed.append(source)
+
+
+class FakeSession:
+    """BluezSession stand-in, bluetoothd's devices are kept in devices."""
+
+    def __init__(self, devices):
+        self.devices = devices
+        self.get_all_calls = []
+        self.bus = FakeBus(self)
+        self.objectManager = None
+
+    def adapterInterface(self):  # pylint: disable=invalid-name
+        return FakeAdapter()
+
+    def acquire(self):
+        pass
+
+    def release(self):
+        pass
+
+    def getManagedObjects(self):  # pylint: disable=invalid-name
+        return {path: {"org.bluez.Device1": properties}
+                for path, properties in self.devices.items()}
+
+
+def make_scanner(devices, **kwargs):
+    """A scanner evaluating every signal right away, and the sightings it passes on."""
+    seen = []
+    session = FakeSession(devices)
+    scanner = OverflowAreaBeaconScanner(lambda *sighting: seen.append(sighting),
+                                        coalesceWindow=None, session=session, **kwargs)
+    return scanner, session, seen
+
+
+def rssi_changed(scanner, path, rssi):
+    """Deliver an RSSI only PropertiesChanged signal."""
+    scanner.properties_changed("org.bluez.Device1", {'RSSI': rssi}, [], path)
+
+
+def test_rssi_updates_after_ttl_eviction():
+    """A beacon evicted by the TTL is found again from its next RSSI only signal."""
+    devices = {PATH: device("01:02:03:04:05:06", -60, encodeOverflowArea(2, 7, -59))}
+    scanner, session, seen = make_scanner(devices, deviceTtl=300.0)
+
+    rssi_changed(scanner, PATH, -61)
+    assert seen == [(2, 7, -59, -61)]
+    assert session.get_all_calls == []
+
+    scanner.devices.expire(now=scanner.devices.get(PATH).lastSeen + 301.0)
+    assert PATH not in scanner.devices
+
+    rssi_changed(scanner, PATH, -62)
+    rssi_changed(scanner, PATH, -63)
+    assert seen[1:] == [(2, 7, -59, -62), (2, 7, -59, -63)]
+    assert session.get_all_calls == [PATH]
+    assert scanner.stats()["propertyFetches"] == 1
+
+
+def test_rssi_updates_after_max_devices_eviction():
+    """A beacon pushed out by the device cap is found again from an RSSI only signal."""
+    devices = {PATH: device("01:02:03:04:05:06", -60, encodeOverflowArea(2, 7, -59)),
+               OTHER: device("0A:0B:0C:0D:0E:0F", -70)}
+    scanner, session, seen = make_scanner({PATH: devices[PATH]}, maxDevices=1)
+    session.devices = devices
+
+    scanner.interfaces_added(OTHER, {"org.bluez.Device1": devices[OTHER]})
+    assert PATH not in scanner.devices
+
+    rssi_changed(scanner, PATH, -64)
+    assert seen == [(2, 7, -59, -64)]
+    assert session.get_all_calls == [PATH]
+
+
+def test_device_without_payload_fetched_once():
+    """A device without manufacturer data is looked up once, then its RSSI updates are ignored."""
+    scanner, session, seen = make_scanner({})
+    session.devices[OTHER] = device("0A:0B:0C:0D:0E:0F", -70)
+
+    for rssi in (-70, -71, -72):
+        rssi_changed(scanner, OTHER, rssi)
+    assert seen == []
+    assert session.get_all_calls == [OTHER]
+    assert scanner.devices.get(OTHER).decoded
+
+
+def coalescing_scanner(monkeypatch):
+    """A started scanner with a pending flush of one beacon sighting."""
+    glib = FakeGLib()
+    monkeypatch.setattr(scanner_module, "GLib", glib)
+    devices = {PATH: device("01:02:03:04:05:06", -60, encodeOverflowArea(2, 7, -59))}
+    seen = []
+    scanner = OverflowAreaBeaconScanner(lambda *sighting: seen.append(sighting),
+                                        coalesceWindow=0.05, session=FakeSession(devices))
+    scanner.start()
+    rssi_changed(scanner, PATH, -61)
+    assert len(glib.timeouts) == 1 and PATH in scanner.pending
+    return scanner, glib, seen
+
+
+def test_stop_cancels_pending_flush(monkeypatch):
+    """stop() removes the coalescing timer and drops what it would have evaluated."""
+    scanner, glib, seen = coalescing_scanner(monkeypatch)
+    scanner.stop()
+    assert glib.timeouts == {} and len(glib.removed) == 1
+    assert scanner.pending == {} and scanner.flushTimer is None
+
+    # a flush already being dispatched when stop() ran finds nothing to do
+    scanner._flush()  # pylint: disable=protected-access
+    assert seen == []
+
+
+def test_stop_racing_flush(monkeypatch):
+    """stop() on another thread and the timer callback do not interleave."""
+    for _ in range(20):
+        scanner, glib, seen = coalescing_scanner(monkeypatch)
+        # pylint: disable=protected-access
+        threads = [threading.Thread(target=scanner._flush), threading.Thread(target=scanner.stop)]
+        scanner.lock.acquire()
+        for thread in threads:
+            thread.start()
+        scanner.lock.release()
+        for thread in threads:
+            thread.join(5)
+            assert not thread.is_alive()
+
+        assert scanner.pending == {} and scanner.flushTimer is None
+        # either the callback ran first and its timer is not removed again,
+        # or stop() removed the timer and the callback evaluated nothing
+        assert (glib.removed, seen) in [([], [(2, 7, -59, -61)]), ([1], [])]
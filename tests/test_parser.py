@@ -0,0 +1,93 @@
+"""Tests for the fixed offset iBeacon decoder against the construct parser."""
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import IBeaconAdvertisement, CJMonitorAdvertisement
+from beacontools import parser
+from beacontools.parser import parse_ibeacon_packet, parse_ltv_packet, parse_packet
+
+UUID = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+FLAGS = bytes([0x02, 0x01, 0x06])
+
+
+def ibeacon_ad(uuid=UUID, major=2, minor=8888, tx_power=-59):
+    """The manufacturer specific AD structure of an iBeacon."""
+    return bytes([0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) + bytes.fromhex(uuid.replace("-", "")) + \
+        major.to_bytes(2, 'big') + minor.to_bytes(2, 'big') + bytes([tx_power & 0xff])
+
+
+def assert_same(fast, slow):
+    """Both parsers decoded the same iBeacon."""
+    assert isinstance(fast, IBeaconAdvertisement) and isinstance(slow, IBeaconAdvertisement)
+    assert fast.properties == slow.properties
+    assert fast.tx_power == slow.tx_power
+
+
+@pytest.mark.parametrize("major, minor, tx_power", [(2, 8888, -59), (0, 0, -1),
+                                                     (0xffff, 0xffff, -128), (1, 2, 0)])
+def test_ibeacon_with_flags(major, minor, tx_power):
+    """An iBeacon after the flags AD decodes like the construct parser does."""
+    packet = FLAGS + ibeacon_ad(major=major, minor=minor, tx_power=tx_power)
+    assert_same(parse_ibeacon_packet(packet), parse_ltv_packet(packet))
+    assert parse_ibeacon_packet(packet).properties == \
+        {'uuid': UUID, 'major': major, 'minor': minor}
+
+
+def test_ibeacon_without_flags():
+    """The iBeacon AD is found without a flags AD in front of it."""
+    packet = ibeacon_ad()
+    assert_same(parse_ibeacon_packet(packet), parse_ltv_packet(packet))
+
+
+def test_ibeacon_after_other_ads():
+    """The AD structures before the iBeacon are skipped by their length."""
+    name = b"\x05\x09beac"
+    packet = FLAGS + name + ibeacon_ad(minor=7)
+    assert_same(parse_ibeacon_packet(packet), parse_ltv_packet(packet))
+
+
+def test_other_manufacturer_data_falls_through():
+    """A non iBeacon manufacturer AD is left to the construct parser."""
+    packet = FLAGS + bytes([0x09, 0xff, 0x72, 0x04, 0xfe, 0x10, 0xd1, 0x0c, 0x33, 0x61]) + \
+        b"\x09\x09Mon 5643"
+    assert parse_ibeacon_packet(packet) is None
+    slow = parse_ltv_packet(packet)
+    assert isinstance(slow, CJMonitorAdvertisement)
+    assert parse_packet(packet).properties == slow.properties
+
+
+@pytest.mark.parametrize("packet", [
+    # apple manufacturer data of the iBeacon length, but not of type iBeacon
+    FLAGS + bytes([0x1a, 0xff, 0x4c, 0x00, 0x10, 0x15]) + bytes(21),
+    # iBeacon AD cut short
+    FLAGS + ibeacon_ad()[:20],
+    # zero length AD ends the data
+    FLAGS + b"\x00" + ibeacon_ad(),
+    b"",
+])
+def test_no_ibeacon(packet):
+    """Packets without a complete iBeacon AD give None, like the construct parser."""
+    assert parse_ibeacon_packet(packet) is None
+    assert not isinstance(parse_ltv_packet(packet), IBeaconAdvertisement)
+
+
+def test_uuid_cache_hit():
+    """A known UUID is served from the cache, the cache is bounded."""
+    parser._UUID_CACHE.clear()  # pylint: disable=protected-access
+    packet = FLAGS + ibeacon_ad()
+    first = parse_ibeacon_packet(packet)
+    assert len(parser._UUID_CACHE) == 1  # pylint: disable=protected-access
+
+    second = parse_ibeacon_packet(FLAGS + ibeacon_ad(minor=1))
+    assert second.uuid is first.uuid
+    assert len(parser._UUID_CACHE) == 1  # pylint: disable=protected-access
+    assert_same(second, parse_ltv_packet(FLAGS + ibeacon_ad(minor=1)))
+
+    size = parser._UUID_CACHE_SIZE  # pylint: disable=protected-access
+    for i in range(size + 1):
+        uuid = "{:032x}".format(i)
+        parse_ibeacon_packet(ibeacon_ad(uuid=uuid))
+    assert 1 <= len(parser._UUID_CACHE) <= size  # pylint: disable=protected-access
+    parser._UUID_CACHE.clear()  # pylint: disable=protected-access
@@ -0,0 +1,97 @@
+"""Tests for the btsnoop replay backend."""
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import BeaconScanner, BtAddrFilter, ScanFilter
+from beacontools.backend import replay
+from beacontools.const import OGF_LE_CTL, OCF_LE_READ_WHITE_LIST_SIZE, \
+                              OCF_LE_ADD_DEVICE_TO_WHITE_LIST
+
+IBEACON = bytes([0x02, 0x01, 0x06, 0x1a, 0xff, 0x4c, 0x00, 0x02, 0x15]) + bytes(range(16)) + \
+          bytes([0x00, 0x02, 0x22, 0xb8, 0xc5])
+ADDRESS = bytes([0x06, 0x05, 0x04, 0x03, 0x02, 0x01])
+LIB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lib")
+
+
+def advertising_event(payload, rssi=-60):
+    """H4 LE advertising report event with one report."""
+    report = bytes([0x03, 0x00]) + ADDRESS + bytes([len(payload)]) + payload + \
+             bytes([rssi & 0xff])
+    params = bytes([0x02, 0x01]) + report
+    return bytes([replay.HCI_EVENT_PKT, 0x3e, len(params)]) + params
+
+
+def write_capture(path, packets):
+    """Write an H4 btsnoop capture of received events."""
+    with open(path, "wb") as capture:
+        capture.write(replay.BTSNOOP_HEADER.pack(replay.BTSNOOP_MAGIC, 1, replay.DATALINK_H4))
+        for i, pkt in enumerate(packets):
+            flags = replay.FLAG_RECEIVED | replay.FLAG_COMMAND_OR_EVENT
+            capture.write(replay.BTSNOOP_RECORD.pack(len(pkt), len(pkt), flags, 0, 1000 * i))
+            capture.write(pkt)
+
+
+def test_replay_does_not_need_pybluez():
+    """The replay backend imports without the platform backend's bindings."""
+    code = ("import sys; sys.modules['bluetooth'] = None; "
+            "from beacontools.backend import replay; print(replay.ReplaySocket.__name__)")
+    result = subprocess.run([sys.executable, "-c", code], cwd=LIB,
+                            capture_output=True, text=True, check=False)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "ReplaySocket"
+
+
+def test_replay_events(tmp_path):
+    """Every event of the capture is returned, then an empty packet."""
+    path = str(tmp_path / "capture.btsnoop")
+    events = [advertising_event(IBEACON, rssi) for rssi in (-50, -60, -70)]
+    write_capture(path, events)
+
+    sock = replay.open_dev(path)
+    assert [sock.recv(255) for _ in events] == events
+    assert sock.recv(255) == b""
+    assert sock.packets == 3
+    sock.close()
+
+
+def test_canned_responses(tmp_path):
+    """Requests are answered with the default controller responses."""
+    path = str(tmp_path / "capture.btsnoop")
+    write_capture(path, [])
+    sock = replay.open_dev(path)
+
+    resp = replay.send_req(sock, OGF_LE_CTL, OCF_LE_READ_WHITE_LIST_SIZE, 0x0e, 2, bytes(), 0)
+    assert resp == bytes([0x00, 0x80])
+    assert sock.requests == [(OGF_LE_CTL, OCF_LE_READ_WHITE_LIST_SIZE, b"")]
+    assert replay.send_req(sock, OGF_LE_CTL, 0x7f, 0x0e, 2, bytes(), 0) == bytes([0x01])
+    sock.close()
+
+
+def test_whitelist_scan_of_capture(tmp_path):
+    """A white list scan reads the white list size from the canned response."""
+    path = str(tmp_path / "capture.btsnoop")
+    write_capture(path, [advertising_event(IBEACON)] * 5)
+    sock = replay.ReplaySocket(path)
+    seen = []
+
+    def callback(_scanner, _beacon_type, bt_addr, rssi, _packet, _properties):
+        seen.append((bt_addr, rssi))
+
+    scanner = BeaconScanner(callback, bt_device_id=sock, backend=replay,
+                            device_filter=[BtAddrFilter("01:02:03:04:05:06")],
+                            scan_parameters={"filter_type": ScanFilter.WHITELIST_ONLY})
+    # pylint: disable=protected-access
+    monitor = scanner._mon
+    scanner.start()
+    monitor.join(5)
+
+    assert not monitor.is_alive()
+    assert monitor.whitelist_size == 0x80
+    assert seen == [("01:02:03:04:05:06", -60)] * 5
+    assert (OGF_LE_CTL, OCF_LE_ADD_DEVICE_TO_WHITE_LIST, b"\x00" + ADDRESS) in sock.commands
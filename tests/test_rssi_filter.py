@@ -0,0 +1,153 @@
+"""Tests for the streaming and batch RSSI filters."""
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from RssiFilter import EmaFilter, KalmanFilter, MedianFilter, distance, historyMatrix
+from RssiHistory import RssiHistory
+from NearbyBeacons import NearbyBeacons
+
+FILTERS = [EmaFilter(), EmaFilter(alpha=0.8), KalmanFilter(),
+           KalmanFilter(processNoise=2.0, measurementNoise=4.0),
+           MedianFilter(), MedianFilter(size=4)]
+
+
+def traces(seed, rows=40, columns=30):
+    """Random RSSI traces of 1 to columns samples, as lists and as a NaN padded matrix."""
+    rand = random.Random(seed)
+    rows = [[rand.randint(-100, -40) for _ in range(rand.randint(1, columns))]
+            for _ in range(rows)]
+    matrix = np.full((len(rows), columns), np.nan)
+    for index, row in enumerate(rows):
+        matrix[index, columns - len(row):] = row
+    return rows, matrix
+
+
+@pytest.mark.parametrize("prototype", FILTERS, ids=repr)
+@pytest.mark.parametrize("seed", range(3))
+def test_batch_matches_streaming(prototype, seed):
+    """filterMany gives the value update() ends with on every row."""
+    rows, matrix = traces(seed)
+    expected = []
+    for row in rows:
+        streaming = prototype.new()
+        for rssi in row:
+            value = streaming.update(rssi)
+        expected.append(value)
+
+    assert np.allclose(prototype.filterMany(matrix), expected)
+
+
+@pytest.mark.parametrize("prototype", FILTERS, ids=repr)
+def test_all_nan_row(prototype):
+    """A row without samples filters to NaN, the other rows are not affected."""
+    matrix = np.array([[np.nan, np.nan, np.nan], [np.nan, -60.0, -70.0]])
+    filtered = prototype.filterMany(matrix)
+    assert np.isnan(filtered[0])
+    assert not np.isnan(filtered[1])
+
+
+def test_median_filter_all_nan_row():
+    """MedianFilter.filterMany returns NaN for an all NaN row without warning."""
+    matrix = np.full((2, 8), np.nan)
+    matrix[1, -3:] = [-60, -90, -61]
+    filtered = MedianFilter(size=5).filterMany(matrix)
+    assert np.isnan(filtered[0])
+    assert filtered[1] == -61.0
+
+
+def test_new_filter_is_fresh():
+    """new() keeps the parameters but not the state."""
+    kalman = KalmanFilter(processNoise=1.0, measurementNoise=9.0)
+    kalman.update(-60)
+    fresh = kalman.new()
+    assert (fresh.processNoise, fresh.measurementNoise) == (1.0, 9.0)
+    assert fresh.value is None
+    assert fresh.update(-80) == -80.0
+
+
+def test_distance_scalar():
+    """The RSSI at 1m gives 1m, every 10 * pathLoss dB less ten times the distance."""
+    assert distance(-59, -59) == 1.0
+    assert distance(-79, -59) == pytest.approx(10.0)
+    assert distance(-89, -59, pathLoss=3.0) == pytest.approx(10.0)
+    assert distance(-39, -59) == pytest.approx(0.1)
+
+
+def test_distance_array():
+    """distance works element wise on NumPy arrays, including NaN."""
+    rssis = np.array([-59.0, -79.0, np.nan])
+    tx_powers = np.array([-59.0, -59.0, -59.0])
+    distances = distance(rssis, tx_powers)
+    assert np.allclose(distances[:2], [1.0, 10.0])
+    assert np.isnan(distances[2])
+
+
+def test_history_matrix():
+    """Histories become rows padded with NaN at the start."""
+    short, long = RssiHistory(8), RssiHistory(8)
+    short.add(0.0, -60)
+    for i in range(3):
+        long.add(float(i), -70 - i)
+    matrix = historyMatrix([short, long])
+    assert matrix.shape == (2, 3)
+    assert np.isnan(matrix[0, :2]).all() and matrix[0, 2] == -60
+    assert list(matrix[1]) == [-70, -71, -72]
+    assert historyMatrix([]).shape == (0, 0)
+
+
+def nearby_with_sightings(**kwargs):
+    """NearbyBeacons fed a few sightings of three beacons, and the RSSIs per beacon."""
+    clock = [1000.0]
+    nearby = NearbyBeacons(expiration=60, publishDelay=0, clock=lambda: clock[0], **kwargs)
+    rand = random.Random(5)
+    sightings = {}
+    for _ in range(30):
+        minor = rand.randrange(3)
+        rssi = rand.randint(-90, -50)
+        nearby.update(2, minor, -59 - minor, rssi)
+        sightings.setdefault(minor, []).append(rssi)
+        clock[0] += 0.5
+    return nearby, sightings
+
+
+def test_recompute_matches_streaming():
+    """recompute gives the filtered RSSI and distance of each beacon's history."""
+    nearby, sightings = nearby_with_sightings(rssiHistory=64, rssiFilter=KalmanFilter())
+    result = nearby.recompute()
+
+    assert set(result) == {(2, minor) for minor in sightings}
+    for minor, rssis in sightings.items():
+        streaming = KalmanFilter()
+        for rssi in rssis:
+            value = streaming.update(rssi)
+        filtered, meters = result[(2, minor)]
+        assert filtered == pytest.approx(value)
+        assert meters == pytest.approx(distance(value, -59 - minor))
+    nearby.close()
+
+
+def test_recompute_with_other_filter():
+    """A filter passed to recompute overrides the table's one."""
+    nearby, sightings = nearby_with_sightings(rssiHistory=64)
+    result = nearby.recompute(MedianFilter(size=3))
+    for minor, rssis in sightings.items():
+        assert result[(2, minor)][0] == float(np.median(rssis[-3:]))
+    nearby.close()
+
+
+def test_recompute_needs_filter_and_history():
+    """recompute raises ValueError without a filter or without histories."""
+    nearby = NearbyBeacons(publishDelay=0, rssiHistory=64)
+    with pytest.raises(ValueError):
+        nearby.recompute()
+    nearby.close()
+
+    nearby = NearbyBeacons(publishDelay=0, rssiHistory=None, rssiFilter=EmaFilter())
+    with pytest.raises(ValueError):
+        nearby.recompute()
+    with pytest.raises(ValueError):
+        nearby.recompute(EmaFilter())
+    nearby.close()
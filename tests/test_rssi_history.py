@@ -0,0 +1,128 @@
+"""Tests for the per beacon RSSI ring buffer."""
+import pytest
+
+from RssiHistory import RssiHistory
+
+np = pytest.importorskip("numpy")
+
+
+def filled(capacity, count, start=0.0, step=1.0):
+    """A history that got count samples: times start + i * step, RSSIs -100 + i."""
+    history = RssiHistory(capacity)
+    for i in range(count):
+        history.add(start + i * step, -100 + i)
+    return history
+
+
+def test_capacity_checked():
+    """A history keeps at least one sample."""
+    with pytest.raises(ValueError):
+        RssiHistory(0)
+
+
+def test_samples_before_wrap():
+    """Until the buffer is full the samples come in insertion order."""
+    times, rssis = filled(4, 3).samples()
+    assert list(times) == [0.0, 1.0, 2.0]
+    assert list(rssis) == [-100, -99, -98]
+
+
+@pytest.mark.parametrize("count", [4, 5, 7, 8, 11])
+def test_samples_after_wrap(count):
+    """Once the buffer wraps only the newest capacity samples remain, oldest first."""
+    history = filled(4, count)
+    times, rssis = history.samples()
+    assert list(times) == [float(i) for i in range(count - 4, count)]
+    assert list(rssis) == [-100 + i for i in range(count - 4, count)]
+    assert len(history) == 4
+
+
+def test_first_last_dwell_after_wrap():
+    """first, last and dwell follow the samples kept, not all the samples added."""
+    history = filled(4, 10, start=100.0, step=0.5)
+    assert history.first == 103.0
+    assert history.last == 104.5
+    assert history.dwell() == 1.5
+
+
+def test_empty_history():
+    """An empty history has no first/last sample, no dwell and no statistics."""
+    history = RssiHistory(4)
+    assert history.first is None and history.last is None
+    assert history.dwell() == 0.0
+    assert history.mean() is None
+    assert history.timeAbove(-60) == 0.0
+
+
+def test_windowed_statistics():
+    """mean, median and percentile only look at the samples of the window."""
+    history = RssiHistory(8)
+    for now, rssi in [(0.0, -90), (1.0, -80), (2.0, -70), (3.0, -60), (4.0, -50)]:
+        history.add(now, rssi)
+
+    assert history.mean() == -70.0
+    assert history.mean(window=2.0, now=4.0) == -60.0
+    assert history.median(window=2.0, now=4.0) == -60.0
+    assert history.percentile(100, window=2.0, now=4.0) == -50.0
+    assert history.percentile(0, window=3.5, now=4.0) == -80.0
+
+
+def test_empty_window():
+    """A window without samples gives None."""
+    history = filled(4, 3)
+    assert history.mean(window=1.0, now=10.0) is None
+    assert history.median(window=1.0, now=10.0) is None
+    assert history.percentile(90, window=1.0, now=10.0) is None
+    assert history.timeAbove(-100, window=1.0, now=10.0) == 0.0
+
+
+def test_time_above():
+    """A sample holds until the next one, the newest one until now if given."""
+    history = RssiHistory(8)
+    for now, rssi in [(0.0, -70), (2.0, -50), (3.0, -80), (6.0, -40)]:
+        history.add(now, rssi)
+
+    # -50 from 2 to 3, -40 has no end without now
+    assert history.timeAbove(-60) == 1.0
+    # -40 held from 6 to 10
+    assert history.timeAbove(-60, now=10.0) == 5.0
+    # window of the last 5 seconds: samples at 6 only
+    assert history.timeAbove(-60, window=5.0, now=10.0) == 4.0
+    assert history.timeAbove(-90, now=6.0) == 6.0
+
+
+def test_copy_is_independent():
+    """Adding to the original or the copy does not change the other one."""
+    history = filled(4, 3)
+    copy = history.copy()
+
+    history.add(10.0, -40)
+    history.add(11.0, -41)
+    assert list(copy.samples()[1]) == [-100, -99, -98]
+    assert copy.last == 2.0
+
+    copy.add(20.0, -30)
+    assert list(history.samples()[1]) == [-99, -98, -40, -41]
+    assert history.last == 11.0
+
+
+def test_nearby_beacons_drop_history_on_expiry():
+    """NearbyBeacons forgets the history of an expired beacon."""
+    from NearbyBeacons import NearbyBeacons
+
+    clock = [1000.0]
+    nearby = NearbyBeacons(expiration=10, publishDelay=0, rssiHistory=4, clock=lambda: clock[0])
+    for i in range(6):
+        nearby.update(2, 1, -59, -60 - i)
+        clock[0] += 1
+    history = nearby.getRssiHistory(2, 1)
+    assert list(history.samples()[1]) == [-62, -63, -64, -65]
+
+    clock[0] += 20
+    nearby.expire()
+    assert nearby.getRssiHistory(2, 1) is None
+    assert not nearby.histories
+
+    nearby.update(2, 1, -59, -70)
+    assert list(nearby.getRssiHistory(2, 1).samples()[1]) == [-70]
+    nearby.close()
@@ -0,0 +1,107 @@
+"""Tests for stopping a scanner whose socket receives nothing."""
+import os
+import socket
+import time
+
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import BeaconScanner
+
+# stop() has to return well before this even on a loaded machine
+STOP_BOUND = 1.0
+
+
+class SilentBackend(object):
+    """Backend whose HCI socket has a real file descriptor that never becomes readable."""
+
+    def __init__(self):
+        self.socket, self.peer = socket.socketpair()
+        self.commands = []
+
+    def open_dev(self, _bt_device_id):
+        return self.socket
+
+    def send_cmd(self, _socket, group_field, command_field, data):
+        self.commands.append((group_field, command_field, bytes(data)))
+
+    @staticmethod
+    def send_req(*_args):
+        raise NotImplementedError
+
+    def close(self):
+        self.socket.close()
+        self.peer.close()
+
+
+@pytest.fixture
+def pipes(monkeypatch):
+    """The file descriptors of the pipes created while the test runs."""
+    created = []
+    pipe = os.pipe
+
+    def recording_pipe():
+        fds = pipe()
+        created.extend(fds)
+        return fds
+
+    monkeypatch.setattr(os, "pipe", recording_pipe)
+    return created
+
+
+def closed(fd):
+    """Whether fd is no longer open."""
+    try:
+        os.fstat(fd)
+    except OSError:
+        return True
+    return False
+
+
+def wait_until(condition):
+    """Poll condition for up to 5 seconds."""
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_stop_without_packets(pipes):
+    """stop() wakes up the receive loop blocked in select and closes the wakeup pipe."""
+    backend = SilentBackend()
+    scanner = BeaconScanner(lambda *args: None, backend=backend)
+    monitor = scanner._mon  # pylint: disable=protected-access
+    scanner.start()
+    wait_until(lambda: monitor._wakeup_fd is not None)  # pylint: disable=protected-access
+    time.sleep(0.05)
+
+    start = time.monotonic()
+    scanner.stop()
+    assert time.monotonic() - start < STOP_BOUND
+    assert not monitor.is_alive()
+
+    assert len(pipes) == 2
+    assert all(closed(fd) for fd in pipes)
+    assert monitor._wakeup_fd is None  # pylint: disable=protected-access
+    # scanning was disabled and the HCI socket closed
+    assert backend.commands[-1] == (0x08, 0x0c, b"\x00\x00")
+    assert backend.socket.fileno() == -1
+    backend.close()
+
+
+def test_stop_right_after_start(pipes):
+    """stop() does not hang when it comes before the receive loop created its pipe."""
+    for _ in range(20):
+        backend = SilentBackend()
+        scanner = BeaconScanner(lambda *args: None, backend=backend)
+        scanner.start()
+
+        start = time.monotonic()
+        scanner.stop()
+        assert time.monotonic() - start < STOP_BOUND
+        assert backend.socket.fileno() == -1
+        backend.close()
+
+    assert all(closed(fd) for fd in pipes)
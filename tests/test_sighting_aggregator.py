@@ -0,0 +1,53 @@
+"""Tests for the sighting aggregator."""
+import time
+
+from SightingAggregator import SightingAggregator
+
+
+def wait_for(condition, timeout=2.0):
+    """Poll condition until it holds or timeout seconds have passed."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_first_sighting_passed_on():
+    """The first sighting of a beacon is passed on right away."""
+    sightings = []
+    aggregator = SightingAggregator(sightings.append, window=10)
+    aggregator.add(2, 1, -59, -60)
+    aggregator.add(2, 1, -59, -70)
+
+    assert [(sighting.minor, sighting.count) for sighting in sightings] == [(1, 1)]
+    aggregator.close()
+
+
+def test_pending_window_flushed_without_add():
+    """A quiet beacon's pending sightings are passed on by the timer."""
+    sightings = []
+    aggregator = SightingAggregator(sightings.append, window=0.05)
+    aggregator.add(2, 1, -59, -60)
+    aggregator.add(2, 1, -59, -70)
+    aggregator.add(2, 1, -59, -80)
+
+    assert wait_for(lambda: len(sightings) == 2)
+    pending = sightings[1]
+    assert (pending.count, pending.rssiMin, pending.rssiMax, pending.rssiMean) == (2, -80, -70, -75)
+    assert wait_for(lambda: aggregator.timer is None and not aggregator.windows)
+    assert aggregator.emitted == 2
+    aggregator.close()
+
+
+def test_flush():
+    """flush passes on every pending sighting."""
+    sightings = []
+    aggregator = SightingAggregator(sightings.append, window=10)
+    aggregator.add(2, 1, -59, -60)
+    aggregator.add(2, 1, -59, -62)
+    aggregator.add(2, 2, -59, -70)
+    aggregator.close()
+    aggregator.flush()
+
+    assert [(sighting.minor, sighting.count) for sighting in sightings] == [(1, 1), (2, 1), (1, 1)]
+    assert aggregator.received == 3
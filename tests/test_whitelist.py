@@ -0,0 +1,134 @@
+"""Tests for the controller white list commands."""
+import pytest
+
+pytest.importorskip("construct")
+pytest.importorskip("ahocorapy")
+
+from beacontools import BeaconScanner, BtAddrFilter, BluetoothAddressType, IBeaconFilter, ScanFilter
+
+OGF_LE_CTL = 0x08
+PUBLIC_ADDRESS = "01:02:03:04:05:06"
+RANDOM_ADDRESS = "c1:c2:c3:c4:c5:c6"
+ANY_ADDRESS = "a1:a2:a3:a4:a5:a6"
+UUID = "2f234454-cf6d-4a0f-adf2-f4911ba9ffa6"
+# (ogf, ocf, payload) of the scan enable commands, duplicates not filtered
+SCAN_DISABLE = (OGF_LE_CTL, 0x0c, b"\x00\x00")
+SCAN_ENABLE = (OGF_LE_CTL, 0x0c, b"\x01\x00")
+
+
+class FakeHciSocket(object):
+    """Backend and HCI socket of a BT 4.2 controller, records the commands."""
+
+    def __init__(self, whitelist_size=8):
+        self.whitelist_size = whitelist_size
+        self.commands = []
+        self.requests = []
+
+    def open_dev(self, _bt_device_id):
+        return self
+
+    def send_cmd(self, _socket, group_field, command_field, data):
+        self.commands.append((group_field, command_field, bytes(data)))
+
+    def send_req(self, _socket, group_field, command_field, _event, rlen, _params, _timeout):
+        self.requests.append((group_field, command_field))
+        if (group_field, command_field) == (0x04, 0x0001):
+            return bytes([0x00, 0x08, 0x00, 0x00, 0x08, 0xff, 0xff, 0x00, 0x00])[:rlen]
+        if (group_field, command_field) == (OGF_LE_CTL, 0x000f):
+            return bytes([0x00, self.whitelist_size])[:rlen]
+        raise NotImplementedError
+
+
+def add(address_type, address):
+    """LE Add Device To White List command: address type and reversed address."""
+    return (OGF_LE_CTL, 0x11, bytes([address_type]) + bytes.fromhex(address.replace(":", ""))[::-1])
+
+
+def open_scanner(backend, device_filter, filter_type):
+    """Open the scanner's socket like its receive thread does, without starting it."""
+    scanner = BeaconScanner(lambda *args: None, backend=backend, device_filter=device_filter,
+                            scan_parameters={"filter_type": filter_type})
+    # pylint: disable=protected-access
+    scanner._mon.open_socket()
+    return scanner
+
+
+def test_push_whitelist_sequence():
+    """Starting a WHITELIST_ONLY scan clears the list, adds every address, then scans."""
+    backend = FakeHciSocket()
+    scanner = open_scanner(backend, [BtAddrFilter(PUBLIC_ADDRESS, BluetoothAddressType.PUBLIC),
+                                     BtAddrFilter(RANDOM_ADDRESS, BluetoothAddressType.RANDOM),
+                                     BtAddrFilter(ANY_ADDRESS)], ScanFilter.WHITELIST_ONLY)
+
+    assert backend.requests == [(0x04, 0x0001), (OGF_LE_CTL, 0x000f)]
+    assert scanner.whitelist_size == 8
+    assert backend.commands == [
+        (OGF_LE_CTL, 0x10, b""),
+        add(0x00, PUBLIC_ADDRESS),
+        add(0x01, RANDOM_ADDRESS),
+        # no address type: one entry as public and one as random address
+        add(0x00, ANY_ADDRESS),
+        add(0x01, ANY_ADDRESS),
+        # active scan, 10ms interval and window, random own address, white list only
+        (OGF_LE_CTL, 0x0b, bytes([0x01, 0x10, 0x00, 0x10, 0x00, 0x01, 0x01])),
+        SCAN_ENABLE,
+    ]
+
+
+def test_whitelist_changes_pause_scanning():
+    """White list changes while scanning with it are wrapped in scan disable/enable."""
+    backend = FakeHciSocket()
+    scanner = open_scanner(backend, [BtAddrFilter(PUBLIC_ADDRESS)], ScanFilter.WHITELIST_ONLY)
+    backend.commands.clear()
+
+    scanner.add_to_whitelist(RANDOM_ADDRESS, BluetoothAddressType.RANDOM)
+    scanner.remove_from_whitelist(PUBLIC_ADDRESS)
+    scanner.clear_whitelist()
+
+    assert backend.commands == [
+        SCAN_DISABLE, add(0x01, RANDOM_ADDRESS), SCAN_ENABLE,
+        SCAN_DISABLE, (OGF_LE_CTL, 0x12, add(0x00, PUBLIC_ADDRESS)[2]), SCAN_ENABLE,
+        SCAN_DISABLE, (OGF_LE_CTL, 0x10, b""), SCAN_ENABLE,
+    ]
+
+
+def test_whitelist_changes_without_whitelist_scan():
+    """Scanning without the white list is not paused for white list changes."""
+    backend = FakeHciSocket()
+    scanner = open_scanner(backend, None, ScanFilter.ALL)
+
+    assert [command[1] for command in backend.commands] == [0x0b, 0x0c]
+    assert scanner.whitelist_size is None
+    backend.commands.clear()
+
+    scanner.add_to_whitelist(PUBLIC_ADDRESS)
+    assert backend.commands == [add(0x00, PUBLIC_ADDRESS)]
+
+
+def test_whitelist_overflow_warns(caplog):
+    """Pushing more entries than the controller supports is logged."""
+    backend = FakeHciSocket(whitelist_size=1)
+    open_scanner(backend, [BtAddrFilter(ANY_ADDRESS)], ScanFilter.WHITELIST_ONLY)
+    assert "2 white list entries pushed" in caplog.text
+
+
+@pytest.mark.parametrize("device_filter", [None, [IBeaconFilter(uuid=UUID)]])
+def test_empty_whitelist_warns(caplog, device_filter):
+    """A white list only scan without BtAddrFilter is logged, it would receive nothing."""
+    backend = FakeHciSocket()
+    scanner = open_scanner(backend, device_filter, ScanFilter.WHITELIST_ONLY)
+    assert "white list is empty" in caplog.text
+    assert backend.commands[0] == (OGF_LE_CTL, 0x10, b"")
+    assert backend.commands[-1] == SCAN_ENABLE
+
+    # addresses can still be added while scanning
+    caplog.clear()
+    scanner.add_to_whitelist(PUBLIC_ADDRESS)
+    assert add(0x00, PUBLIC_ADDRESS) in backend.commands
+    assert caplog.text == ""
+
+
+def test_whitelist_with_entries_does_not_warn(caplog):
+    """No warning while the white list holds the filtered addresses."""
+    open_scanner(FakeHciSocket(), [BtAddrFilter(PUBLIC_ADDRESS)], ScanFilter.WHITELIST_ONLY)
+    assert "white list" not in caplog.text